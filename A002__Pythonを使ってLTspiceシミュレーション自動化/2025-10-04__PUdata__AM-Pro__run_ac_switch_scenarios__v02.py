@@ -6,18 +6,55 @@
 """
 from __future__ import annotations
 
+import argparse
+import ast
+import contextvars
+import hashlib
+import importlib.util
+import itertools
+import json
+import operator
+import os
+import queue
+import signal
+import socket
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
 import re
-from shutil import copy2
-from typing import Callable, Optional
+from shutil import copy2, move, rmtree
+from typing import Callable, Iterator, Optional, Sequence
 
 import numpy as np
-import pandas as pd
-from PyLTSpice import RawRead, SimCommander
-from spicelib.editor.asc_editor import AscEditor
-from spicelib.editor.spice_editor import SpiceEditor
+
+
+class _LazyModule:
+    """最初に属性を参照した時点でモジュールを読み込む代理オブジェクト。
+
+    pandas の読み込みには数百ミリ秒かかるため、--help や --dry-run など
+    DataFrame を使わない処理では読み込まないようにする。
+    PyLTSpice / spicelib は使用する関数の中で読み込む。
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> object:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = _LazyModule("pandas")
 
 BASE_DIR = Path(__file__).parent.resolve()  # スクリプトのあるディレクトリ
 
@@ -32,6 +69,32 @@ LTSPICE_EXE = r"C:\Users\[your-username]\AppData\Local\Programs\ADI\LTspice\LTsp
                 # ↑実行環境に合わせてファイルパスを設定してください
 TARGET_NODE = "Amp-In"  # 測定対象のノード名（回路図上のネット名）
 ANALYSIS_TEMPLATE = BASE_DIR / "Template" / "Analysis_Template.xlsm"  # グラフ描画用のExcelテンプレートファイルのパス
+SIMULATOR = "ltspice"  # シミュレータ（"ltspice": LTspiceを実行、"native": 内蔵のAC解析ソルバー。--simulator で上書き可能）
+JOBS = 1  # 同時に実行するシミュレーション数（1の場合は逐次実行。コマンドライン引数 --jobs で上書き可能）
+ENGINE = "case"  # 実行方式（"case": ケースごとに実行、"step": 全ケースを .step で1回に実行。--engine で上書き可能）
+CACHE_DIR = BASE_DIR / ".sim_cache"  # シミュレーション結果キャッシュの保存先（--no-cache で無効化）
+CACHE_MAX_MB = 2048  # キャッシュの最大サイズ [MB]（超えた分は古いものから削除）
+SCENARIO_PATH = BASE_DIR / "scenarios" / "AM-Pro_switch_scenarios.toml"  # ケース表（スイッチの組み合わせ・モード）の定義ファイル（--scenario で上書き可能）
+OUTPUT_FORMAT = "csv"  # 結果ファイルの形式（"csv", "parquet", "feather"。--format で上書き可能）
+ADAPTIVE = False  # 粗い周波数スイープの後、応答が曲がっている帯域だけを細かく再シミュレーションする（--adaptive）
+ADAPTIVE_COARSE_PER_OCT = 10  # 適応スイープの最初のスイープの1オクターブあたりの点数
+ADAPTIVE_TOL_DB = 0.05  # 適応スイープで許容するゲインの補間誤差 [dB]
+ADAPTIVE_TOL_DEG = 0.5  # 適応スイープで許容する位相の補間誤差 [度]
+ADAPTIVE_MAX_PASSES = 4  # 適応スイープで再シミュレーションする最大回数
+PIPELINE = False  # 逐次実行時に、次のケースのシミュレーション中に前のケースの読み込み・書き出しを行う（--pipeline）
+PARSE_WORKERS = 2  # パイプライン実行時にRAWファイルの読み込み・書き出しを行うスレッド数
+PIPELINE_DEPTH = 2  # パイプライン実行時に読み込み待ちにできるRAWファイル数の上限（超えるとシミュレーションを待機）
+METRICS = True  # 全ケース・全ステップの共振周波数・ピーク・帯域幅・Q・高域の傾きの一覧表を書き出す（--no-metrics で無効化）
+METRICS_BANDWIDTH_DB = 3.0  # 帯域幅を求めるピークからの低下量 [dB]
+METRICS_ROLLOFF_FROM = 4.0  # 高域の傾きを求める帯域の下限（共振周波数の何倍から上か）
+MERGE = True  # 全ケース・全ステップのゲインを共通の周波数軸で並べた表を書き出す（--no-merge で無効化）
+MERGE_POINTS_PER_DECADE = 0  # 共通の周波数軸の1デケードあたりの点数（0の場合は最も細かいケースに合わせる）
+MERGE_MAX_POINTS_PER_DECADE = 2000  # 最も細かいケースに合わせる場合の1デケードあたりの点数の上限
+PLOTS = False  # ケースごとのゲイン・位相のグラフを画像で書き出す（--plots。Excelテンプレートのマクロの代わり）
+PLOT_FORMATS = ("png",)  # グラフの画像形式（"png", "svg"）
+PLOT_WORKERS = 4  # グラフを同時に描画するプロセス数
+SPOOL_MAX_ATTEMPTS = 3  # 分散実行で1ケースを実行する回数の上限（失敗・ワーカーの停止時にやり直す）
+LTSPICE_TIMEOUT = 600.0  # LTspice 1回の実行の制限時間 [秒]（超えた場合は強制終了。--sim-timeout で上書き可能、0で無制限）
 
 # --- スイッチ設定（電圧制御スイッチV2～V6の役割） ---
 # V2: Neck PU（ネックピックアップ）
@@ -40,10 +103,11 @@ ANALYSIS_TEMPLATE = BASE_DIR / "Template" / "Analysis_Template.xlsm"  # グラ
 # V5: Tone1 + Volume-Lower（トーン1＋ボリューム下段 250k）
 # V6: Tone2 + Volume-Upper（トーン2＋ボリューム上段 500k）
 # 各スイッチは "5" で ON、"0" で OFF
-# スイッチ設定の変更は下記の「スイッチの組み合わせ設定」セクション（406行目以降）で行う
+# スイッチの組み合わせ・トーン/ボリュームのモードは SCENARIO_PATH のファイル（TOML/YAML）で定義する
 
 # --- トーン/ボリューム設定 ---
-# トーンノブの有効化/無効化とボリュームノブの有効化/無効化は104～133行目の tone_param_transform 関数内で設定されています
+# トーンノブの有効化/無効化とボリュームノブの有効化/無効化は tone_param_transform 関数内で設定されています
+# （シナリオファイルのモードで transform = "tone" を指定すると使われる）
 # ここを編集することで解析の順番や、掃引パラメータを変更できます
 # 現在の設定:
 #   - トーンノブ: 固定-->可変（.step param j を有効にする）
@@ -59,6 +123,26 @@ FALLBACK_ENC = "utf-8"   # フォールバック文字エンコーディング
 
 TextTransform = Callable[[str], str]  # テキスト変換関数の型定義
 
+NATIVE_SIMULATOR = "native"  # 内蔵ソルバーを使う場合に executable の代わりに渡す名前
+NATIVE_SOLVER_VERSION = "2"  # 内蔵ソルバーの版（計算方法を変えた場合はキャッシュを無効にするため更新する）
+WORK_DIRNAME = "_work"  # 並列実行時に各ケースの作業ディレクトリを置くフォルダ名
+CASE_STEP_PARAM = "case"  # 一括ステップ実行でケース番号として使用する .step パラメータ名
+OUTPUT_SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}  # 形式ごとの拡張子
+DATASET_DIRNAME = "dataset"  # バッチ全体をまとめたParquetデータセットのフォルダ名
+LTSPICE_ARG_FORMS = (("-b",), ("-Run", "-b"), ("-b", "-Run"))  # 試行するLTspiceのバッチ実行の引数
+LTSPICE_INVOCATION_PATH = BASE_DIR / ".ltspice_invocation.json"  # 動作したLTspiceの引数の記録ファイル
+RUN_REPORT_NAME = "run_report.json"  # 処理段階ごとの時間・リソースを記録するファイル名（出力フォルダ内）
+MANIFEST_NAME = "manifest.json"  # 計画したケースと入力のハッシュを記録するファイル名（出力フォルダ内）
+DONE_DIRNAME = ".done"  # 完了したケースのマーカーを置くフォルダ名（出力フォルダ内）
+SUMMARY_DIRNAME = "summary"  # バッチ全体の集計表を置くフォルダ名（ExcelテンプレートがCSVとして読み込まないよう分ける）
+PLOTS_DIRNAME = "plots"  # グラフの画像を置くフォルダ名（出力フォルダ内）
+SPOOL_DIRNAME = "_spool"  # --spool-workers だけを指定した場合のジョブキューのフォルダ名（出力フォルダ内）
+SPOOL_HEARTBEAT_S = 5.0  # ワーカーが生存を知らせるファイルを更新する間隔 [秒]
+SPOOL_STALE_S = 60.0  # この時間生存の知らせが更新されないワーカーのジョブは別のワーカーでやり直す [秒]
+SPOOL_POLL_S = 0.5  # ジョブキューのフォルダを確認する間隔 [秒]
+SPOOL_IDLE_TIMEOUT_S = 600.0  # 生存しているワーカーが1つも無い状態がこの時間続いたら未完了のジョブを失敗扱いにする [秒]
+FREQ_RTOL = 1e-6  # この相対差以内の周波数は同じ周波数とみなす（".ac list" に渡す有効数字9桁の丸め誤差を吸収する）
+
 
 # ========================================================================
 # ファイル入出力関数
@@ -135,6 +219,32 @@ def tone_param_transform(text: str) -> str:
     return text
 
 
+def knob_grid_transform(text: str) -> str:
+    """トーンノブとボリュームノブを両方とも掃引するようにパラメータ定義を入れ替える。
+
+    .step param j と .step param k を両方有効にし、j×k の全組み合わせ（ノブのマップ）を
+    シミュレーションする。ステップ数が多くなるため、内蔵ソルバー（--simulator native）での
+    使用を想定している。グリッドの細かさはシナリオファイルのモードの knob_points で指定する。
+
+    Args:
+        text: 変換対象のSPICEネットリストテキスト
+
+    Returns:
+        変換後のテキスト
+    """
+    # トーンノブの有効化
+    text = text.replace(";step param j 0 0.999 0.111", ".step param j 0 0.999 0.111")
+    text = text.replace(";param Pt=(x**j-1)/(x-1)", ".param Pt=(x**j-1)/(x-1)")
+    text = text.replace(".param Pt=1", ";param Pt=1")
+
+    # ボリュームノブの有効化（入力ファイルのまま）
+    text = text.replace(";step param k 0.111 0.999 0.111", ".step param k 0.111 0.999 0.111")
+    text = text.replace(";param Px=(x**k-1)/(x-1)", ".param Px=(x**k-1)/(x-1)")
+    text = text.replace(".param Px=1", ";param Px=1")
+
+    return text
+
+
 # ========================================================================
 # 出力ディレクトリとファイル形式の検出
 # ========================================================================
@@ -253,6 +363,8 @@ def prepare_editor(
     transformed = text_transform(normalized) if text_transform else normalized
 
     if kind == "asc":
+        from spicelib.editor.asc_editor import AscEditor
+
         # .ascファイルの場合
         edited = work_dir / input_path.name
         write_text_cp932(edited, transformed)
@@ -270,6 +382,8 @@ def prepare_editor(
         restore_text = header + restore_text
         transformed_output = header + transformed_output
     write_text_cp932(edited, transformed_output)
+    from spicelib.editor.spice_editor import SpiceEditor
+
     editor = SpiceEditor(str(edited))
     return editor, edited, kind, restore_text
 
@@ -350,18 +464,566 @@ def write_editor(editor: object, path: Path, kind: str) -> None:
         write_text_cp932(path, refreshed)
 
 
+# ========================================================================
+# ネットリストテンプレート（メモリ上で部品値を差し替えて1回で書き出す）
+# ========================================================================
+
+_WRDATA_PATTERN = re.compile(r"(^|[!\s])\.wrdata\b", re.IGNORECASE)
+
+
+class NetlistTemplate:
+    """入力ファイルを1回だけ読み込み、ケースごとのネットリストをメモリ上で生成するテンプレート。
+
+    入力ファイルを読み込んでマイクロ記号を正規化し、.wrdataディレクティブを除いた上で、
+    各部品の値が書かれている行の位置を記録する。テキスト変換（トーン/ボリューム切り替え）の
+    結果も変換関数ごとに記録するため、ケースごとの処理は行の差し替えと1回の書き込みだけになる。
+    入力ファイル自体は変更しないため、元に戻す処理も不要。
+
+    Attributes:
+        input_path: 入力ファイルのパス
+        kind: ファイル形式（"asc" または "spice"）
+        output_name: シミュレーションに渡すファイルの名前
+    """
+
+    def __init__(self, input_path: Path) -> None:
+        kind = detect_format(input_path)
+        if kind not in ("asc", "spice"):
+            raise RuntimeError(
+                "Could not detect a supported input format. Please provide an .asc or SPICE netlist."
+            )
+        self.input_path = input_path
+        self.kind = kind
+
+        text = normalize_micro_symbols(read_text_auto(input_path))
+        if kind == "asc":
+            self.output_name = input_path.name
+        else:
+            self.output_name = input_path.stem + ".cir"
+            if not text.lstrip().startswith("*"):
+                # SPICEネットリストの1行目はタイトル行として扱われるためヘッダーを追加
+                text = "* converted for SpiceEditor\n" + text
+        self._text = text
+        self._variants: dict[Optional[TextTransform], tuple[list[str], dict[str, tuple[int, bool]]]] = {}
+
+    def _compile(
+        self, text_transform: Optional[TextTransform]
+    ) -> tuple[list[str], dict[str, tuple[int, bool]]]:
+        """テキスト変換を適用した行リストと、部品値の行位置を返す（変換関数ごとに記録）。
+
+        部品値の行位置は 部品名(大文字) → (行番号, 値の行か) の辞書。
+        .ascでValue行が無い部品は InstName 行の番号を記録し、その直後に挿入する。
+        """
+        if text_transform in self._variants:
+            return self._variants[text_transform]
+
+        text = text_transform(self._text) if text_transform else self._text
+        lines = [line for line in text.splitlines() if not self._is_wrdata(line)]
+        positions: dict[str, tuple[int, bool]] = {}
+
+        if self.kind == "asc":
+            # SYMBOL行から始まるブロック内で InstName と Value の行を探す（順序は不定）
+            name: Optional[str] = None
+            name_index = value_index = -1
+            for i, line in enumerate(lines + ["SYMBOL"]):
+                if line.startswith("SYMBOL") or not line.startswith(("SYMATTR ", "WINDOW ")):
+                    if name is not None and name not in positions:
+                        positions[name] = (value_index, True) if value_index >= 0 else (name_index, False)
+                    name = None
+                    name_index = value_index = -1
+                elif line.startswith("SYMATTR InstName "):
+                    name = line.split(maxsplit=2)[2].strip().upper()
+                    name_index = i
+                elif line.startswith("SYMATTR Value "):
+                    value_index = i
+        else:
+            for i, line in enumerate(lines):
+                tokens = line.split()
+                if len(tokens) >= 3 and tokens[0][0].isalpha() and not line.startswith("."):
+                    positions.setdefault(tokens[0].upper(), (i, True))
+
+        self._variants[text_transform] = (lines, positions)
+        return lines, positions
+
+    def _is_wrdata(self, line: str) -> bool:
+        """.wrdataディレクティブの行かどうかを判定する。"""
+        if self.kind == "asc":
+            return line.startswith("TEXT ") and "!" in line and bool(_WRDATA_PATTERN.search(line))
+        return line.lstrip().lower().startswith(".wrdata")
+
+    def has_components(self, refs: Sequence[str]) -> bool:
+        """指定された部品が全てテンプレート内で見つかるかどうかを返す。"""
+        _, positions = self._compile(None)
+        return all(ref.upper() in positions for ref in refs)
+
+    def render(
+        self,
+        component_values: dict[str, str],
+        text_transform: Optional[TextTransform] = None,
+        instructions: Sequence[str] = (),
+    ) -> str:
+        """部品値とディレクティブを反映したネットリストのテキストを生成する。
+
+        Args:
+            component_values: 部品名→設定値の辞書（例: {"V2": "5", ...}）
+            text_transform: テキスト変換関数（トーン/ボリューム切り替え等）
+            instructions: 追加するSPICEディレクティブ
+
+        Returns:
+            ネットリストのテキスト
+
+        Raises:
+            KeyError: 部品が見つからない場合
+        """
+        lines, positions = self._compile(text_transform)
+        replace: dict[int, str] = {}
+        insert_after: dict[int, list[str]] = {}
+        for ref, value in component_values.items():
+            index, is_value_line = positions[ref.upper()]
+            if self.kind == "asc":
+                if is_value_line:
+                    replace[index] = f"SYMATTR Value {value}"
+                else:
+                    insert_after.setdefault(index, []).append(f"SYMATTR Value {value}")
+            else:
+                # 値の後ろのパラメータ（Rser=, ic=, モデル名など）は残し、値だけを置き換える
+                tokens = lines[index].split()
+                at = 4 if len(tokens) > 4 and tokens[3].upper() == "DC" else 3
+                replace[index] = " ".join(tokens[:at] + [str(value)] + tokens[at + 1:])
+
+        out: list[str] = []
+        for i, line in enumerate(lines):
+            out.append(replace.get(i, line))
+            out.extend(insert_after.get(i, ()))
+
+        if instructions:
+            if self.kind == "asc":
+                # 既存のTEXT行の後ろに追加し、図面上では既存のテキストの下に配置する
+                text_rows = [i for i, line in enumerate(out) if line.startswith("TEXT ")]
+                y = max((int(out[i].split()[2]) for i in text_rows), default=0) + 32
+                at = text_rows[-1] + 1 if text_rows else len(out)
+                out[at:at] = [
+                    f"TEXT 0 {y + 32 * offset} Left 2 !{instruction}"
+                    for offset, instruction in enumerate(instructions)
+                ]
+            else:
+                end = next(
+                    (i for i in range(len(out) - 1, -1, -1) if out[i].strip().lower() == ".end"),
+                    len(out),
+                )
+                out[end:end] = list(instructions)
+
+        return "\n".join(out) + "\n"
+
+
+_TEMPLATES: dict[tuple[Path, int], NetlistTemplate] = {}
+
+
+def load_netlist_template(input_path: Path) -> NetlistTemplate:
+    """入力ファイルのテンプレートを返す（プロセスごとに1回だけ読み込む）。
+
+    入力ファイルが更新された場合は読み込み直す。
+
+    Args:
+        input_path: 入力ファイルのパス
+
+    Returns:
+        NetlistTemplateオブジェクト
+    """
+    key = (input_path.resolve(), input_path.stat().st_mtime_ns)
+    template = _TEMPLATES.get(key)
+    if template is None:
+        template = NetlistTemplate(input_path)
+        _TEMPLATES[key] = template
+    return template
+
+
+# ========================================================================
+# 処理段階ごとの時間・リソースの計測
+# ========================================================================
+
+@dataclass
+class StageRecord:
+    """1つの処理段階（ネットリストの書き出し、シミュレーション、RAWファイルの読み込み等）の計測結果。
+
+    Attributes:
+        case: ケース名（"Neck_Vol" など。一括ステップ実行では "step:Vol"）
+        stage: 処理段階の名前（関数名）
+        wall_s: 経過時間 [秒]
+        cpu_s: CPU時間 [秒]（このスレッドのCPU時間。シミュレーションの実行段階では、
+            その段階で起動して終了した子プロセス（LTspice）のCPU時間も含む。
+            Windowsでは子プロセスのCPU時間は含まれない）
+        peak_rss_mb: 処理段階の終了時点でのプロセスの最大メモリ使用量 [MB]（取得できない場合はNone）
+        bytes_read: 読み込んだファイルのサイズ [byte]
+        bytes_written: 書き出したファイルのサイズ [byte]
+        ok: 正常に終了した場合はTrue
+        detail: 処理段階ごとの追加情報（LTspiceの起動方法、キャッシュのヒットなど）
+        pid: 計測したプロセスのID
+    """
+
+    case: str
+    stage: str
+    wall_s: float
+    cpu_s: float
+    peak_rss_mb: Optional[float]
+    bytes_read: int = 0
+    bytes_written: int = 0
+    ok: bool = True
+    detail: dict = field(default_factory=dict)
+    pid: int = 0
+
+
+_STAGE_RECORDS: list[StageRecord] = []
+_STAGE_LOCK = threading.Lock()
+_CURRENT_CASE: contextvars.ContextVar[str] = contextvars.ContextVar("current_case", default="")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """プロセスの最大メモリ使用量（ピークRSS）[MB] を返す（取得できない場合はNone）。"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linuxはキロバイト単位、macOSはバイト単位
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    peak = getattr(info, "peak_wset", None) or info.rss
+    return peak / (1024 * 1024)
+
+
+def _child_cpu_time() -> float:
+    """終了した子プロセスのCPU時間の合計 [秒]（Windowsでは常に0）。
+
+    プロセス全体の値のため、シミュレーションの子プロセスを起動・待機する呼び出しの前後の差だけを
+    その処理段階に加える（子プロセスを起動するのはシミュレーションを実行するスレッドだけ）。
+    """
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+@contextmanager
+def case_scope(case: str) -> Iterator[None]:
+    """このブロック内で計測した処理段階をケース case の記録にする。"""
+    token = _CURRENT_CASE.set(case)
+    try:
+        yield
+    finally:
+        _CURRENT_CASE.reset(token)
+
+
+@contextmanager
+def measure_stage(stage: str) -> Iterator[dict]:
+    """ブロックの経過時間・CPU時間・最大メモリ使用量を計測して記録する。
+
+    ブロックには辞書が渡され、"bytes_read" / "bytes_written" に読み書きしたファイルの
+    サイズを、"child_cpu_s" にブロック内で実行した子プロセスのCPU時間 [秒] を、
+    その他のキーに追加情報を設定できる。例外が発生した場合も記録する（ok=False）。
+    CPU時間はこのスレッドの分だけを計測する（他のスレッドの子プロセスの分は含めない）。
+
+    Args:
+        stage: 処理段階の名前
+
+    Yields:
+        計測結果に追加する情報の辞書
+    """
+    info: dict = {}
+    ok = False
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield info
+        ok = True
+    finally:
+        record = StageRecord(
+            case=_CURRENT_CASE.get(),
+            stage=stage,
+            wall_s=time.perf_counter() - wall,
+            cpu_s=time.thread_time() - cpu + float(info.pop("child_cpu_s", 0.0)),
+            peak_rss_mb=peak_rss_mb(),
+            bytes_read=int(info.pop("bytes_read", 0)),
+            bytes_written=int(info.pop("bytes_written", 0)),
+            ok=ok,
+            detail=info,
+            pid=os.getpid(),
+        )
+        with _STAGE_LOCK:
+            _STAGE_RECORDS.append(record)
+
+
+def file_size(path: Path) -> int:
+    """ファイルサイズ [byte] を返す（ファイルが無い場合は0）。"""
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def drain_stage_records() -> list[StageRecord]:
+    """これまでの計測結果を取り出し、記録を空にする。"""
+    with _STAGE_LOCK:
+        records = list(_STAGE_RECORDS)
+        _STAGE_RECORDS.clear()
+    return records
+
+
+def add_stage_records(records: Sequence[StageRecord]) -> None:
+    """他のプロセスで計測した結果を記録に加える。"""
+    with _STAGE_LOCK:
+        _STAGE_RECORDS.extend(records)
+
+
+def call_with_stage_records(func: Callable, *args: object) -> tuple[object, list[StageRecord]]:
+    """func(*args) を実行し、(戻り値, その間の計測結果) を返す。
+
+    プロセスプールのワーカーで計測した結果を親プロセスへ返すために使う。
+    """
+    drain_stage_records()
+    try:
+        return func(*args), drain_stage_records()
+    except Exception:
+        # 失敗したケースの計測結果はワーカーに残さない
+        drain_stage_records()
+        raise
+
+
+def summarize_stages(records: Sequence[StageRecord]) -> list[dict]:
+    """処理段階ごとに計測結果を集計する。
+
+    Args:
+        records: 計測結果のリスト
+
+    Returns:
+        処理段階ごとの集計（回数、合計・平均・最大の経過時間、CPU時間、読み書きしたバイト数、
+        最大メモリ使用量、失敗回数）のリスト。経過時間の合計が大きい順
+    """
+    groups: dict[str, list[StageRecord]] = {}
+    for record in records:
+        groups.setdefault(record.stage, []).append(record)
+    rows = []
+    for stage, items in groups.items():
+        wall = np.array([r.wall_s for r in items])
+        peaks = [r.peak_rss_mb for r in items if r.peak_rss_mb is not None]
+        rows.append({
+            "stage": stage,
+            "count": len(items),
+            "failed": sum(not r.ok for r in items),
+            "wall_s": float(wall.sum()),
+            "wall_mean_s": float(wall.mean()),
+            "wall_max_s": float(wall.max()),
+            "cpu_s": float(sum(r.cpu_s for r in items)),
+            "bytes_read": int(sum(r.bytes_read for r in items)),
+            "bytes_written": int(sum(r.bytes_written for r in items)),
+            "peak_rss_mb": max(peaks) if peaks else None,
+        })
+    return sorted(rows, key=lambda row: row["wall_s"], reverse=True)
+
+
+def write_run_report(
+    outdir: Path,
+    records: Sequence[StageRecord],
+    settings: dict,
+    started: datetime,
+    wall_s: float,
+) -> Path:
+    """計測結果を出力フォルダの run_report.json に書き出す。
+
+    ランナーの版ごとのスループットの比較に使えるよう、実行時の設定、処理段階ごとの集計、
+    ケースごとの集計、全ての計測結果を1つのJSONファイルにまとめる。
+
+    Args:
+        outdir: 出力フォルダ
+        records: 計測結果のリスト
+        settings: 実行時の設定（コマンドライン引数など）
+        started: 実行の開始時刻
+        wall_s: 実行全体の経過時間 [秒]
+
+    Returns:
+        書き出したファイルのパス
+    """
+    cases: dict[str, dict[str, dict]] = {}
+    for record in records:
+        stages = cases.setdefault(record.case or "-", {})
+        total = stages.setdefault(record.stage, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                 "bytes_read": 0, "bytes_written": 0})
+        total["count"] += 1
+        total["wall_s"] += record.wall_s
+        total["cpu_s"] += record.cpu_s
+        total["bytes_read"] += record.bytes_read
+        total["bytes_written"] += record.bytes_written
+
+    report = {
+        "script": Path(__file__).name,
+        "started": started.isoformat(timespec="seconds"),
+        "wall_s": wall_s,
+        "settings": settings,
+        "stages": summarize_stages(records),
+        "cases": cases,
+        "records": [asdict(record) for record in records],
+    }
+    path = outdir / RUN_REPORT_NAME
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    return path
+
+
+def print_stage_summary(records: Sequence[StageRecord], wall_s: float) -> None:
+    """処理段階ごとの集計を表形式でコンソールに表示する。"""
+    print(f"\n{'stage':<26} {'count':>5} {'wall [s]':>9} {'mean [s]':>9} {'cpu [s]':>8}"
+          f" {'read [MB]':>10} {'write [MB]':>10} {'peak RSS [MB]':>14}")
+    for row in summarize_stages(records):
+        peak = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+        name = row["stage"] + (f" ({row['failed']} failed)" if row["failed"] else "")
+        print(
+            f"{name:<26} {row['count']:>5} {row['wall_s']:>9.2f} {row['wall_mean_s']:>9.3f}"
+            f" {row['cpu_s']:>8.2f} {row['bytes_read'] / 1e6:>10.1f}"
+            f" {row['bytes_written'] / 1e6:>10.1f} {peak:>14}"
+        )
+    print(f"{'total (wall clock)':<26} {'':>5} {wall_s:>9.2f}")
+
+
 # ========================================================================
 # LTspiceのバッチ実行
 # ========================================================================
 
-def run_ltspice_batch(executable: str, input_file: Path) -> None:
+_INVOCATIONS: dict[str, tuple[str, ...]] = {}  # 実行ファイル→動作した引数（プロセス内の記録）
+_INVOCATION_LOCK = threading.Lock()
+
+
+def _invocation_key(executable: str) -> str:
+    """実行ファイルのパスと更新時刻から、引数の記録のキーを作成する。"""
+    exe_path = Path(executable).resolve()
+    return f"{exe_path}|{exe_path.stat().st_mtime_ns}"
+
+
+def load_ltspice_invocation(executable: str) -> Optional[tuple[str, ...]]:
+    """以前に動作したLTspiceのバッチ実行の引数を返す（記録が無い場合はNone）。
+
+    実行ファイルのパスと更新時刻をキーとして LTSPICE_INVOCATION_PATH に記録しているため、
+    LTspiceを更新すると改めて試行する。
+
+    Args:
+        executable: LTspice実行ファイルのパス
+
+    Returns:
+        LTSPICE_ARG_FORMS のいずれか（記録が無い場合はNone）
+    """
+    key = _invocation_key(executable)
+    with _INVOCATION_LOCK:
+        if key in _INVOCATIONS:
+            return _INVOCATIONS[key]
+    try:
+        saved = json.loads(LTSPICE_INVOCATION_PATH.read_text(encoding="utf-8")).get(key)
+    except (OSError, ValueError, AttributeError):
+        return None
+    if not isinstance(saved, list) or tuple(saved) not in LTSPICE_ARG_FORMS:
+        return None
+    with _INVOCATION_LOCK:
+        _INVOCATIONS[key] = tuple(saved)
+    return tuple(saved)
+
+
+def save_ltspice_invocation(executable: str, args: tuple[str, ...]) -> None:
+    """動作したLTspiceのバッチ実行の引数を記録する。
+
+    同じ実行ファイルの古い更新時刻の記録は削除する。並列実行中の他のプロセスと
+    衝突しないよう、一時ファイルに書き込んでから置き換える。
+
+    Args:
+        executable: LTspice実行ファイルのパス
+        args: 動作した引数（LTSPICE_ARG_FORMS のいずれか）
+    """
+    key = _invocation_key(executable)
+    prefix = key.rsplit("|", 1)[0] + "|"
+    with _INVOCATION_LOCK:
+        _INVOCATIONS[key] = args
+        try:
+            data = json.loads(LTSPICE_INVOCATION_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        data = {k: v for k, v in data.items() if not k.startswith(prefix)}
+        data[key] = list(args)
+        tmp = LTSPICE_INVOCATION_PATH.with_name(
+            f"{LTSPICE_INVOCATION_PATH.name}.{os.getpid()}-{threading.get_ident()}.tmp"
+        )
+        try:
+            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, LTSPICE_INVOCATION_PATH)
+        except OSError:
+            # 記録できなくてもシミュレーションは続ける（次回また試行する）
+            tmp.unlink(missing_ok=True)
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """プロセスとその子プロセスを強制終了する。"""
+    if os.name == "nt":
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True, check=False
+        )
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if process.poll() is None:
+        process.kill()
+
+
+def run_with_timeout(
+    cmd: Sequence[str], cwd: Path, timeout: Optional[float] = LTSPICE_TIMEOUT
+) -> subprocess.CompletedProcess:
+    """コマンドを実行し、制限時間を超えた場合はプロセスツリーごと強制終了する。
+
+    Args:
+        cmd: 実行するコマンド
+        cwd: 作業ディレクトリ
+        timeout: 制限時間 [秒]（Noneまたは0以下の場合は無制限）
+
+    Returns:
+        実行結果（標準出力・標準エラー出力を含む）
+
+    Raises:
+        TimeoutError: 制限時間を超えた場合
+    """
+    # 子プロセスもまとめて終了できるよう、新しいプロセスグループで起動する
+    if os.name == "nt":
+        group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {"start_new_session": True}
+    with subprocess.Popen(
+        list(cmd), cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, errors="replace", **group,
+    ) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout if timeout and timeout > 0 else None)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            process.communicate()
+            raise TimeoutError(
+                f"{Path(cmd[0]).name} did not finish within {timeout:g} s and was killed"
+            ) from None
+    return subprocess.CompletedProcess(list(cmd), process.returncode, stdout, stderr)
+
+
+def run_ltspice_batch(
+    executable: str, input_file: Path, timeout: Optional[float] = LTSPICE_TIMEOUT
+) -> None:
     """LTspiceをバッチモードで実行する。
 
-    複数のコマンドライン引数の組み合わせを試行して、最も互換性のある方法でLTspiceを起動する。
+    複数のコマンドライン引数の組み合わせ（LTSPICE_ARG_FORMS）を試行して、最初に成功した
+    組み合わせを実行ファイルごとに記録する。記録がある場合はその組み合わせだけで起動するため、
+    失敗する起動方法を毎回試す時間がかからない。
+    制限時間を超えた実行は強制終了する（試行中の場合は次の組み合わせを試す）。
 
     Args:
         executable: LTspice実行ファイルのパス
         input_file: シミュレーション対象の回路ファイル
+        timeout: 1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
 
     Raises:
         FileNotFoundError: LTspice実行ファイルが見つからない場合
@@ -371,38 +1033,53 @@ def run_ltspice_batch(executable: str, input_file: Path) -> None:
     if not exe_path.exists():
         raise FileNotFoundError(f"LTspice executable not found: {executable}")
 
-    # 複数のコマンドライン引数の組み合わせを試行
-    candidates = [
-        [executable, "-b", str(input_file)],
-        [executable, "-Run", "-b", str(input_file)],
-        [executable, "-b", "-Run", str(input_file)],
-    ]
+    known = load_ltspice_invocation(executable)
+    forms = [known] if known is not None else list(LTSPICE_ARG_FORMS)
+    candidates = [[executable, *args, str(input_file)] for args in forms]
 
     last_error = None
-    for cmd in candidates:
-        try:
-            result = subprocess.run(
-                cmd,
-                cwd=str(input_file.parent),
-                capture_output=True,
-                text=True,
-                check=False,
-            )
-            if result.returncode == 0:
-                return
-            last_error = (
-                f"returncode={result.returncode}"
-                f"\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}"
-            )
-        except Exception as exc:
-            last_error = str(exc)
-    raise RuntimeError(
-        "LTspice batch execution failed.\n"
-        f"Tried: {candidates}\nLastError: {last_error}"
-    )
+    with measure_stage("run_ltspice_batch") as stage:
+        stage["probed"] = known is None
+        stage["failed_attempts"] = 0
+        stage["child_cpu_s"] = 0.0
+        for args, cmd in zip(forms, candidates):
+            child_cpu = _child_cpu_time()
+            try:
+                result = run_with_timeout(cmd, input_file.parent, timeout)
+                if result.returncode == 0:
+                    if known is None:
+                        save_ltspice_invocation(executable, args)
+                    # 成功した起動方法（実行ファイルと回路ファイルを除く引数）を記録
+                    stage["command"] = " ".join(args)
+                    stage["bytes_read"] = file_size(input_file)
+                    stage["bytes_written"] = file_size(input_file.with_suffix(".raw"))
+                    return
+                last_error = (
+                    f"returncode={result.returncode}"
+                    f"\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}"
+                )
+            except Exception as exc:
+                last_error = str(exc)
+                stage["timed_out"] = isinstance(exc, TimeoutError)
+            finally:
+                stage["child_cpu_s"] += _child_cpu_time() - child_cpu
+            stage["failed_attempts"] += 1
+        hint = (
+            f"\n(Using the saved invocation; delete {LTSPICE_INVOCATION_PATH} to probe again)"
+            if known is not None else ""
+        )
+        raise RuntimeError(
+            "LTspice batch execution failed.\n"
+            f"Tried: {candidates}\nLastError: {last_error}{hint}"
+        )
 
 
-def run_simulation(kind: str, editor_path: Path) -> None:
+def run_simulation(
+    kind: str,
+    editor_path: Path,
+    executable: str = LTSPICE_EXE,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> None:
     """シミュレーションを実行する。
 
     ファイル形式に応じて、適切な方法でLTspiceシミュレーションを実行する。
@@ -410,51 +1087,267 @@ def run_simulation(kind: str, editor_path: Path) -> None:
     Args:
         kind: ファイル形式（"asc" または "spice"）
         editor_path: シミュレーション対象のファイルパス
+        executable: LTspice実行ファイルのパス（テスト用の代替シミュレータも指定可能）
+        timeout: .ascファイルの1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
     """
     if kind == "asc":
         # .ascファイルの場合は直接LTspiceをバッチ実行
-        run_ltspice_batch(LTSPICE_EXE, editor_path)
+        run_ltspice_batch(executable, editor_path, timeout)
         return
 
     # SPICEネットリストの場合はSimCommanderを使用
-    sim = SimCommander(str(editor_path))
-    try:
-        if LTSPICE_EXE:
-            sim.run(executable=LTSPICE_EXE)
-        else:
-            sim.run()
-    except TypeError:
-        # 古いバージョンのAPIに対応
-        if LTSPICE_EXE:
-            sim.run(ltspice_path=LTSPICE_EXE)
-        else:
-            sim.run()
+    from PyLTSpice import SimCommander
+
+    with measure_stage("sim_commander") as stage:
+        sim = SimCommander(str(editor_path))
+        child_cpu = _child_cpu_time()
+        try:
+            if executable:
+                sim.run(executable=executable)
+            else:
+                sim.run()
+        except TypeError:
+            # 古いバージョンのAPIに対応
+            if executable:
+                sim.run(ltspice_path=executable)
+            else:
+                sim.run()
+        stage["child_cpu_s"] = _child_cpu_time() - child_cpu
+        stage["bytes_read"] = file_size(editor_path)
+        stage["bytes_written"] = file_size(editor_path.with_suffix(".raw"))
 
 
 # ========================================================================
-# RAWファイルからのデータ抽出
+# RAWファイルの直接読み込み（メモリマップ）
 # ========================================================================
 
-def data_from_raw(raw_path: Path) -> pd.DataFrame:
-    """RAWファイルから周波数特性データを抽出する。
+RAW_HEADER_CHUNK = 64 * 1024  # RAWファイルのヘッダーを読み込む単位 [byte]
 
-    LTspiceのRAWファイルを読み込み、指定されたノードの周波数特性データ
-    （周波数、ゲイン、位相）をDataFrameとして返す。
+
+def _convert_step_value(value: str) -> object:
+    """.logファイルのステップ値を数値に変換する（変換できなければ文字列のまま）。"""
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def read_step_info(log_path: Path) -> Optional[list[dict[str, object]]]:
+    """LTspiceの.logファイルからステップごとのパラメータを読み込む。
+
+    Args:
+        log_path: .logファイルのパス
+
+    Returns:
+        ステップごとのパラメータ辞書のリスト（.logファイルやステップ情報が無い場合はNone）
+    """
+    try:
+        data = log_path.read_bytes()
+    except OSError:
+        return None
+    # LTspiceの.logはUTF-16LEの場合とUTF-8/cp932の場合がある
+    if b"\x00" in data[:64]:
+        text = data.decode("utf-16-le", errors="ignore")
+    else:
+        try:
+            text = data.decode(FALLBACK_ENC)
+        except UnicodeDecodeError:
+            text = data.decode(PREFERRED_ENC, errors="ignore")
+
+    steps: list[dict[str, object]] = []
+    for line in text.splitlines():
+        if not line.startswith(".step"):
+            continue
+        step: dict[str, object] = {}
+        for token in line[5:].split():
+            if "=" not in token:
+                continue
+            key, value = token.split("=", 1)
+            step[key] = _convert_step_value(value)
+        steps.append(step)
+    return steps or None
+
+
+class LtspiceRawReader:
+    """LTspiceのバイナリRAWファイルをメモリマップで読み込むリーダー。
+
+    ヘッダーのみを解析し、データ部は np.memmap で参照する。各トレースは
+    レコード配列のフィールド（ストライド付きビュー）として返すため、
+    必要なトレース以外のデータはメモリにコピーされない。
+
+    対応形式:
+        - AC解析（Flags: complex）: 全変数が複素double
+        - 実数データ: 軸がdouble、その他がfloat（Flags: double の場合は全てdouble）
+
+    Attributes:
+        path: RAWファイルのパス
+        flags: Flags行の単語リスト（小文字）
+        trace_names: トレース名のリスト（先頭は軸）
+        n_points: 全ステップ合計のデータ点数
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        header, data_offset = self._read_header(path)
+
+        params: dict[str, str] = {}
+        self.trace_names: list[str] = []
+        in_variables = False
+        for line in header.splitlines():
+            if in_variables:
+                fields = line.strip().split("\t")
+                if len(fields) >= 3:
+                    self.trace_names.append(fields[1])
+                continue
+            key, _, value = line.partition(":")
+            if key == "Variables":
+                in_variables = True
+                continue
+            params[key.strip()] = value.strip()
+
+        self.flags = params.get("Flags", "").lower().split()
+        self.n_points = int(params["No. Points"])
+        n_vars = int(params["No. Variables"])
+        if len(self.trace_names) != n_vars:
+            raise ValueError(f"RAW header lists {len(self.trace_names)} of {n_vars} variables")
+        if "fastaccess" in self.flags:
+            raise ValueError("FastAccess RAW files are not supported")
+
+        # 1点分のレコード（全変数を並べたもの）の型
+        if "complex" in self.flags:
+            types = ["<c16"] * n_vars
+        elif "double" in self.flags:
+            types = ["<f8"] * n_vars
+        else:
+            types = ["<f8"] + ["<f4"] * (n_vars - 1)
+        record = np.dtype([(f"v{i}", t) for i, t in enumerate(types)])
+
+        expected = data_offset + record.itemsize * self.n_points
+        if path.stat().st_size < expected:
+            raise ValueError(f"RAW file is truncated: {path}")
+        self._data: Optional[np.memmap] = np.memmap(
+            path, dtype=record, mode="r", offset=data_offset, shape=(self.n_points,)
+        )
+
+    @staticmethod
+    def _read_header(path: Path) -> tuple[str, int]:
+        """ヘッダーを読み込み、(ヘッダー文字列, データ部の開始位置) を返す。
+
+        ヘッダーの長さはトレース数によって変わるため、"Binary:" の行が見つかるまで読み進める。
+
+        Raises:
+            ValueError: バイナリ形式のRAWファイルでない場合
+        """
+        head = bytearray()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(RAW_HEADER_CHUNK)
+                start = max(len(head) - 32, 0)  # 区切りをまたいだ行も見つけられるよう少し戻って探す
+                head += chunk
+                encoding = "utf-16-le" if head[1:2] == b"\x00" else "utf-8"
+                for marker in ("Binary:\n", "Binary:\r\n"):
+                    encoded = marker.encode(encoding)
+                    pos = head.find(encoded, start)
+                    if pos >= 0:
+                        return bytes(head[:pos]).decode(encoding), pos + len(encoded)
+                # ASCII形式（Values:）の場合やファイルの終わりまで見つからない場合はデータ部を読まずに終える
+                if not chunk or head.find("Values:".encode(encoding), start) >= 0:
+                    raise ValueError(f"Not a binary RAW file: {path}")
+
+    def __enter__(self) -> "LtspiceRawReader":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """メモリマップを解放する（Windowsでファイルを削除・上書きできるようにする）。"""
+        self._data = None
+
+    def find_trace(self, name: str) -> Optional[int]:
+        """大文字小文字を無視してトレース番号を検索する。"""
+        lower = name.lower()
+        return next(
+            (i for i, trace in enumerate(self.trace_names) if trace.lower() == lower), None
+        )
+
+    def trace(self, index: int) -> np.ndarray:
+        """トレースをコピーせずにストライド付きビューとして返す。"""
+        if self._data is None:
+            raise ValueError("RAW file is closed")
+        return self._data[f"v{index}"]
+
+    def axis(self) -> np.ndarray:
+        """軸（AC解析では周波数）をビューとして返す。"""
+        return self.trace(0)
+
+    def step_lengths(self) -> np.ndarray:
+        """各ステップの点数を返す。
+
+        ステップ付きのファイルでは、軸が先頭の値に戻る位置をステップの区切りとする。
+        """
+        if "stepped" not in self.flags or self.n_points == 0:
+            return np.array([self.n_points], dtype=np.intp)
+        axis = self.axis()
+        starts = np.flatnonzero(axis == axis[0])
+        return np.diff(np.append(starts, self.n_points)).astype(np.intp)
+
+
+TraceData = tuple[np.ndarray, np.ndarray, np.ndarray, list[int], Optional[list[dict]]]
+"""(freq, wave, lengths, steps, steps_info): 全ステップを連結した周波数軸と波形、
+各ステップの点数、ステップ番号、ステップパラメータ"""
+
+
+def _target_trace_from_native(raw_path: Path) -> Optional[TraceData]:
+    """LtspiceRawReaderで測定対象ノードのトレースを読み込む。
 
     Args:
         raw_path: RAWファイルのパス
 
     Returns:
-        周波数特性データを含むDataFrame
-        - frequency_Hz: 周波数 [Hz]
-        - mag_dB: ゲイン [dB]
-        - phase_deg: 位相 [度]
-        - step_index: ステップインデックス
-        - step_*: 各ステップパラメータ
+        TraceData（対応していない形式の場合はNone）
+
+    Raises:
+        RuntimeError: 指定されたノードのトレースが見つからない場合
+    """
+    try:
+        reader = LtspiceRawReader(raw_path)
+    except (ValueError, KeyError, OSError):
+        return None
+
+    with reader:
+        index = reader.find_trace(f"V({TARGET_NODE})")
+        if index is None:
+            available = ", ".join(reader.trace_names)
+            raise RuntimeError(
+                f"Trace for node '{TARGET_NODE}' not found in RAW file. Available traces: {available}"
+            )
+        lengths = reader.step_lengths()
+        # メモリマップを閉じる前に、必要な2本のトレースだけをコピーする
+        freq = np.array(reader.axis().real, dtype=float)
+        wave = np.array(reader.trace(index))
+
+    steps = list(range(len(lengths)))
+    steps_info = read_step_info(raw_path.with_suffix(".log")) if len(lengths) > 1 else None
+    return freq, wave, lengths, steps, steps_info
+
+
+def _target_trace_from_rawread(raw_path: Path) -> TraceData:
+    """PyLTSpiceのRawReadで測定対象ノードのトレースを読み込む。
+
+    Args:
+        raw_path: RAWファイルのパス
+
+    Returns:
+        TraceData
 
     Raises:
         RuntimeError: 指定されたノードのトレースが見つからない場合
     """
+    from PyLTSpice import RawRead
+
     raw = RawRead(str(raw_path), verbose=False)
 
     # ノード名の大文字小文字を無視してトレースを検索
@@ -473,193 +1366,3871 @@ def data_from_raw(raw_path: Path) -> pd.DataFrame:
     plot = raw._plots[0] if raw._plots else None
     steps_info = plot.steps if plot and getattr(plot, "steps", None) else None
 
-    frames: list[pd.DataFrame] = []
     steps = list(raw.get_steps())
     if not steps:
         steps = [0]
 
-    # 各ステップのデータを抽出
-    for step_idx in steps:
-        freq = np.asarray(raw.get_axis(step_idx)).real.astype(float)
-        wave = np.asarray(trace.get_wave(step_idx))
-        mag = np.abs(wave)
-        mag_db = 20.0 * np.log10(np.where(mag > 0.0, mag, np.finfo(float).tiny))
-        phase = np.degrees(np.angle(wave))
-
-        df = pd.DataFrame(
-            {
-                "frequency_Hz": freq,
-                "mag_dB": mag_db,
-                "phase_deg": phase,
-                "step_index": step_idx,
-            }
-        )
-
-        # ステップパラメータ情報を追加
-        if steps_info and step_idx < len(steps_info):
-            for key, value in steps_info[step_idx].items():
-                df[f"step_{key}"] = value
-
-        frames.append(df)
-
-    # 全てのステップのデータを結合
-    result = pd.concat(frames, ignore_index=True)
-    ordered = ["frequency_Hz", "mag_dB", "phase_deg"]
-    extras = [col for col in result.columns if col not in ordered]
-    return result[ordered + extras]
+    # 全ステップの周波数軸と波形を1つの配列に連結する
+    waves = [np.asarray(trace.get_wave(step_idx)) for step_idx in steps]
+    lengths = np.array([len(wave) for wave in waves], dtype=np.intp)
+    wave = np.concatenate(waves)
+    freq = np.concatenate(
+        [np.asarray(raw.get_axis(step_idx)) for step_idx in steps]
+    ).real.astype(float)
+    return freq, wave, lengths, steps, steps_info
 
 
 # ========================================================================
-# スイッチの組み合わせ設定とシミュレーション実行
+# RAWファイルからのデータ抽出
 # ========================================================================
-# 【重要】電圧制御スイッチの組み合わせを変更するときは以下を書き換える（A1～3, B）
 
-def run_case(
-    input_path: Path,
-    out_csv: Path,
-    # A1. 制御したいスイッチ数に応じて引数を調整
-    v2: str,  # Neck PU（ネックピックアップ）
-    v3: str,  # Middle PU（ミドルピックアップ）
-    v4: str,  # Bridge PU（ブリッジピックアップ）
-    v5: str,  # Tone1 + Volume-Lower（トーン1＋ボリューム下段 250k）
-    v6: str,  # Tone2 + Volume-Upper（トーン2＋ボリューム上段 500k）
-    text_transform: Optional[TextTransform] = None,
-) -> None:
-    """1つのスイッチ組み合わせでシミュレーションを実行し、結果をCSVに保存する。
+def data_from_raw(raw_path: Path) -> pd.DataFrame:
+    """RAWファイルから周波数特性データを抽出する。
+
+    LTspiceのRAWファイルを読み込み、指定されたノードの周波数特性データ
+    （周波数、ゲイン、位相）をDataFrameとして返す。
+    バイナリ形式のRAWファイルは LtspiceRawReader で必要なトレースだけを読み込み、
+    それ以外の形式は PyLTSpice の RawRead で読み込む。
 
     Args:
-        input_path: 入力ファイル（.ascまたは.cirファイル）のパス
-        out_csv: 出力CSVファイルのパス
-        v2: V2スイッチの設定値（"5"=ON, "0"=OFF）
-        v3: V3スイッチの設定値（"5"=ON, "0"=OFF）
-        v4: V4スイッチの設定値（"5"=ON, "0"=OFF）
-        v5: V5スイッチの設定値（"5"=ON, "0"=OFF）
-        v6: V6スイッチの設定値（"5"=ON, "0"=OFF）
-        text_transform: テキスト変換関数（トーン/ボリューム切り替え等）
-    """
-    work_dir = out_csv.parent
-    editor, edited_file, kind, restore_text = prepare_editor(
-        input_path, work_dir, text_transform=text_transform
-    )
+        raw_path: RAWファイルのパス
 
-    try:
-        # A2. 制御したいスイッチ数に応じてset_component_value呼び出しを調整
-        editor.set_component_value("V2", v2)
-        editor.set_component_value("V3", v3)
-        editor.set_component_value("V4", v4)
-        editor.set_component_value("V5", v5)
-        editor.set_component_value("V6", v6)
+    Returns:
+        周波数特性データを含むDataFrame
+        - frequency_Hz: 周波数 [Hz]
+        - mag_dB: ゲイン [dB]
+        - phase_deg: 位相 [度]
+        - step_index: ステップインデックス
+        - step_*: 各ステップパラメータ
 
-        # 既存の.wrdataディレクティブを削除
-        remove_existing_wrdata_quietly(editor, edited_file)
+    Raises:
+        RuntimeError: 指定されたノードのトレースが見つからない場合
+    """
+    loaded = _target_trace_from_native(raw_path)
+    if loaded is None:
+        loaded = _target_trace_from_rawread(raw_path)
+    return frame_from_traces(loaded)
 
-        # エディタの内容を保存
-        write_editor(editor, edited_file, kind)
-
-        # シミュレーション実行
-        run_simulation(kind, edited_file)
-
-        # RAWファイルの確認
-        raw_path = edited_file.with_suffix(".raw")
-        if not raw_path.exists():
-            log_path = edited_file.with_suffix(".log")
-            if log_path.exists():
-                tail = "\n".join(log_path.read_text(errors="ignore").splitlines()[-120:])
-                raise RuntimeError(
-                    "Simulation finished without producing a RAW file.\n"
-                    f"Log: {log_path}\n---- log tail ----\n{tail}\n------------------",
-                )
-            raise FileNotFoundError(f"Expected RAW file not found: {raw_path}")
 
-        # データを抽出してCSVに保存
-        df = data_from_raw(raw_path)
-        df.to_csv(out_csv, index=False, encoding=PREFERRED_ENC)
-    finally:
-        # ファイルを元の状態に戻す
-        write_text_cp932(edited_file, restore_text)
+def frame_from_traces(loaded: TraceData) -> pd.DataFrame:
+    """測定対象ノードの波形から周波数特性データのDataFrameを作成する。
 
+    Args:
+        loaded: (freq, wave, lengths, steps, steps_info) のタプル
 
-def main() -> None:
-    """メイン処理：全てのスイッチ組み合わせでシミュレーションを実行する。"""
-    base_dir = Path(__file__).parent.resolve()
-    if not INPUT_PATH.exists():
-        raise FileNotFoundError(f"Input file not found: {INPUT_PATH}")
+    Returns:
+        data_from_raw の戻り値と同じ形式のDataFrame
+    """
+    freq, wave, lengths, steps, steps_info = loaded
+
+    # ゲインと位相を全ステップ分まとめて計算
+    # （ステップごとの点数が等しければ (ステップ数, 点数) の2次元配列と同じ並び）
+    mag = np.abs(wave)
+    mag_db = 20.0 * np.log10(np.where(mag > 0.0, mag, np.finfo(float).tiny))
+    phase = np.degrees(np.angle(wave))
+
+    # 各行がどのステップに属するかを示すインデックス配列
+    row_step = np.repeat(np.arange(len(steps)), lengths)
+    columns: dict[str, np.ndarray] = {
+        "frequency_Hz": freq,
+        "mag_dB": mag_db,
+        "phase_deg": phase,
+        "step_index": np.asarray(steps)[row_step],
+    }
+
+    # ステップパラメータ情報を追加（ステップごとの値をインデックス配列で展開）
+    if steps_info:
+        keys: list[str] = []
+        for step_idx in steps:
+            if step_idx < len(steps_info):
+                keys.extend(key for key in steps_info[step_idx] if key not in keys)
+        for key in keys:
+            per_step = [
+                steps_info[step_idx].get(key, np.nan) if step_idx < len(steps_info) else np.nan
+                for step_idx in steps
+            ]
+            columns[f"step_{key}"] = np.asarray(per_step)[row_step]
+
+    return pd.DataFrame(columns)
+
+
+# ========================================================================
+# 内蔵AC解析ソルバー（修正節点解析、LTspiceを使わずにNumPyで計算）
+# ========================================================================
+
+# .ascのシンボル名 → (SPICEの素子記号, ピン座標)。ピン座標は回転前のシンボル内の位置
+# sw のピンは (A, B, 制御+, 制御-) の順
+ASC_SYMBOL_PINS: dict[str, tuple[str, tuple[tuple[int, int], ...]]] = {
+    "res": ("R", ((16, 16), (16, 96))),
+    "cap": ("C", ((16, 0), (16, 64))),
+    "ind": ("L", ((16, 16), (16, 96))),
+    "voltage": ("V", ((0, 16), (0, 96))),
+    "current": ("I", ((0, 0), (0, 80))),
+    "sw": ("S", ((0, 16), (0, 96), (-48, 80), (-48, 32))),
+}
+
+# 回転・反転ごとの座標変換（シンボル内の座標 (x, y) → 回路図上の相対座標）
+ASC_ORIENTATIONS: dict[str, Callable[[int, int], tuple[int, int]]] = {
+    "R0": lambda x, y: (x, y),
+    "R90": lambda x, y: (-y, x),
+    "R180": lambda x, y: (-x, -y),
+    "R270": lambda x, y: (y, -x),
+    "M0": lambda x, y: (-x, y),
+    "M90": lambda x, y: (-y, -x),
+    "M180": lambda x, y: (x, -y),
+    "M270": lambda x, y: (y, x),
+}
+
+SWITCH_DEFAULTS = {"ron": 1.0, "roff": 1e12, "vt": 0.0, "vh": 0.0}  # LTspiceのSWモデルの既定値
+NATIVE_GMIN = 1e-12  # 全節点に入れる対地コンダクタンス [S]（浮いた節点で行列が特異になるのを防ぐ）
+NATIVE_RMIN = 1e-6  # 一部のステップだけ0Ωになる抵抗（端まで回した可変抵抗など）に使う最小の抵抗値 [Ω]
+NATIVE_CHUNK_BYTES = 64 * 1024 * 1024  # 一度に解く係数行列の最大サイズ [byte]
+
+_EXPR_NUMBER = re.compile(
+    r"(?<![\w.])(\d+\.?\d*|\.\d+)(e[-+]?\d+)?(meg|[tgkmunpfµμｵ])?[a-zµμｵ]*",
+    re.IGNORECASE,
+)  # 式中のSPICE数値（単位接頭辞と、その後の単位名は無視）
+_EXPR_SCALE = {
+    "t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3,
+    "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15,
+    "µ": 1e-6, "μ": 1e-6, "ｵ": 1e-6,  # cp932で読んだ "µ" は "ｵ" になる
+}  # 式中のSPICEの単位接頭辞
+_EXPR_NAME = re.compile(r"(?<![\w.])[A-Za-z_]\w*")  # 式中のパラメータ名・関数名
+_ASSIGNMENT = re.compile(r"([A-Za-z_]\w*)\s*=\s*")
+
+
+@dataclass
+class CircuitElement:
+    """内蔵ソルバーで扱う回路素子。
+
+    Attributes:
+        ref: 素子名（例: "R1"）
+        kind: 素子記号（"R", "C", "L", "V", "I", "S"）
+        nodes: 接続先の節点名（スイッチは A, B, 制御+, 制御- の4つ）
+        value: 値の文字列（電源は "5 AC 1" のようなソース指定、スイッチはモデル名）
+    """
+
+    ref: str
+    kind: str
+    nodes: tuple[str, ...]
+    value: str
+
+
+@dataclass
+class Circuit:
+    """内蔵ソルバーの入力となる回路。
+
+    Attributes:
+        elements: 回路素子のリスト
+        directives: SPICEディレクティブ（".ac ...", ".param ..." 等）のリスト
+    """
+
+    elements: list[CircuitElement]
+    directives: list[str]
+
+
+def _split_directive_lines(text: str) -> list[str]:
+    """.ascのTEXT行に書かれた複数行のディレクティブ（"\\n" 区切り）を分割する。"""
+    return [line.strip() for line in text.split("\\n") if line.strip()]
+
+
+def parse_asc_circuit(text: str) -> Circuit:
+    """.ascの回路図（SYMBOL/WIRE/FLAG）から節点を求め、回路素子のリストに変換する。
+
+    ワイヤーの端点・ワイヤー上の点・シンボルのピン・ラベル（FLAG）を座標で結び、
+    同じラベル名のネットは1つの節点にまとめる。ラベル "0" がグラウンド。
+
+    Args:
+        text: .ascファイルのテキスト
+
+    Returns:
+        Circuit
+
+    Raises:
+        ValueError: 内蔵ソルバーが対応していないシンボルがある場合
+    """
+    wires: list[tuple[int, int, int, int]] = []
+    flags: list[tuple[int, int, str]] = []
+    symbols: list[dict[str, object]] = []
+    directives: list[str] = []
+
+    for line in text.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == "WIRE" and len(tokens) >= 5:
+            wires.append(tuple(int(t) for t in tokens[1:5]))
+        elif tokens[0] == "FLAG" and len(tokens) >= 4:
+            flags.append((int(tokens[1]), int(tokens[2]), tokens[3]))
+        elif tokens[0] == "SYMBOL" and len(tokens) >= 5:
+            name = tokens[1].replace("\\", "/").split("/")[-1].lower()
+            symbols.append({"name": name, "x": int(tokens[2]), "y": int(tokens[3]),
+                            "orientation": tokens[4], "attrs": {}})
+        elif tokens[0] == "SYMATTR" and symbols and len(tokens) >= 2:
+            symbols[-1]["attrs"][tokens[1]] = line.split(maxsplit=2)[2] if len(tokens) >= 3 else ""
+        elif tokens[0] == "TEXT" and "!" in line:
+            directives.extend(_split_directive_lines(line.split("!", 1)[1]))
+
+    # 座標 → 点番号（Union-Findで接続をまとめる）
+    points: dict[tuple[int, int], int] = {}
+    parent: list[int] = []
+
+    def point(xy: tuple[int, int]) -> int:
+        if xy not in points:
+            points[xy] = len(parent)
+            parent.append(len(parent))
+        return points[xy]
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a: int, b: int) -> None:
+        parent[find(a)] = find(b)
+
+    pins: list[tuple[dict[str, object], str, list[int]]] = []
+    for symbol in symbols:
+        attrs = symbol["attrs"]
+        ref = str(attrs.get("InstName", "")).strip()
+        if symbol["name"] not in ASC_SYMBOL_PINS:
+            raise ValueError(f"Unsupported symbol for the native solver: {symbol['name']} ({ref})")
+        kind, offsets = ASC_SYMBOL_PINS[symbol["name"]]
+        rotate = ASC_ORIENTATIONS[symbol["orientation"]]
+        ids = []
+        for dx, dy in offsets:
+            rx, ry = rotate(dx, dy)
+            ids.append(point((symbol["x"] + rx, symbol["y"] + ry)))
+        pins.append((symbol, kind, ids))
+    for x, y, _ in flags:
+        point((x, y))
+    for x1, y1, x2, y2 in wires:
+        union(point((x1, y1)), point((x2, y2)))
+
+    # ワイヤーの途中に接する点（T字接続・ワイヤー上のピン）も接続する
+    coords = np.array(list(points), dtype=np.int64).reshape(-1, 2)
+    ids = np.array(list(points.values()), dtype=np.intp)
+    for x1, y1, x2, y2 in wires:
+        cross = (x2 - x1) * (coords[:, 1] - y1) - (y2 - y1) * (coords[:, 0] - x1)
+        inside = (
+            (cross == 0)
+            & (coords[:, 0] >= min(x1, x2)) & (coords[:, 0] <= max(x1, x2))
+            & (coords[:, 1] >= min(y1, y2)) & (coords[:, 1] <= max(y1, y2))
+        )
+        anchor = points[(x1, y1)]
+        for i in ids[inside]:
+            union(int(i), anchor)
+
+    # ラベル名でネットに名前を付ける（同じ名前のネットは1つにまとめる）
+    label_root: dict[str, int] = {}
+    for x, y, name in flags:
+        key = name.lower()
+        pid = points[(x, y)]
+        if key in label_root:
+            union(pid, label_root[key])
+        label_root[key] = pid
+    net_names = {find(pid): key for key, pid in label_root.items()}
+
+    def net(pid: int) -> str:
+        root = find(pid)
+        return net_names.get(root, f"_n{root}")
+
+    elements = []
+    for symbol, kind, pin_ids in pins:
+        attrs = symbol["attrs"]
+        value = str(attrs.get("Value", "")).strip().strip('"')
+        if kind in ("V", "I"):
+            value = " ".join(part for part in (value, str(attrs.get("Value2", "")).strip()) if part)
+        elements.append(CircuitElement(
+            ref=str(attrs.get("InstName", "")).strip(),
+            kind=kind,
+            nodes=tuple(net(pid) for pid in pin_ids),
+            value=value,
+        ))
+    return Circuit(elements=elements, directives=directives)
+
+
+def parse_spice_circuit(text: str) -> Circuit:
+    """SPICEネットリストを回路素子のリストに変換する（R/C/L/V/I/S素子のみ）。
+
+    Args:
+        text: ネットリストのテキスト（1行目はタイトル行）
+
+    Returns:
+        Circuit
+
+    Raises:
+        ValueError: 内蔵ソルバーが対応していない素子がある場合
+    """
+    lines: list[str] = []
+    for raw in text.splitlines()[1:]:
+        line = raw.split(";", 1)[0].rstrip()
+        if not line.strip() or line.lstrip().startswith("*"):
+            continue
+        if line.startswith("+") and lines:
+            lines[-1] += " " + line[1:].strip()
+        else:
+            lines.append(line.strip())
+
+    elements: list[CircuitElement] = []
+    directives: list[str] = []
+    for line in lines:
+        if line.startswith("."):
+            if line.lower().startswith(".end") and line.lower() != ".ends":
+                break
+            directives.append(line)
+            continue
+        tokens = line.split()
+        kind = tokens[0][0].upper()
+        n_nodes = 4 if kind == "S" else 2
+        if kind not in "RCLVIS" or len(tokens) < n_nodes + 2 - (kind in "VI"):
+            raise ValueError(f"Unsupported element for the native solver: {line}")
+        elements.append(CircuitElement(
+            ref=tokens[0],
+            kind=kind,
+            nodes=tuple(t.lower() for t in tokens[1:1 + n_nodes]),
+            value=" ".join(tokens[1 + n_nodes:]),
+        ))
+    return Circuit(elements=elements, directives=directives)
+
+
+def _parse_assignments(text: str) -> dict[str, str]:
+    """"a=1 b={x*2}" のような代入列を 名前(小文字)→式 の辞書にする。"""
+    matches = list(_ASSIGNMENT.finditer(text))
+    result = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        result[match.group(1).lower()] = text[match.end():end].strip()
+    return result
+
+
+def _table(x: object, *points: object) -> np.ndarray:
+    """LTspiceの table(x, x1, y1, x2, y2, ...)（範囲外は端の値）。"""
+    xs = np.asarray(points[0::2], dtype=float)
+    ys = np.asarray(points[1::2], dtype=float)
+    order = np.argsort(xs)
+    return np.interp(x, xs[order], ys[order])
+
+
+_EXPR_FUNCTIONS: dict[str, object] = {
+    "table": _table,
+    "sqrt": np.sqrt, "exp": np.exp, "ln": np.log, "log": np.log, "log10": np.log10,
+    "abs": np.abs, "pow": np.power, "pwr": lambda a, b: np.abs(a) ** b,
+    "min": np.minimum, "max": np.maximum, "if": lambda c, a, b: np.where(c, a, b),
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "atan": np.arctan, "pi": np.pi,
+}  # 式の中で使える関数
+_EXPR_OPERATORS: dict[type, Callable] = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.Pow: operator.pow, ast.USub: operator.neg, ast.UAdd: operator.pos,
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}  # 式の中で使える演算子
+
+
+class ParamEvaluator:
+    """.param と .step param の値を使って、素子の値の式を評価する。
+
+    .step で掃引されるパラメータは全ステップ分の配列として扱うため、
+    式の評価結果もステップごとの値の配列（またはスカラー）になる。
+
+    Attributes:
+        definitions: パラメータ名(小文字) → 式
+        stepped: 掃引パラメータ名(小文字) → ステップごとの値
+    """
+
+    def __init__(self, definitions: dict[str, str], stepped: dict[str, np.ndarray]) -> None:
+        self.definitions = definitions
+        self.stepped = stepped
+        self._values: dict[str, object] = {}
+        self._resolving: set[str] = set()
+
+    def _lookup(self, name: str) -> object:
+        if name in self.stepped:
+            return self.stepped[name]
+        if name in self._values:
+            return self._values[name]
+        if name in _EXPR_FUNCTIONS:
+            return _EXPR_FUNCTIONS[name]
+        if name not in self.definitions:
+            raise KeyError(f"Undefined parameter: {name}")
+        if name in self._resolving:
+            raise ValueError(f"Circular parameter definition: {name}")
+        self._resolving.add(name)
+        try:
+            value = self.evaluate(self.definitions[name])
+        finally:
+            self._resolving.discard(name)
+        self._values[name] = value
+        return value
+
+    def evaluate(self, expr: str) -> object:
+        """式（"{Pt*250k+50m}"、"0.022u" など）を評価する。
+
+        式は ast で構文木にしてから、数値・パラメータ名・四則演算とべき乗（**）・比較・
+        _EXPR_FUNCTIONS の関数呼び出しだけを評価する（属性の参照などは受け付けない）。
+
+        Raises:
+            KeyError: 未定義のパラメータを参照している場合
+            ValueError: 対応していない構文を含む場合
+        """
+        expr = expr.strip()
+        if expr.startswith("{") and expr.endswith("}"):
+            expr = expr[1:-1]
+
+        def number(match: re.Match) -> str:
+            scale = _EXPR_SCALE.get((match.group(3) or "").lower(), 1.0)
+            return repr(float(match.group(1) + (match.group(2) or "")) * scale)
+
+        code = _EXPR_NUMBER.sub(number, expr)
+        code = _EXPR_NAME.sub(lambda m: m.group(0).lower(), code)
+        code = re.sub(r"\bif\s*\(", "_if(", code)
+        try:
+            tree = ast.parse(code, mode="eval")
+        except SyntaxError as exc:
+            raise ValueError(f"Invalid expression: {expr}") from exc
+        return self._evaluate_node(tree.body, expr)
+
+    def _evaluate_node(self, node: ast.AST, expr: str) -> object:
+        """evaluate の構文木を1ノードずつ評価する。"""
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.Name):
+            value = self._lookup(node.id)
+            if callable(value):
+                raise ValueError(f"Function {node.id} used as a value: {expr}")
+            return value
+        if isinstance(node, ast.BinOp) and type(node.op) in _EXPR_OPERATORS:
+            return _EXPR_OPERATORS[type(node.op)](
+                self._evaluate_node(node.left, expr), self._evaluate_node(node.right, expr)
+            )
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _EXPR_OPERATORS:
+            return _EXPR_OPERATORS[type(node.op)](self._evaluate_node(node.operand, expr))
+        if isinstance(node, ast.Compare) and all(type(op) in _EXPR_OPERATORS for op in node.ops):
+            left = self._evaluate_node(node.left, expr)
+            result: object = True
+            for op, right_node in zip(node.ops, node.comparators):
+                right = self._evaluate_node(right_node, expr)
+                result = np.logical_and(result, _EXPR_OPERATORS[type(op)](left, right))
+                left = right
+            return result
+        if (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords
+            and callable(_EXPR_FUNCTIONS.get("if" if node.func.id == "_if" else node.func.id))
+        ):
+            function = _EXPR_FUNCTIONS["if" if node.func.id == "_if" else node.func.id]
+            return function(*(self._evaluate_node(arg, expr) for arg in node.args))
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitXor):
+            # LTspiceでは式によって "^" の意味が異なる（べき乗/排他的論理和）ため、"**" だけを受け付ける
+            raise ValueError(f"Use '**' for powers ('^' is not supported by the native solver): {expr}")
+        raise ValueError(f"Unsupported expression for the native solver: {expr}")
+
+
+def _step_values(tokens: Sequence[str], evaluator: ParamEvaluator) -> tuple[str, np.ndarray]:
+    """.step param の引数から (パラメータ名, 値の配列) を求める。
+
+    対応形式: "param x list 1 2 3" / "param x 開始 終了 増分" / "oct|dec param x 開始 終了 点数"
+
+    Raises:
+        ValueError: パラメータ以外（電源・温度など）の掃引の場合
+    """
+    tokens = [t.lower() for t in tokens]
+    mode = "lin"
+    if tokens and tokens[0] in ("oct", "dec", "lin"):
+        mode, tokens = tokens[0], tokens[1:]
+    if len(tokens) < 3 or tokens[0] != "param":
+        raise ValueError(f"Only '.step param' sweeps are supported: .step {' '.join(tokens)}")
+    name = tokens[1]
+    if tokens[2] == "list":
+        return name, np.array([float(evaluator.evaluate(t)) for t in tokens[3:]])
+    start, stop, inc = (float(evaluator.evaluate(t)) for t in tokens[2:5])
+    if mode == "lin":
+        count = int(np.floor((stop - start) / inc + 1e-9)) + 1
+        return name, start + inc * np.arange(count)
+    per = 2.0 if mode == "oct" else 10.0
+    count = int(np.floor(np.log(stop / start) / np.log(per) * inc + 1e-9)) + 1
+    return name, start * per ** (np.arange(count) / inc)
+
+
+def ac_frequencies(tokens: Sequence[str]) -> np.ndarray:
+    """.ac の引数（"oct 100 10 50k" など）から解析周波数の配列を求める。
+
+    Raises:
+        ValueError: 未対応の形式の場合
+    """
+    mode = tokens[0].lower()
+    if mode == "list":
+        return np.array([parse_spice_number(t) for t in tokens[1:]])
+    count, start, stop = parse_spice_number(tokens[1]), parse_spice_number(tokens[2]), parse_spice_number(tokens[3])
+    if mode == "lin":
+        return np.linspace(start, stop, int(count))
+    if mode in ("oct", "dec"):
+        per = 2.0 if mode == "oct" else 10.0
+        n = int(np.floor(np.log(stop / start) / np.log(per) * count + 1e-9)) + 1
+        return start * per ** (np.arange(n) / count)
+    raise ValueError(f"Unsupported .ac sweep: .ac {' '.join(tokens)}")
+
+
+def _source_spec(spec: str, evaluator: ParamEvaluator) -> tuple[object, complex]:
+    """電源の値の指定（"5", "AC 1", "DC 0 AC 1 90" など）を (DC値, AC値) に変換する。"""
+    tokens = re.findall(r"\{[^}]*\}|\S+", spec)
+    dc: object = 0.0
+    ac = 0j
+    i = 0
+    while i < len(tokens):
+        word = tokens[i].lower()
+        if word == "ac" and i + 1 < len(tokens):
+            magnitude = float(evaluator.evaluate(tokens[i + 1]))
+            phase = 0.0
+            if i + 2 < len(tokens) and _EXPR_NUMBER.match(tokens[i + 2]):
+                phase = float(evaluator.evaluate(tokens[i + 2]))
+                i += 1
+            ac = magnitude * np.exp(1j * np.radians(phase))
+            i += 2
+        elif word == "dc" and i + 1 < len(tokens):
+            dc = evaluator.evaluate(tokens[i + 1])
+            i += 2
+        else:
+            dc = evaluator.evaluate(tokens[i])
+            i += 1
+    return dc, ac
+
+
+def _stamp(matrix: np.ndarray, i: int, j: int, y: np.ndarray) -> None:
+    """節点 i-j 間のアドミタンス y を係数行列に書き込む（-1はグラウンド）。"""
+    if i >= 0:
+        matrix[..., i, i] += y
+    if j >= 0:
+        matrix[..., j, j] += y
+    if i >= 0 and j >= 0:
+        matrix[..., i, j] -= y
+        matrix[..., j, i] -= y
+
+
+def solve_circuit_ac(circuit: Circuit, target_node: str = TARGET_NODE) -> TraceData:
+    """回路のAC解析を修正節点解析で行い、測定対象ノードの電圧を返す。
+
+    全ての解析周波数と .step の全ステップについて、係数行列を
+    (周波数, ステップ, 未知数, 未知数) の配列に並べて np.linalg.solve で一括で解く。
+    ステップで値が変わる部品（ノブの可変抵抗など）が未知数の半分以下の場合は、
+    それ以外の部品の行列を周波数ごとに1回だけ解き、ステップごとの差分を
+    低ランク更新（Sherman–Morrison–Woodbury）で求める。ステップごとに解くのは
+    変わる部品の数の大きさの小さな行列だけになるため、ノブの2次元の細かいグリッドも速く解ける。
+    スイッチ（SW）の状態は、DC動作点での制御電圧から決める。
+
+    Args:
+        circuit: parse_asc_circuit / parse_spice_circuit の戻り値
+        target_node: 測定対象のノード名
+
+    Returns:
+        TraceData（data_from_raw と同じ形式のDataFrameを作れる形）
+
+    Raises:
+        RuntimeError: 測定対象のノードが見つからない場合
+        ValueError: .ac が無い場合や、未対応の指定がある場合
+    """
+    definitions: dict[str, str] = {}
+    models: dict[str, dict[str, str]] = {}
+    step_lines: list[list[str]] = []
+    ac_tokens: Optional[list[str]] = None
+    for directive in circuit.directives:
+        if directive.startswith(";"):
+            continue
+        head, _, rest = directive.partition(" ")
+        head = head.lower()
+        if head == ".param":
+            definitions.update(_parse_assignments(rest))
+        elif head == ".step":
+            step_lines.append(rest.split())
+        elif head == ".ac":
+            ac_tokens = rest.split()
+        elif head == ".model":
+            match = re.match(r"(\S+)\s+(\w+)\s*\(?(.*?)\)?\s*$", rest)
+            if match:
+                models[match.group(1).lower()] = _parse_assignments(match.group(3))
+    if ac_tokens is None:
+        raise ValueError(".ac directive not found in the netlist")
+
+    # .step の全組み合わせ（先に書かれた .step が外側のループ）
+    evaluator = ParamEvaluator(definitions, {})
+    sweeps = [_step_values(tokens, evaluator) for tokens in step_lines]
+    grids = np.meshgrid(*[values for _, values in sweeps], indexing="ij") if sweeps else []
+    stepped = {name: grid.ravel() for (name, _), grid in zip(sweeps, grids)}
+    n_steps = len(next(iter(stepped.values()))) if stepped else 1
+    evaluator = ParamEvaluator(definitions, stepped)
+
+    def per_step(value: object) -> np.ndarray:
+        return np.broadcast_to(np.asarray(value, dtype=float), (n_steps,))
+
+    values: dict[str, np.ndarray] = {}
+    for element in circuit.elements:
+        if element.kind in ("R", "C", "L"):
+            values[element.ref] = per_step(evaluator.evaluate(element.value))
+
+    # 0Ωの抵抗は両端の節点を1つにまとめる（LTspiceと同様に短絡として扱う）
+    alias: dict[str, str] = {}
+
+    def resolve(name: str) -> str:
+        while name in alias:
+            name = alias[name]
+        return name
+
+    shorts = {e.ref for e in circuit.elements if e.kind == "R" and not np.any(values[e.ref])}
+    for element in circuit.elements:
+        if element.ref in shorts:
+            a, b = (resolve(name) for name in element.nodes)
+            if a != b:
+                # グラウンド、測定対象ノードの順に名前を残す
+                priority = ("0", target_node.lower())
+                rank = lambda name: priority.index(name) if name in priority else len(priority)
+                keep, drop = sorted((a, b), key=rank)
+                alias[drop] = keep
+    elements = [e for e in circuit.elements if e.ref not in shorts]
+    # 一部のステップだけ0Ωになる抵抗は節点をまとめられないため、そのステップだけ NATIVE_RMIN にする
+    for element in elements:
+        if element.kind == "R" and np.any(values[element.ref] == 0):
+            values[element.ref] = np.where(values[element.ref] == 0, NATIVE_RMIN, values[element.ref])
+
+    # 節点と電源の枝電流に番号を付ける
+    nodes: dict[str, int] = {}
+    for element in elements:
+        for name in map(resolve, element.nodes):
+            if name != "0" and name not in nodes:
+                nodes[name] = len(nodes)
+    index = {
+        name: nodes.get(resolve(name), -1) for element in elements for name in element.nodes
+    }
+    target = nodes.get(resolve(target_node.lower()))
+    if target is None:
+        available = ", ".join(sorted(name for name in nodes if not name.startswith("_n")))
+        raise RuntimeError(
+            f"Node '{target_node}' not found in the circuit. Available nodes: {available}"
+        )
+    sources = [e for e in elements if e.kind == "V"]
+    size = len(nodes) + len(sources)
+
+    source_values: dict[str, tuple[np.ndarray, complex]] = {}
+    for element in elements:
+        if element.kind in ("V", "I"):
+            dc, ac = _source_spec(element.value, evaluator)
+            source_values[element.ref] = (per_step(dc), ac)
+
+    # DC動作点からスイッチの状態を決める（状態が変わらなくなるまで繰り返す）
+    switches = [e for e in elements if e.kind == "S"]
+    switch_on = {e.ref: np.zeros(n_steps, dtype=bool) for e in switches}
+    switch_models = {}
+    for element in switches:
+        params = dict(SWITCH_DEFAULTS)
+        model = models.get(element.value.split()[0].lower() if element.value else "", {})
+        params.update({k: float(evaluator.evaluate(v)) for k, v in model.items() if k in params})
+        switch_models[element.ref] = params
+
+    def switch_conductance(element: CircuitElement) -> np.ndarray:
+        params = switch_models[element.ref]
+        return np.where(switch_on[element.ref], 1.0 / params["ron"], 1.0 / params["roff"])
+
+    for _ in range(max(len(switches), 1) + 1):
+        dc_matrix = np.zeros((n_steps, size, size))
+        dc_rhs = np.zeros((n_steps, size))
+        dc_matrix[:, np.arange(len(nodes)), np.arange(len(nodes))] += NATIVE_GMIN
+        for element in elements:
+            i, j = (index[name] for name in element.nodes[:2])
+            if element.kind == "R":
+                _stamp(dc_matrix, i, j, 1.0 / values[element.ref])
+            elif element.kind == "L":
+                _stamp(dc_matrix, i, j, np.full(n_steps, 1e9))
+            elif element.kind == "S":
+                _stamp(dc_matrix, i, j, switch_conductance(element))
+            elif element.kind == "I":
+                dc = source_values[element.ref][0]
+                if i >= 0:
+                    dc_rhs[:, i] -= dc
+                if j >= 0:
+                    dc_rhs[:, j] += dc
+        for k, element in enumerate(sources):
+            i, j = (index[name] for name in element.nodes)
+            row = len(nodes) + k
+            if i >= 0:
+                dc_matrix[:, row, i] = dc_matrix[:, i, row] = 1.0
+            if j >= 0:
+                dc_matrix[:, row, j] = dc_matrix[:, j, row] = -1.0
+            dc_rhs[:, row] = source_values[element.ref][0]
+        dc_solution = np.linalg.solve(dc_matrix, dc_rhs[..., None])[..., 0]
+
+        def voltage(name: str) -> np.ndarray:
+            return dc_solution[:, index[name]] if index[name] >= 0 else np.zeros(n_steps)
+
+        changed = False
+        for element in switches:
+            control = voltage(element.nodes[2]) - voltage(element.nodes[3])
+            state = control > switch_models[element.ref]["vt"]
+            changed = changed or bool(np.any(state != switch_on[element.ref]))
+            switch_on[element.ref] = state
+        if not changed:
+            break
+
+    # AC解析（周波数をまとめて解く。行列が大きい場合は周波数方向に分割）
+    freq = ac_frequencies(ac_tokens)
+    passive = [e for e in elements if e.kind in ("R", "C", "L", "S")]
+
+    def admittance(element: CircuitElement, omega: np.ndarray) -> np.ndarray:
+        """部品のアドミタンスを (周波数, ステップ) の形で返す。"""
+        if element.kind == "R":
+            y = 1.0 / values[element.ref]
+        elif element.kind == "C":
+            y = 1j * omega * values[element.ref]
+        elif element.kind == "L":
+            y = 1.0 / (1j * omega * values[element.ref])
+        else:
+            y = switch_conductance(element)
+        return np.broadcast_to(y, (len(omega), n_steps))
+
+    def assemble(omega: np.ndarray, step: Optional[dict[str, int]]) -> tuple[np.ndarray, np.ndarray]:
+        """係数行列と右辺を作成する。
+
+        step=None の場合は (周波数, ステップ, 未知数, 未知数)、
+        部品名→ステップ番号の辞書の場合はその値で (周波数, 未知数, 未知数) の行列を作る。
+        """
+        shape = (len(omega),) if step is not None else (len(omega), n_steps)
+        matrix = np.zeros(shape + (size, size), dtype=complex)
+        rhs = np.zeros(shape + (size,), dtype=complex)
+        matrix[..., np.arange(len(nodes)), np.arange(len(nodes))] += NATIVE_GMIN
+        for element in passive:
+            i, j = (index[name] for name in element.nodes[:2])
+            y = admittance(element, omega)
+            _stamp(matrix, i, j, y if step is None else y[:, step.get(element.ref, 0)])
+        for element in elements:
+            if element.kind == "I":
+                i, j = (index[name] for name in element.nodes)
+                ac = source_values[element.ref][1]
+                if i >= 0:
+                    rhs[..., i] -= ac
+                if j >= 0:
+                    rhs[..., j] += ac
+        for k, element in enumerate(sources):
+            i, j = (index[name] for name in element.nodes)
+            row = len(nodes) + k
+            if i >= 0:
+                matrix[..., row, i] = matrix[..., i, row] = 1.0
+            if j >= 0:
+                matrix[..., row, j] = matrix[..., j, row] = -1.0
+            rhs[..., row] = source_values[element.ref][1]
+        return matrix, rhs
+
+    # ステップで値が変わる部品（ノブの可変抵抗など）が少なければ、残りの部品の行列を
+    # 周波数ごとに1回だけ解き、変わる部品の分は低ランク更新（Woodburyの公式）で求める
+    def varies(element: CircuitElement) -> bool:
+        per_step_value = switch_on[element.ref] if element.kind == "S" else values[element.ref]
+        return bool(np.any(per_step_value != per_step_value[0]))
+
+    varying = [e for e in passive if varies(e)]
+    rank = len(varying)
+    low_rank = n_steps > 1 and 2 * rank <= size
+    if low_rank:
+        # 基準はアドミタンスが最小のステップ（更新が常にアドミタンスを足す向きになり、桁落ちしない）
+        reference = {
+            e.ref: int(np.argmin(np.abs(admittance(e, np.ones((1, 1)))[0]))) for e in varying
+        }
+        incidence = np.zeros((size, rank))
+        for col, element in enumerate(varying):
+            i, j = (index[name] for name in element.nodes[:2])
+            if i >= 0:
+                incidence[i, col] = 1.0
+            if j >= 0:
+                incidence[j, col] = -1.0
+        bytes_per_freq = 16 * (size * (size + rank + 1) + n_steps * rank * (rank + 2))
+    else:
+        bytes_per_freq = 16 * n_steps * size * (size + 1)
+    chunk = max(1, NATIVE_CHUNK_BYTES // bytes_per_freq)
+    result = np.empty((n_steps, len(freq)), dtype=complex)
+    for start in range(0, len(freq), chunk):
+        omega = 2.0 * np.pi * freq[start:start + chunk, None]
+        if not low_rank:
+            matrix, rhs = assemble(omega, None)
+            solution = np.linalg.solve(matrix, rhs[..., None])[..., 0]
+            result[:, start:start + len(omega)] = solution[..., target].T
+            continue
+
+        # A = A0 + U D U^T のとき x = x0 - Z (I + D U^T Z)^-1 D U^T x0（Z = A0^-1 U）
+        matrix, rhs = assemble(omega, reference)
+        columns = np.broadcast_to(incidence, (len(omega), size, rank))
+        solved = np.linalg.solve(matrix, np.concatenate([rhs[..., None], columns], axis=-1))
+        base, z = solved[..., 0], solved[..., 1:]
+        delta = np.stack(
+            [admittance(e, omega) - admittance(e, omega)[:, reference[e.ref], None] for e in varying],
+            axis=-1,
+        )  # (周波数, ステップ, 部品)
+        coupling = np.einsum("nr,fns->frs", incidence, z)
+        capacitance = np.eye(rank) + delta[..., :, None] * coupling[:, None]
+        update = np.linalg.solve(
+            capacitance, (delta * (base @ incidence)[:, None])[..., None]
+        )[..., 0]
+        result[:, start:start + len(omega)] = (
+            base[:, target, None] - np.einsum("fr,fsr->fs", z[:, target], update)
+        ).T
+
+    lengths = np.full(n_steps, len(freq), dtype=np.intp)
+    steps_info = None
+    if stepped and n_steps > 1:
+        # LTspiceの.logと同じ表記を経由して、ステップ値の型（整数/小数）を揃える
+        steps_info = [
+            {name: _convert_step_value(f"{stepped[name][s]:g}") for name in stepped}
+            for s in range(n_steps)
+        ]
+    return np.tile(freq, n_steps), result.ravel(), lengths, list(range(n_steps)), steps_info
+
+
+def simulate_native(kind: str, netlist: str) -> pd.DataFrame:
+    """内蔵ソルバーでAC解析を行い、data_from_raw と同じ形式のDataFrameを返す。
+
+    Args:
+        kind: ファイル形式（"asc" または "spice"）
+        netlist: 回路ファイルのテキスト
+
+    Returns:
+        data_from_raw の戻り値と同じ形式のDataFrame
+    """
+    with measure_stage("simulate_native"):
+        circuit = parse_asc_circuit(netlist) if kind == "asc" else parse_spice_circuit(netlist)
+        return frame_from_traces(solve_circuit_ac(circuit))
+
+
+# ========================================================================
+# シミュレーション結果キャッシュ
+# ========================================================================
+
+def simulator_identity(executable: str) -> str:
+    """シミュレータを識別する文字列を返す。
+
+    実行ファイルのパス・更新時刻・サイズを組み合わせるため、
+    LTspiceを更新するとキャッシュは自動的に無効になる。
+
+    Args:
+        executable: LTspice実行ファイルのパス（内蔵ソルバーの場合は NATIVE_SIMULATOR）
+
+    Returns:
+        シミュレータ識別文字列
+    """
+    if executable == NATIVE_SIMULATOR:
+        return f"{NATIVE_SIMULATOR}|{NATIVE_SOLVER_VERSION}"
+    exe_path = Path(executable)
+    try:
+        stat = exe_path.stat()
+    except OSError:
+        return str(exe_path)
+    return f"{exe_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+class SimulationCache:
+    """変換後のネットリストをキーとするシミュレーション結果の永続キャッシュ。
+
+    キーは最終的なネットリストのテキスト（マイクロ記号の正規化、トーン/ボリューム切り替え、
+    スイッチ設定を全て反映した後の内容）、シミュレータ識別子、測定ノード名のハッシュ。
+    値は data_from_raw が返す各列をnpz形式で保存したもの。
+    サイズ上限を超えた場合は最終アクセスが古いものから削除する（LRU）。
+
+    Attributes:
+        root: キャッシュディレクトリ
+        max_bytes: キャッシュの最大サイズ [byte]
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(netlist_text: str, simulator_id: str) -> str:
+        """キャッシュキーを計算する。
+
+        Args:
+            netlist_text: シミュレーションに渡すネットリストのテキスト
+            simulator_id: simulator_identity の戻り値
+
+        Returns:
+            SHA-256の16進文字列
+        """
+        digest = hashlib.sha256()
+        for part in (netlist_text, simulator_id, TARGET_NODE.lower()):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+    def contains(self, key: str) -> bool:
+        """結果を読み込まずに、キャッシュにあるかどうかを返す。"""
+        return self._path(key).exists()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """キャッシュから結果を読み込む。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            キャッシュされたDataFrame（存在しない場合はNone）
+        """
+        path = self._path(key)
+        with measure_stage("cache_get") as stage:
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    df = pd.DataFrame({name: data[name] for name in data.files})
+            except FileNotFoundError:
+                stage["hit"] = False
+                return None
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+                # 書きかけ・壊れたエントリ（中断した put など）は削除し、キャッシュに無い場合と同じく扱う
+                stage["hit"] = False
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                return None
+            stage["hit"] = True
+            stage["bytes_read"] = file_size(path)
+        # 最終アクセス時刻を更新（LRU用）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """結果をキャッシュに保存する。
+
+        並列実行中の他プロセス・他スレッドと衝突しないよう、一時ファイルに書き込んでから置き換える。
+
+        Args:
+            key: キャッシュキー
+            df: 保存するDataFrame
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}-{threading.get_ident()}.tmp.npz")
+        with measure_stage("cache_put") as stage:
+            np.savez(tmp, **{str(col): df[col].to_numpy() for col in df.columns})
+            os.replace(tmp, path)
+            stage["bytes_written"] = file_size(path)
+
+    def evict(self) -> int:
+        """サイズ上限を超えた分を最終アクセスが古い順に削除する。
+
+        Returns:
+            削除したエントリ数
+        """
+        entries = []
+        for path in self.root.glob("*/*.npz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+# ========================================================================
+# 結果ファイルの書き出し（CSV / Parquet / Feather）
+# ========================================================================
+
+def result_path(outdir: Path, name: str, suffix: str, output_format: str = OUTPUT_FORMAT) -> Path:
+    """ケースの結果ファイルのパスを返す。
+
+    Args:
+        outdir: 出力フォルダ
+        name: ケース名
+        suffix: バリエーション名
+        output_format: 出力形式（"csv", "parquet", "feather"）
+
+    Returns:
+        結果ファイルのパス
+    """
+    return outdir / f"{PU_Name}__{name}_{suffix}{OUTPUT_SUFFIXES[output_format]}"
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """一時ファイルのパスを渡し、ブロックが正常に終了したら path に置き換える。
+
+    書き出し中に中断しても path には完全なファイルか何も無い状態しか残らない。
+    一時ファイルは同じフォルダの隠しファイル（"." で始まる名前）にする。
+
+    Args:
+        path: 最終的なファイルのパス
+
+    Yields:
+        書き込み先の一時ファイルのパス
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def write_frame(df: pd.DataFrame, path: Path, output_format: str = OUTPUT_FORMAT) -> None:
+    """DataFrameを指定された形式で書き出す。
+
+    CSVはExcelテンプレート（Module5）で読み込めるようcp932で書き出す。
+    Parquet/Feather（Arrow IPC）はpyarrowが必要。
+    一時ファイルに書き込んでから置き換えるため、中断しても書きかけのファイルは残らない。
+
+    Args:
+        df: 書き出すDataFrame
+        path: 書き出し先のパス
+        output_format: 出力形式（"csv", "parquet", "feather"）
+
+    Raises:
+        ValueError: 未対応の出力形式の場合
+    """
+    if output_format not in OUTPUT_SUFFIXES:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    with measure_stage(f"write_{output_format}") as stage, atomic_path(path) as tmp:
+        if output_format == "csv":
+            df.to_csv(tmp, index=False, encoding=PREFERRED_ENC)
+        elif output_format == "parquet":
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_feather(tmp)
+        stage["bytes_written"] = file_size(tmp)
+
+
+def write_dataset_partition(df: pd.DataFrame, dataset_dir: Path, name: str, suffix: str) -> Path:
+    """バッチ全体のParquetデータセットに1ケース分のパーティションを書き出す。
+
+    Hive形式（variant=<バリエーション>/case=<ケース名>/）のフォルダ構成にするため、
+    pd.read_parquet(dataset_dir) でバッチ全体を1回で読み込むと
+    variant・case が列として付加される（ステップパラメータは step_* 列）。
+    並列実行時も各ケースが別のフォルダに書き込むため衝突しない。
+
+    Args:
+        df: 書き出すDataFrame
+        dataset_dir: データセットのフォルダ
+        name: ケース名
+        suffix: バリエーション名
+
+    Returns:
+        書き出したParquetファイルのパス
+    """
+    part_dir = dataset_dir / f"variant={suffix}" / f"case={name}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    path = part_dir / "part-0.parquet"
+    with measure_stage("write_dataset_partition") as stage, atomic_path(path) as tmp:
+        df.to_parquet(tmp, index=False)
+        stage["bytes_written"] = file_size(tmp)
+    return path
+
+
+def unify_dataset_columns(dataset_dir: Path) -> None:
+    """データセット内の全パーティションの列を揃える。
+
+    VolバリエーションとToneバリエーションではステップパラメータの列（step_k / step_j）が
+    異なるが、Parquetデータセットを1回で読み込むと最初のファイルの列構成が使われる。
+    そのため、不足している列を欠損値（NaN）で補って全パーティションを同じ列構成にする。
+
+    Args:
+        dataset_dir: データセットのフォルダ
+    """
+    import pyarrow.parquet as pq
+
+    files = sorted(dataset_dir.glob("*/*/*.parquet"))
+    schemas = {path: pq.read_schema(path).names for path in files}
+    columns: list[str] = []
+    for names in schemas.values():
+        columns.extend(name for name in names if name not in columns)
+
+    for path, names in schemas.items():
+        if names != columns:
+            pd.read_parquet(path).reindex(columns=columns).to_parquet(path, index=False)
+
+
+# ========================================================================
+# 周波数特性の指標（共振周波数・ピーク・帯域幅・Q・高域の傾き）
+# ========================================================================
+
+def read_frame(path: Path, output_format: str = OUTPUT_FORMAT) -> pd.DataFrame:
+    """write_frame で書き出した結果ファイルを読み込む。
+
+    Args:
+        path: 結果ファイルのパス
+        output_format: 出力形式（"csv", "parquet", "feather"）
+
+    Returns:
+        data_from_raw の戻り値と同じ形式のDataFrame
+
+    Raises:
+        ValueError: 未対応の出力形式の場合
+    """
+    if output_format == "csv":
+        return pd.read_csv(path, encoding=PREFERRED_ENC)
+    if output_format == "parquet":
+        return pd.read_parquet(path)
+    if output_format == "feather":
+        return pd.read_feather(path)
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+
+@dataclass
+class StepArrays:
+    """1ケース分の結果を (ステップ, 周波数点) の2次元配列に並べたもの。
+
+    ステップごとの点数が異なる場合は、足りない部分をNaNで埋める。
+
+    Attributes:
+        freq: 周波数 [Hz]
+        mag_db: ゲイン [dB]
+        phase_deg: 位相 [度]
+        steps: ステップごとの step_index と step_* 列（配列の行と同じ順）
+    """
+
+    freq: np.ndarray
+    mag_db: np.ndarray
+    phase_deg: np.ndarray
+    steps: pd.DataFrame
+
+
+def stack_steps(df: pd.DataFrame) -> StepArrays:
+    """data_from_raw 形式のDataFrameをステップ×周波数の2次元配列に並べる。
+
+    Args:
+        df: data_from_raw の戻り値と同じ形式のDataFrame
+
+    Returns:
+        StepArrays
+    """
+    order = np.lexsort((df["frequency_Hz"].to_numpy(), df["step_index"].to_numpy()))
+    df = df.iloc[order].reset_index(drop=True)
+    steps, first, row_step, counts = np.unique(
+        df["step_index"].to_numpy(), return_index=True, return_inverse=True, return_counts=True
+    )
+    # 各行のステップ内での位置（ステップごとに連続して並べてあるため、先頭行からの差）
+    position = np.arange(len(df)) - first[row_step]
+
+    def stacked(column: str) -> np.ndarray:
+        out = np.full((len(steps), counts.max(initial=0)), np.nan)
+        out[row_step, position] = df[column].to_numpy(dtype=float)
+        return out
+
+    step_columns = ["step_index"] + [col for col in df.columns if str(col).startswith("step_") and col != "step_index"]
+    return StepArrays(
+        freq=stacked("frequency_Hz"),
+        mag_db=stacked("mag_dB"),
+        phase_deg=stacked("phase_deg"),
+        steps=df.loc[first, step_columns].reset_index(drop=True),
+    )
+
+
+def step_label(steps: pd.DataFrame, row: int) -> str:
+    """ステップの表示名（"k=0.5" など。パラメータが無ければステップ番号）。"""
+    params = [
+        f"{str(col)[5:]}={steps.at[row, col]:g}"
+        for col in steps.columns
+        if str(col).startswith("step_") and col != "step_index" and pd.notna(steps.at[row, col])
+    ]
+    return ", ".join(params) if params else f"step {steps.at[row, 'step_index']}"
+
+
+def response_metrics(
+    freq: np.ndarray,
+    mag_db: np.ndarray,
+    bandwidth_db: float = METRICS_BANDWIDTH_DB,
+    rolloff_from: float = METRICS_ROLLOFF_FROM,
+) -> dict[str, np.ndarray]:
+    """ステップ×周波数の配列から、共振の指標をステップごとに一括で求める。
+
+    - ピーク: 最大点と前後の点を log(周波数) 上の放物線で補間した頂点
+    - 帯域幅: ピークから bandwidth_db 下がる点（前後の点を log(周波数) 上で直線補間）の間隔
+    - Q: 共振周波数 / 帯域幅
+    - 高域の傾き: 共振周波数の rolloff_from 倍以上の帯域での最小二乗の傾き [dB/oct]
+
+    交点が測定範囲内に無い場合は NaN とする。
+
+    Args:
+        freq: 周波数 [Hz]（ステップ, 点数）。NaNは欠損
+        mag_db: ゲイン [dB]（ステップ, 点数）
+        bandwidth_db: 帯域幅を求めるピークからの低下量 [dB]
+        rolloff_from: 高域の傾きを求める帯域の下限（共振周波数の倍率）
+
+    Returns:
+        指標名→ステップごとの値の辞書
+    """
+    n_steps, n_points = mag_db.shape
+    rows = np.arange(n_steps)
+    cols = np.arange(n_points)
+    valid = ~np.isnan(mag_db) & (freq > 0)
+    x = np.log(np.where(valid, freq, 1.0))
+    y = np.where(valid, mag_db, -np.inf)
+
+    # 最大点と前後の点を通る放物線の頂点（中央の点を原点にして桁落ちを防ぐ）
+    peak = np.argmax(y, axis=1)
+    lo = np.clip(peak - 1, 0, n_points - 1)
+    hi = np.clip(peak + 1, 0, n_points - 1)
+    x1, y1 = x[rows, peak], y[rows, peak]
+    u0, u2 = x[rows, lo] - x1, x[rows, hi] - x1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d0 = (y[rows, lo] - y1) / u0
+        d2 = (y[rows, hi] - y1) / u2
+        a = (d2 - d0) / (u2 - u0)
+        b = d0 - a * u0
+        fit = (peak > 0) & (peak < n_points - 1) & valid[rows, lo] & valid[rows, hi] & (a < 0)
+        vertex = np.where(fit, np.clip(-b / (2.0 * a), u0, u2), 0.0)
+        peak_db = np.where(fit, y1 - b * b / (4.0 * a), y1)
+    f0 = np.exp(x1 + vertex)
+
+    # ピークから bandwidth_db 下がる点（ピークの前後で最も近い交点）
+    level = peak_db - bandwidth_db
+    below = y < level[:, None]
+    j_lo = np.where(below & (cols < peak[:, None]), cols, -1).max(axis=1)
+    j_hi = np.where(below & (cols > peak[:, None]), cols, n_points).min(axis=1)
+    has_lo, has_hi = j_lo >= 0, j_hi < n_points
+    a_lo, a_hi = np.clip(j_lo, 0, n_points - 2), np.clip(j_hi - 1, 0, n_points - 2)
+
+    def crossing(j: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (level - y[rows, j]) / (y[rows, j + 1] - y[rows, j])
+        return np.exp(x[rows, j] + np.clip(t, 0.0, 1.0) * (x[rows, j + 1] - x[rows, j]))
+
+    f_lo = np.where(has_lo, crossing(a_lo), np.nan)
+    f_hi = np.where(has_hi, crossing(a_hi), np.nan)
+    bandwidth = f_hi - f_lo
+
+    # 高域の傾き [dB/oct]（共振周波数の rolloff_from 倍以上の点で最小二乗）
+    octave = np.log2(np.where(valid, freq, 1.0))
+    band = valid & (freq >= rolloff_from * f0[:, None])
+    count = band.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = np.where(band, octave, 0.0).sum(axis=1) / count
+        mean_y = np.where(band, mag_db, 0.0).sum(axis=1) / count
+        dx = np.where(band, octave - mean_x[:, None], 0.0)
+        dy = np.where(band, mag_db - mean_y[:, None], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        q = f0 / bandwidth
+    first_valid = np.argmax(valid, axis=1)
+    low_db = mag_db[rows, first_valid]
+
+    return {
+        "f0_Hz": f0,
+        "peak_dB": peak_db,
+        "peak_rel_dB": peak_db - low_db,
+        "f_lo_Hz": f_lo,
+        "f_hi_Hz": f_hi,
+        "bandwidth_Hz": bandwidth,
+        "Q": q,
+        "rolloff_dB_per_oct": np.where(count >= 3, slope, np.nan),
+    }
+
+
+LoadedCase = tuple[str, str, StepArrays]
+"""(バリエーション名, ケース名, ステップ×周波数の配列)"""
+
+
+def load_batch(
+    outdir: Path,
+    cases: Sequence[tuple[str, str]],
+    output_format: str = OUTPUT_FORMAT,
+) -> list[LoadedCase]:
+    """バッチの全ケースの結果ファイルを読み込み、ステップ×周波数の配列に並べる。
+
+    結果ファイルが無いケース（失敗したケース）は除く。
+
+    Args:
+        outdir: 出力フォルダ
+        cases: (バリエーション名, ケース名) のリスト
+        output_format: 出力形式（"csv", "parquet", "feather"）
+
+    Returns:
+        LoadedCase のリスト
+    """
+    loaded = []
+    for suffix, name in cases:
+        path = result_path(outdir, name, suffix, output_format)
+        if path.exists():
+            loaded.append((suffix, name, stack_steps(read_frame(path, output_format))))
+    return loaded
+
+
+def batch_metrics(loaded: Sequence[LoadedCase]) -> pd.DataFrame:
+    """バッチの全ケース・全ステップの指標を1つの表にまとめる。
+
+    load_batch で並べた配列に response_metrics を適用する。
+
+    Args:
+        loaded: load_batch の戻り値
+
+    Returns:
+        1行が1ケース・1ステップの表（variant, case, step_index, step_*, 各指標）
+    """
+    tables = []
+    for suffix, name, arrays in loaded:
+        table = arrays.steps.copy()
+        table.insert(0, "case", name)
+        table.insert(0, "variant", suffix)
+        for key, values in response_metrics(arrays.freq, arrays.mag_db).items():
+            table[key] = values
+        tables.append(table)
+    if not tables:
+        return pd.DataFrame()
+    result = pd.concat(tables, ignore_index=True)
+    # ケースごとにステップパラメータが異なる場合も step_* 列を指標の前にまとめる
+    leading = ["variant", "case", "step_index"]
+    leading += [col for col in result.columns if str(col).startswith("step_") and col not in leading]
+    return result[leading + [col for col in result.columns if col not in leading]]
+
+
+# ========================================================================
+# 周波数軸の統一（全ケース・全ステップを共通の周波数で並べた表）
+# ========================================================================
+
+def canonical_frequencies(
+    loaded: Sequence[LoadedCase], points_per_decade: int = MERGE_POINTS_PER_DECADE
+) -> np.ndarray:
+    """バッチ全体で共通に使う対数等間隔の周波数軸を作成する。
+
+    全ケース・全ステップの周波数範囲を覆い、点の密度は最も細かいステップに合わせる
+    （適応スイープで一部の帯域だけ細かい場合は、その帯域の密度に合わせる）。
+    相対差 FREQ_RTOL 以内の点の間隔は同じ周波数の重複とみなして無視し、密度は
+    MERGE_MAX_POINTS_PER_DECADE までとする（ほぼ重複した点で軸が巨大にならないようにする）。
+
+    Args:
+        loaded: load_batch の戻り値
+        points_per_decade: 1デケードあたりの点数（0以下の場合は最も細かいステップに合わせる）
+
+    Returns:
+        周波数軸 [Hz]（昇順）
+    """
+    freqs = [arrays.freq for _, _, arrays in loaded if arrays.freq.size]
+    if not freqs:
+        return np.empty(0)
+    decades = np.log10(np.concatenate([freq.ravel() for freq in freqs]))
+    decades = decades[np.isfinite(decades)]
+    lo, hi = decades.min(), decades.max()
+    if points_per_decade <= 0:
+        # 各ステップの隣り合う点の間隔（デケード）のうち最も狭いもの（重複とみなす間隔は除く）
+        same = np.log10(1.0 + FREQ_RTOL)
+        steps = [np.diff(np.log10(freq), axis=1) for freq in freqs if freq.shape[1] > 1]
+        finest = min(
+            (np.nanmin(np.where(step > same, step, np.nan), initial=np.inf) for step in steps),
+            default=np.inf,
+        )
+        # （1/間隔 の丸め誤差で点数が1つ増えないよう、FREQ_RTOL だけ小さくしてから切り上げる）
+        points_per_decade = (
+            min(int(np.ceil((1.0 - FREQ_RTOL) / finest)), MERGE_MAX_POINTS_PER_DECADE)
+            if np.isfinite(finest) else 1
+        )
+    return np.logspace(lo, hi, max(int(round((hi - lo) * points_per_decade)) + 1, 2))
+
+
+def interp_log_frequency(freq: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """ステップ×周波数の配列を、全ステップまとめて共通の周波数軸に補間する。
+
+    log(周波数) 上で直線補間する。各ステップの周波数範囲の外は NaN とする。
+    ステップごとに np.interp を呼ぶ代わりに、ステップ番号ずつずらした log(周波数) を
+    1本の単調な軸に連結し、1回の np.interp で全ステップを補間する。
+
+    Args:
+        freq: 周波数 [Hz]（ステップ, 点数）。NaNは欠損（stack_steps の埋め草）
+        values: 補間する値（ステップ, 点数）
+        grid: 共通の周波数軸 [Hz]（昇順）
+
+    Returns:
+        補間した値（ステップ, len(grid)）
+    """
+    n_steps = freq.shape[0]
+    valid = np.isfinite(freq) & (freq > 0) & np.isfinite(values)
+    if not valid.any():
+        # 有効な点が1つも無い場合（全てNaNのステップだけ、または空の掃引）は全て NaN
+        return np.full((n_steps, len(grid)), np.nan)
+    x = np.log(np.where(valid, freq, 1.0))
+    query = np.log(grid)
+
+    # ステップごとに軸をずらして連結（ずらし幅は全体の範囲より広くし、ステップ同士が重ならないようにする）
+    lo = min(x[valid].min(initial=np.inf), query.min(initial=np.inf))
+    hi = max(x[valid].max(initial=-np.inf), query.max(initial=-np.inf))
+    span = (hi - lo) + 1.0 if np.isfinite(hi - lo) else 1.0
+    offset = np.arange(n_steps)[:, None] * span
+    result = np.interp((query + offset).ravel(), (x + offset)[valid], values[valid]).reshape(n_steps, -1)
+
+    # 各ステップの周波数範囲の外は補間しない
+    first = np.where(valid, x, np.inf).min(axis=1, keepdims=True)
+    last = np.where(valid, x, -np.inf).max(axis=1, keepdims=True)
+    inside = (query >= first - 1e-12) & (query <= last + 1e-12)
+    return np.where(inside, result, np.nan)
+
+
+def aligned_matrix(
+    loaded: Sequence[LoadedCase],
+    column: str = "mag_dB",
+    points_per_decade: int = MERGE_POINTS_PER_DECADE,
+) -> pd.DataFrame:
+    """全ケース・全ステップの値を共通の周波数軸に並べた横長の表を作成する。
+
+    Excelテンプレート（Module5）の、周波数を文字列にして辞書で突き合わせる処理の代わり。
+    ケースごとにLTspiceの周波数点が少し異なっても、補間して同じ行に並べる。
+
+    Args:
+        loaded: load_batch の戻り値
+        column: 並べる値（"mag_dB" または "phase_deg"）
+        points_per_decade: 共通の周波数軸の1デケードあたりの点数（0の場合は最も細かいステップに合わせる）
+
+    Returns:
+        1行が1周波数、1列が1ケース・1ステップの表
+        - frequency_Hz: 共通の周波数軸 [Hz]
+        - "{ケース名}_{バリエーション名}/{ステップ名}": 各ステップの値
+    """
+    attribute = {"mag_dB": "mag_db", "phase_deg": "phase_deg"}[column]
+    grid = canonical_frequencies(loaded, points_per_decade)
+    columns: dict[str, np.ndarray] = {"frequency_Hz": grid}
+    for suffix, name, arrays in loaded:
+        values = interp_log_frequency(arrays.freq, getattr(arrays, attribute), grid)
+        for row in range(len(arrays.steps)):
+            columns[f"{name}_{suffix}/{step_label(arrays.steps, row)}"] = values[row]
+    return pd.DataFrame(columns)
+
+
+# ========================================================================
+# グラフの描画（Excelテンプレートのマクロ Module5 / Module1 / Module2 の代わり）
+# ========================================================================
+
+# Module1.ChangeFontSizeAndBold_NoTitle の書式
+PLOT_FONT_SIZE = 16  # 目盛ラベルのフォントサイズ（軸タイトルは+2、凡例は-2）
+PLOT_FREQ_RANGE = (10.0, 20000.0)  # 横軸（周波数）の範囲 [Hz]
+PLOT_GAIN_MIN = -40.0  # 縦軸（ゲイン）の下限 [dB]。上限は最大値を10 dB単位で切り上げる
+PLOT_LINE_RGB = (10, 62, 85)  # 系列の線の色
+PLOT_LINE_WIDTH = 1.75  # 系列の線の太さ [pt]
+PLOT_TRANSPARENCY = (0.65, 0.05, 11)  # 系列の透明度（1本目, 最後, この本数以降は最後と同じ）
+PLOT_AXIS_RGB = (120, 120, 120)  # 軸・プロットエリアの枠線の色（太さ1.25）
+PLOT_GRID_RGB = ((160, 160, 160), (225, 225, 225))  # 目盛線の色（主, 補助。太さ0.5）
+PLOT_FIGSIZE = (10.0, 8.0)  # 画像の大きさ [inch]
+PLOT_DPI = 150  # PNGの解像度
+
+
+def _rgb(rgb: tuple[int, int, int]) -> tuple[float, float, float]:
+    """0～255のRGB値をmatplotlibの色に変換する。"""
+    return tuple(value / 255.0 for value in rgb)
+
+
+def _style_axes(ax, ylabel: str) -> None:
+    """Module1 の書式（灰色の枠線と目盛線、対数の周波数軸、タイトル無し）を適用する。"""
+    from matplotlib.ticker import FuncFormatter
+
+    for spine in ax.spines.values():
+        spine.set_color(_rgb(PLOT_AXIS_RGB))
+        spine.set_linewidth(1.25)
+    ax.set_xscale("log")
+    ax.set_xlim(*PLOT_FREQ_RANGE)
+    ax.xaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:g}"))
+    ax.grid(True, which="major", color=_rgb(PLOT_GRID_RGB[0]), linewidth=0.5)
+    ax.grid(True, which="minor", color=_rgb(PLOT_GRID_RGB[1]), linewidth=0.5)
+    ax.set_axisbelow(True)
+    ax.tick_params(which="both", direction="out", colors=_rgb(PLOT_AXIS_RGB),
+                   labelcolor="black", labelsize=PLOT_FONT_SIZE)
+    ax.set_ylabel(ylabel, fontsize=PLOT_FONT_SIZE + 2)
+
+
+def plot_case(
+    result_file: Path,
+    plot_dir: Path,
+    formats: Sequence[str] = PLOT_FORMATS,
+    output_format: str = OUTPUT_FORMAT,
+) -> list[Path]:
+    """1ケースの結果ファイルから、ゲインと位相のグラフを画像で書き出す。
+
+    Excelテンプレートと同じく、全ステップを同じ色で重ね、後のステップほど不透明にする。
+    画面の無い環境でも動作するよう、matplotlibの非対話型のバックエンド（Agg）で描画する。
+
+    Args:
+        result_file: 結果ファイルのパス
+        plot_dir: 画像を書き出すフォルダ
+        formats: 画像形式（"png", "svg"）のリスト
+        output_format: 結果ファイルの形式（"csv", "parquet", "feather"）
+
+    Returns:
+        書き出した画像のパスのリスト
+
+    Raises:
+        RuntimeError: matplotlibがインストールされていない場合
+    """
+    try:
+        import matplotlib
+    except ImportError as exc:
+        raise RuntimeError("Plotting requires matplotlib (pip install matplotlib)") from exc
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import MultipleLocator
+
+    with case_scope(result_file.stem), measure_stage("plot_case") as info:
+        arrays = stack_steps(read_frame(result_file, output_format))
+        info["bytes_read"] = file_size(result_file)
+
+        fig = Figure(figsize=PLOT_FIGSIZE, layout="constrained")
+        gain_ax, phase_ax = fig.subplots(2, 1, sharex=True, height_ratios=(2, 1))
+        start, end, count = PLOT_TRANSPARENCY
+        for row in range(len(arrays.steps)):
+            transparency = start + (end - start) * min(row, count - 1) / (count - 1)
+            style = dict(color=_rgb(PLOT_LINE_RGB), alpha=1.0 - transparency, linewidth=PLOT_LINE_WIDTH)
+            gain_ax.plot(arrays.freq[row], arrays.mag_db[row], label=step_label(arrays.steps, row), **style)
+            phase_ax.plot(arrays.freq[row], arrays.phase_deg[row], **style)
+
+        _style_axes(gain_ax, "Gain (dB)")
+        peak = np.nanmax(arrays.mag_db) if np.isfinite(arrays.mag_db).any() else 0.0
+        gain_ax.set_ylim(PLOT_GAIN_MIN, max(np.ceil(peak / 10.0) * 10.0, PLOT_GAIN_MIN + 10.0))
+        gain_ax.yaxis.set_major_locator(MultipleLocator(10))
+        gain_ax.yaxis.set_minor_locator(MultipleLocator(5))
+        if len(arrays.steps) > 1:
+            legend = gain_ax.legend(fontsize=PLOT_FONT_SIZE - 2, framealpha=0.9)
+            legend.get_frame().set_facecolor("white")
+
+        _style_axes(phase_ax, "Phase (deg)")
+        phase_ax.set_ylim(-180, 180)
+        phase_ax.yaxis.set_major_locator(MultipleLocator(90))
+        phase_ax.yaxis.set_minor_locator(MultipleLocator(45))
+        phase_ax.set_xlabel("Frequency (Hz)", fontsize=PLOT_FONT_SIZE + 2)
+
+        plot_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for fmt in formats:
+            path = plot_dir / f"{result_file.stem}.{fmt}"
+            with atomic_path(path) as tmp:
+                fig.savefig(tmp, format=fmt, dpi=PLOT_DPI)
+            info["bytes_written"] = info.get("bytes_written", 0) + file_size(path)
+            paths.append(path)
+    return paths
+
+
+def plot_results(
+    result_files: Sequence[Path],
+    plot_dir: Path,
+    formats: Sequence[str] = PLOT_FORMATS,
+    output_format: str = OUTPUT_FORMAT,
+    max_workers: int = PLOT_WORKERS,
+) -> list[Path]:
+    """プロセスプールで全ケースのグラフを同時に描画する。
+
+    Args:
+        result_files: 結果ファイルのパスのリスト
+        plot_dir: 画像を書き出すフォルダ
+        formats: 画像形式（"png", "svg"）のリスト
+        output_format: 結果ファイルの形式（"csv", "parquet", "feather"）
+        max_workers: 同時に描画するプロセス数の上限
+
+    Returns:
+        書き出した画像のパスのリスト
+
+    Raises:
+        RuntimeError: 1つ以上のケースの描画に失敗した場合（全ケースの終了後に送出）
+    """
+    if max_workers <= 1 or len(result_files) <= 1:
+        return [path for result_file in result_files
+                for path in plot_case(result_file, plot_dir, formats, output_format)]
+
+    written: list[Path] = []
+    failures: list[str] = []
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(result_files))) as pool:
+        futures = {
+            pool.submit(call_with_stage_records, plot_case, result_file, plot_dir, formats, output_format):
+                result_file
+            for result_file in result_files
+        }
+        for future in as_completed(futures):
+            try:
+                paths, records = future.result()
+            except Exception as exc:
+                failures.append(f"{futures[future].name}: {exc}")
+                continue
+            add_stage_records(records)
+            written.extend(paths)
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(result_files)} plots failed.\n" + "\n".join(failures)
+        )
+    return written
+
+
+# ========================================================================
+# シミュレーション実行
+# ========================================================================
+
+def run_to_raw(
+    kind: str,
+    edited_file: Path,
+    executable: str = LTSPICE_EXE,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> Path:
+    """書き出し済みの回路ファイルでシミュレーションを実行し、RAWファイルのパスを返す。
+
+    Args:
+        kind: ファイル形式（"asc" または "spice"）
+        edited_file: シミュレーション対象のファイルパス
+        executable: LTspice実行ファイルのパス
+        timeout: LTspice 1回の実行の制限時間 [秒]
+
+    Returns:
+        作成されたRAWファイルのパス
+
+    Raises:
+        RuntimeError: RAWファイルが作成されず、ログファイルがある場合
+        FileNotFoundError: RAWファイルもログファイルも見つからない場合
+    """
+    # シミュレーション実行
+    run_simulation(kind, edited_file, executable, timeout)
+
+    # RAWファイルの確認
+    raw_path = edited_file.with_suffix(".raw")
+    if not raw_path.exists():
+        log_path = edited_file.with_suffix(".log")
+        if log_path.exists():
+            tail = "\n".join(log_path.read_text(errors="ignore").splitlines()[-120:])
+            raise RuntimeError(
+                "Simulation finished without producing a RAW file.\n"
+                f"Log: {log_path}\n---- log tail ----\n{tail}\n------------------",
+            )
+        raise FileNotFoundError(f"Expected RAW file not found: {raw_path}")
+    return raw_path
+
+
+def run_and_parse(
+    kind: str,
+    edited_file: Path,
+    executable: str = LTSPICE_EXE,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> pd.DataFrame:
+    """書き出し済みの回路ファイルでシミュレーションを実行し、RAWファイルを読み込む。
+
+    Args:
+        kind: ファイル形式（"asc" または "spice"）
+        edited_file: シミュレーション対象のファイルパス
+        executable: LTspice実行ファイルのパス
+        timeout: LTspice 1回の実行の制限時間 [秒]
+
+    Returns:
+        data_from_raw の戻り値
+    """
+    if executable == NATIVE_SIMULATOR:
+        return simulate_native(kind, read_text_auto(edited_file))
+    raw_path = run_to_raw(kind, edited_file, executable, timeout)
+    with measure_stage("data_from_raw") as stage:
+        stage["bytes_read"] = file_size(raw_path)
+        return data_from_raw(raw_path)
+
+
+@dataclass
+class SimulationOutput:
+    """シミュレーション段階の結果（RAWファイルの読み込み前）。
+
+    シミュレーション（LTspiceの実行）とRAWファイルの読み込みを別々のスレッドで
+    行えるよう、start_simulation と finish_simulation の間で受け渡す。
+
+    Attributes:
+        raw_path: 読み込み待ちのRAWファイルのパス（dfがある場合はNone）
+        df: 読み込み済みの結果（キャッシュヒット時、内蔵ソルバーの結果など）
+        cache_key: 読み込んだ結果を保存するキャッシュキー（キャッシュ無効時はNone）
+        cached: dfがキャッシュの結果の場合はTrue
+    """
+
+    raw_path: Optional[Path] = None
+    df: Optional[pd.DataFrame] = None
+    cache_key: Optional[str] = None
+    cached: bool = False
+
+
+def start_simulation(
+    input_path: Path,
+    work_dir: Path,
+    component_values: dict[str, str],
+    text_transform: Optional[TextTransform] = None,
+    executable: str = LTSPICE_EXE,
+    cache: Optional[SimulationCache] = None,
+    instructions: Sequence[str] = (),
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> SimulationOutput:
+    """部品値を設定した回路でシミュレーションを実行し、RAWファイルを読み込まずに返す。
+
+    入力ファイルのテンプレートからネットリストをメモリ上で生成し、作業ディレクトリに
+    1回だけ書き出す。キャッシュにヒットした場合はファイルを書き出さない。
+    テンプレートで部品が見つからない場合は spicelib のエディタで編集する
+    （この場合はRAWファイルの読み込みまで行う）。
+
+    Args:
+        input_path: 入力ファイル（.ascまたは.cirファイル）のパス
+        work_dir: 編集済み回路ファイルとRAWファイルを置く作業ディレクトリ
+        component_values: 部品名→設定値の辞書（例: {"V2": "5", ...}）
+        text_transform: テキスト変換関数（トーン/ボリューム切り替え等）
+        executable: LTspice実行ファイルのパス
+        cache: シミュレーション結果キャッシュ（Noneの場合は常にシミュレーションを実行）
+        instructions: 追加するSPICEディレクティブ（例: ".step param case list 1 2"）
+        timeout: LTspice 1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
+
+    Returns:
+        SimulationOutput（finish_simulation に渡す）
+    """
+    template = load_netlist_template(input_path)
+    if not template.has_components(list(component_values)):
+        df, cached = simulate_frame_with_editor(
+            input_path, work_dir, component_values, text_transform, executable, cache,
+            instructions, timeout,
+        )
+        return SimulationOutput(df=df, cached=cached)
+
+    with measure_stage("render_netlist"):
+        netlist = template.render(component_values, text_transform, instructions)
+
+    # 最終的なネットリストが同じであればキャッシュの結果を再利用
+    cache_key = None
+    if cache is not None:
+        cache_key = SimulationCache.make_key(netlist, simulator_identity(executable))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return SimulationOutput(df=cached, cached=True)
+
+    return launch_netlist(
+        template.kind, netlist, template.output_name, work_dir, executable, timeout, cache_key
+    )
+
+
+def launch_netlist(
+    kind: str,
+    netlist: str,
+    output_name: str,
+    work_dir: Path,
+    executable: str = LTSPICE_EXE,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+    cache_key: Optional[str] = None,
+) -> SimulationOutput:
+    """生成済みのネットリストでシミュレーションを実行し、RAWファイルを読み込まずに返す。
+
+    Args:
+        kind: ファイル形式（"asc" または "spice"）
+        netlist: ネットリストのテキスト
+        output_name: 作業ディレクトリに書き出すファイルの名前
+        work_dir: 回路ファイルとRAWファイルを置く作業ディレクトリ
+        executable: LTspice実行ファイルのパス（NATIVE_SIMULATOR の場合は内蔵ソルバー）
+        timeout: LTspice 1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
+        cache_key: 読み込んだ結果を保存するキャッシュキー
+
+    Returns:
+        SimulationOutput（finish_simulation に渡す）
+    """
+    if executable == NATIVE_SIMULATOR:
+        # 内蔵ソルバーはファイルを書き出さずにメモリ上のネットリストを解く
+        return SimulationOutput(df=simulate_native(kind, netlist), cache_key=cache_key)
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    edited_file = work_dir / output_name
+    with measure_stage("write_netlist") as stage:
+        write_text_cp932(edited_file, netlist)
+        stage["bytes_written"] = file_size(edited_file)
+
+    raw_path = run_to_raw(kind, edited_file, executable, timeout)
+    return SimulationOutput(raw_path=raw_path, cache_key=cache_key)
+
+
+def finish_simulation(
+    output: SimulationOutput, cache: Optional[SimulationCache] = None
+) -> tuple[pd.DataFrame, bool]:
+    """start_simulation の結果からRAWファイルを読み込み、キャッシュに保存する。
+
+    Args:
+        output: start_simulation の戻り値
+        cache: シミュレーション結果キャッシュ（Noneの場合は保存しない）
+
+    Returns:
+        (df, cached) のタプル
+        - df: data_from_raw の戻り値と同じ形式のDataFrame
+        - cached: キャッシュの結果を再利用した場合はTrue
+    """
+    if output.df is not None:
+        if output.cached or output.cache_key is None:
+            return output.df, output.cached
+        df = output.df
+    else:
+        with measure_stage("data_from_raw") as stage:
+            stage["bytes_read"] = file_size(output.raw_path)
+            df = data_from_raw(output.raw_path)
+    if cache is not None and output.cache_key is not None:
+        cache.put(output.cache_key, df)
+    return df, False
+
+
+def simulate_frame(
+    input_path: Path,
+    work_dir: Path,
+    component_values: dict[str, str],
+    text_transform: Optional[TextTransform] = None,
+    executable: str = LTSPICE_EXE,
+    cache: Optional[SimulationCache] = None,
+    instructions: Sequence[str] = (),
+    adaptive: Optional[AdaptiveSweep] = None,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> tuple[pd.DataFrame, bool]:
+    """部品値を設定した回路でシミュレーションを実行し、周波数特性データを返す。
+
+    start_simulation と finish_simulation を続けて実行する。
+    adaptive を指定した場合は simulate_frame_adaptive で適応周波数スイープを行う。
+
+    Args:
+        input_path: 入力ファイル（.ascまたは.cirファイル）のパス
+        work_dir: 編集済み回路ファイルとRAWファイルを置く作業ディレクトリ
+        component_values: 部品名→設定値の辞書（例: {"V2": "5", ...}）
+        text_transform: テキスト変換関数（トーン/ボリューム切り替え等）
+        executable: LTspice実行ファイルのパス
+        cache: シミュレーション結果キャッシュ（Noneの場合は常にシミュレーションを実行）
+        instructions: 追加するSPICEディレクティブ（例: ".step param case list 1 2"）
+        adaptive: 適応周波数スイープの設定（Noneの場合は回路ファイルの .ac のまま実行）
+        timeout: LTspice 1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
+
+    Returns:
+        (df, cached) のタプル
+        - df: data_from_raw の戻り値と同じ形式のDataFrame
+        - cached: キャッシュの結果を再利用した場合はTrue
+    """
+    if adaptive is not None:
+        return simulate_frame_adaptive(
+            input_path, work_dir, component_values, text_transform, executable, cache,
+            instructions, adaptive, timeout,
+        )
+
+    output = start_simulation(
+        input_path, work_dir, component_values, text_transform, executable, cache, instructions,
+        timeout,
+    )
+    return finish_simulation(output, cache)
+
+
+def simulate_frame_with_editor(
+    input_path: Path,
+    work_dir: Path,
+    component_values: dict[str, str],
+    text_transform: Optional[TextTransform] = None,
+    executable: str = LTSPICE_EXE,
+    cache: Optional[SimulationCache] = None,
+    instructions: Sequence[str] = (),
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> tuple[pd.DataFrame, bool]:
+    """spicelibのエディタで部品値を設定してシミュレーションを実行する。
+
+    NetlistTemplate で部品の値の位置を特定できない回路ファイル用。
+    引数と戻り値は simulate_frame と同じ。
+    """
+    with measure_stage("prepare_editor"):
+        editor, edited_file, kind, restore_text = prepare_editor(
+            input_path, work_dir, text_transform=text_transform
+        )
+
+    try:
+        with measure_stage("set_component_values"):
+            for ref, value in component_values.items():
+                editor.set_component_value(ref, value)
+            for instruction in instructions:
+                editor.add_instruction(instruction)
+
+            # 既存の.wrdataディレクティブを削除
+            remove_existing_wrdata_quietly(editor, edited_file)
+
+        # エディタの内容を保存
+        with measure_stage("write_editor") as stage:
+            write_editor(editor, edited_file, kind)
+            stage["bytes_written"] = file_size(edited_file)
+
+        # 最終的なネットリストが同じであればキャッシュの結果を再利用
+        cache_key = None
+        if cache is not None:
+            cache_key = SimulationCache.make_key(
+                read_text_auto(edited_file), simulator_identity(executable)
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached, True
+
+        df = run_and_parse(kind, edited_file, executable, timeout)
+        if cache is not None and cache_key is not None:
+            cache.put(cache_key, df)
+        return df, False
+    finally:
+        # ファイルを元の状態に戻す
+        write_text_cp932(edited_file, restore_text)
+
+
+def run_case(
+    input_path: Path,
+    out_path: Path,
+    component_values: dict[str, str],
+    text_transform: Optional[TextTransform] = None,
+    executable: str = LTSPICE_EXE,
+    work_dir: Optional[Path] = None,
+    cache: Optional[SimulationCache] = None,
+    output_format: str = OUTPUT_FORMAT,
+    adaptive: Optional[AdaptiveSweep] = None,
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> tuple[pd.DataFrame, bool]:
+    """1つのスイッチ組み合わせでシミュレーションを実行し、結果をファイルに保存する。
+
+    Args:
+        input_path: 入力ファイル（.ascまたは.cirファイル）のパス
+        out_path: 出力ファイルのパス
+        component_values: スイッチ電源名→設定値の辞書（例: {"V2": "5", "V3": "0", ...}）
+        text_transform: テキスト変換関数（トーン/ボリューム切り替え等）
+        executable: LTspice実行ファイルのパス
+        work_dir: 編集済み回路ファイルとRAWファイルを置く作業ディレクトリ
+            （Noneの場合は出力ファイルと同じディレクトリ）
+        cache: シミュレーション結果キャッシュ（Noneの場合は常にシミュレーションを実行）
+        output_format: 出力形式（"csv", "parquet", "feather"）
+        adaptive: 適応周波数スイープの設定（Noneの場合は回路ファイルの .ac のまま実行）
+        timeout: LTspice 1回の実行の制限時間 [秒]（Noneまたは0以下の場合は無制限）
+
+    Returns:
+        (df, cached) のタプル
+        - df: 保存したDataFrame
+        - cached: キャッシュの結果を再利用した場合はTrue
+    """
+    work_dir = work_dir if work_dir is not None else out_path.parent
+    df, cached = simulate_frame(
+        input_path,
+        work_dir,
+        component_values,
+        text_transform=text_transform,
+        executable=executable,
+        cache=cache,
+        adaptive=adaptive,
+        timeout=timeout,
+    )
+    write_frame(df, out_path, output_format)
+    return df, cached
+
+
+# ========================================================================
+# 適応周波数スイープ（応答が曲がっている帯域だけを細かく再シミュレーション）
+# ========================================================================
+
+_AC_LINE = re.compile(r"(?im)^(TEXT\s[^\r\n]*?!|[ \t]*)\.ac\s[^\r\n]*")
+_SPICE_NUMBER = re.compile(r"^([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpf])?", re.IGNORECASE)
+_SPICE_SCALE = {
+    "t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3,
+    "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15,
+}  # SPICEの単位接頭辞
+
+
+def parse_spice_number(text: str) -> float:
+    """SPICEの数値表記（例: "50k", "0.022u", "1Meg"）を数値に変換する。
+
+    Raises:
+        ValueError: 数値として解釈できない場合
+    """
+    match = _SPICE_NUMBER.match(text.strip())
+    if match is None:
+        raise ValueError(f"Not a SPICE number: {text!r}")
+    scale = _SPICE_SCALE.get((match.group(2) or "").lower(), 1.0)
+    return float(match.group(1)) * scale
+
+
+@dataclass(frozen=True)
+class AdaptiveSweep:
+    """適応周波数スイープの設定。
+
+    Attributes:
+        coarse_per_octave: 最初のスイープの1オクターブあたりの点数
+        tol_db: 許容するゲインの補間誤差 [dB]
+        tol_deg: 許容する位相の補間誤差 [度]
+        max_passes: 再シミュレーションする最大回数
+    """
+
+    coarse_per_octave: int = ADAPTIVE_COARSE_PER_OCT
+    tol_db: float = ADAPTIVE_TOL_DB
+    tol_deg: float = ADAPTIVE_TOL_DEG
+    max_passes: int = ADAPTIVE_MAX_PASSES
+
+
+@dataclass(frozen=True)
+class AcSweepTransform:
+    """回路ファイルの .ac ディレクティブを差し替えるテキスト変換。
+
+    ParamTransform と同様に、プロセスプールへ渡せてハッシュ可能なモジュールレベルのクラス。
+
+    Attributes:
+        base: 先に適用するテキスト変換（Noneの場合は無し）
+        directive: 差し替え後の .ac ディレクティブ（例: ".ac list 10 20 40"）
+    """
+
+    base: Optional[TextTransform]
+    directive: str
+
+    def __call__(self, text: str) -> str:
+        if self.base is not None:
+            text = self.base(text)
+        text, count = _AC_LINE.subn(lambda m: m.group(1) + self.directive, text, count=1)
+        if count == 0:
+            raise KeyError(".ac directive not found in the netlist")
+        return text
+
+
+def read_ac_sweep(text: str) -> tuple[str, str, float]:
+    """ネットリストの .ac ディレクティブから掃引範囲と周波数の刻みを読み取る。
+
+    Args:
+        text: ネットリスト（.ascまたはSPICE）のテキスト
+
+    Returns:
+        (start, stop, step_octaves) のタプル
+        - start, stop: 開始・終了周波数 [Hz]
+        - step_octaves: 元のスイープの周波数の刻み [オクターブ]
+
+    Raises:
+        ValueError: .ac が見つからない場合、oct/dec 以外のスイープの場合
+    """
+    match = _AC_LINE.search(text)
+    if match is None:
+        raise ValueError(".ac directive not found in the netlist")
+    tokens = match.group(0)[len(match.group(1)):].split()
+    if len(tokens) < 5 or tokens[1].lower() not in ("oct", "dec"):
+        raise ValueError(f"Adaptive sweep requires an oct/dec .ac sweep: {' '.join(tokens)}")
+    points = float(parse_spice_number(tokens[2]))
+    step_octaves = (1.0 if tokens[1].lower() == "oct" else np.log2(10.0)) / points
+    return parse_spice_number(tokens[3]), parse_spice_number(tokens[4]), step_octaves
+
+
+def merge_sweeps(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """複数回のスイープ結果を、ステップごとに周波数順で1つのDataFrameにまとめる。
+
+    Args:
+        frames: data_from_raw の戻り値と同じ形式のDataFrameのリスト
+
+    Returns:
+        ステップ番号・周波数の順に並べ、重複する周波数（相対差 FREQ_RTOL 以内）を除いたDataFrame
+    """
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.sort_values(["step_index", "frequency_Hz"], kind="mergesort")
+    # 丸め誤差だけ異なる周波数も重複とみなし、先に並んだ点（先のスイープの点）を残す
+    freq = merged["frequency_Hz"].to_numpy()
+    step = merged["step_index"].to_numpy()
+    duplicate = np.zeros(len(merged), dtype=bool)
+    duplicate[1:] = (step[1:] == step[:-1]) & (freq[1:] <= freq[:-1] * (1.0 + FREQ_RTOL))
+    return merged[~duplicate].reset_index(drop=True)
+
+
+def refine_frequencies(
+    df: pd.DataFrame, min_octaves: float, tol_db: float, tol_deg: float
+) -> np.ndarray:
+    """補間誤差が許容値を超える区間の中点の周波数を返す。
+
+    隣り合う点の間を対数周波数で直線補間したときの誤差を、2階差分から
+    h^2 / 8 * |y''| として見積もる。ステップごとに判定し、いずれかのステップで
+    誤差が大きい区間の中点をまとめて返す（追加する周波数は全ステップで共通）。
+    ステップごとの点数が異なる場合（stack_steps でNaNを埋めた部分）も扱える。
+    位相は折り返しを除いてから評価する。
+
+    Args:
+        df: data_from_raw の戻り値と同じ形式のDataFrame（merge_sweeps で並べたもの）
+        min_octaves: これより狭い区間は分割しない [オクターブ]
+        tol_db: 許容するゲインの補間誤差 [dB]
+        tol_deg: 許容する位相の補間誤差 [度]
+
+    Returns:
+        追加でシミュレーションする周波数 [Hz]（昇順）
+    """
+    arrays = stack_steps(df)
+    if arrays.freq.shape[1] < 3:
+        return np.empty(0)
+
+    # 点数の少ないステップの末尾はNaN（NaNを含む区間は判定から外れる）
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.log2(arrays.freq)
+    h = np.diff(x, axis=1)
+    phase = np.unwrap(arrays.phase_deg, period=360.0, axis=1)
+
+    def interpolation_error(y: np.ndarray) -> np.ndarray:
+        slope = np.diff(y, axis=1) / h
+        d2 = np.full_like(y, np.nan)
+        d2[:, 1:-1] = 2.0 * np.diff(slope, axis=1) / (h[:, :-1] + h[:, 1:])
+        # 両端の区間は隣の点の2階差分を使う（fmax はNaNでない方を返す）
+        curvature = np.fmax(np.abs(d2[:, :-1]), np.abs(d2[:, 1:]))
+        return h ** 2 / 8.0 * curvature
+
+    with np.errstate(invalid="ignore"):
+        split = (
+            (interpolation_error(arrays.mag_db) > tol_db) | (interpolation_error(phase) > tol_deg)
+        ) & (h > min_octaves)
+    midpoints = np.sort(np.exp2((x[:, :-1] + x[:, 1:])[split] / 2.0))
+    # ステップ間で同じ区間の中点は1つにまとめる
+    keep = np.ones(len(midpoints), dtype=bool)
+    keep[1:] = midpoints[1:] > midpoints[:-1] * (1.0 + FREQ_RTOL)
+    return midpoints[keep]
+
+
+def simulate_frame_adaptive(
+    input_path: Path,
+    work_dir: Path,
+    component_values: dict[str, str],
+    text_transform: Optional[TextTransform] = None,
+    executable: str = LTSPICE_EXE,
+    cache: Optional[SimulationCache] = None,
+    instructions: Sequence[str] = (),
+    adaptive: AdaptiveSweep = AdaptiveSweep(),
+    timeout: Optional[float] = LTSPICE_TIMEOUT,
+) -> tuple[pd.DataFrame, bool]:
+    """粗いスイープの後、補間誤差が大きい帯域だけを再シミュレーションする。
+
+    回路ファイルの .ac と同じ範囲（両端を含む）を coarse_per_octave 点/オクターブで
+    シミュレーションし、refine_frequencies で選んだ周波数を追加でシミュレーションする。
+    周波数は全て ".ac list" で指定する。
+    これを誤差が許容値に収まるか、元の .ac の刻みに達するまで繰り返し、
+    結果を1つの周波数軸にまとめる。平坦な帯域は粗いまま残るため、
+    シミュレーションする点数とRAWファイルのサイズを大きく減らせる。
+    引数は simulate_frame と同じ（各回のシミュレーション結果もキャッシュされる）。
+
+    Returns:
+        (df, cached) のタプル
+        - df: data_from_raw の戻り値と同じ形式のDataFrame
+        - cached: 全ての回でキャッシュの結果を再利用した場合はTrue
+    """
+    text = normalize_micro_symbols(read_text_auto(input_path))
+    if text_transform is not None:
+        text = text_transform(text)
+    start, stop, step_octaves = read_ac_sweep(text)
+
+    n_coarse = int(np.ceil(np.log2(stop / start) * adaptive.coarse_per_octave)) + 1
+    directive = ".ac list " + " ".join(f"{f:.9g}" for f in np.geomspace(start, stop, n_coarse))
+    df, all_cached = simulate_frame(
+        input_path, work_dir, component_values, AcSweepTransform(text_transform, directive),
+        executable, cache, instructions, timeout=timeout,
+    )
+    for _ in range(adaptive.max_passes):
+        freqs = refine_frequencies(df, step_octaves, adaptive.tol_db, adaptive.tol_deg)
+        if len(freqs) == 0:
+            break
+        directive = ".ac list " + " ".join(f"{f:.9g}" for f in freqs)
+        extra, cached = simulate_frame(
+            input_path, work_dir, component_values, AcSweepTransform(text_transform, directive),
+            executable, cache, instructions, timeout=timeout,
+        )
+        df = merge_sweeps([df, extra])
+        all_cached = all_cached and cached
+    return df, all_cached
+
+
+# ========================================================================
+# シナリオ定義（スイッチの組み合わせ・モード・掃引パラメータ）
+# ========================================================================
+
+TEXT_TRANSFORMS: dict[str, Optional[TextTransform]] = {
+    "none": None,
+    "tone": tone_param_transform,
+    "knobs": knob_grid_transform,
+}  # シナリオファイルのモードで指定できるテキスト変換（"transform" の値）
+
+SCENARIO_EXPAND = ("presets", "product", "both")  # 組み合わせの展開方法
+
+
+@dataclass(frozen=True)
+class ParamTransform:
+    """.param の値を上書きするテキスト変換。
+
+    シナリオファイルのモードや掃引パラメータから作成する。プロセスプールへ渡せるよう
+    モジュールレベルのクラスとし、NetlistTemplate の変換結果の記録に使えるようハッシュ可能にする。
+
+    Attributes:
+        base: 先に適用するテキスト変換（Noneの場合は無し）
+        params: (パラメータ名, 値) のタプル
+    """
+
+    base: Optional[TextTransform]
+    params: tuple[tuple[str, str], ...]
+
+    def __call__(self, text: str) -> str:
+        if self.base is not None:
+            text = self.base(text)
+        lines = text.splitlines(keepends=True)
+        for name, value in self.params:
+            pattern = re.compile(rf"(?<![\w.])({re.escape(name)}\s*=\s*)([^\s]+)", re.IGNORECASE)
+            found = False
+            for i, line in enumerate(lines):
+                # 有効な .param 行（.ascでは "!.param"）だけを書き換える
+                stripped = line.lstrip()
+                if not (stripped.lower().startswith(".param") or "!.param" in line.lower()):
+                    continue
+                lines[i], count = pattern.subn(lambda m: m.group(1) + value, line)
+                found = found or count > 0
+            if not found:
+                raise KeyError(f".param {name} not found in the netlist")
+        return "".join(lines)
+
+
+KNOB_PARAMS = ("j", "k")  # ノブの位置を表す .step パラメータ（トーン, ボリューム）
+
+
+@dataclass(frozen=True)
+class KnobGridTransform:
+    """ノブの .step の点数を変更するテキスト変換。
+
+    有効な ".step param j|k 開始 終了 増分" を、同じ範囲を points 点で刻む増分に書き換える。
+    シナリオファイルのモードの knob_points から作成する。
+
+    Attributes:
+        base: 先に適用するテキスト変換（Noneの場合は無し）
+        points: ノブ1つあたりの点数
+    """
+
+    base: Optional[TextTransform]
+    points: int
+
+    def __call__(self, text: str) -> str:
+        if self.base is not None:
+            text = self.base(text)
+        names = "|".join(KNOB_PARAMS)
+        pattern = re.compile(
+            rf"(\.step\s+param\s+(?:{names})\s+)(\S+)(\s+)(\S+)\s+\S+", re.IGNORECASE
+        )
+
+        def regrid(match: re.Match) -> str:
+            start, stop = parse_spice_number(match.group(2)), parse_spice_number(match.group(4))
+            inc = (stop - start) / max(self.points - 1, 1)
+            return f"{match.group(1)}{match.group(2)}{match.group(3)}{match.group(4)} {inc:.12g}"
+
+        return pattern.sub(regrid, text)
+
+
+@dataclass
+class Scenario:
+    """シナリオファイルから展開したケース表。
+
+    Attributes:
+        cases: (ケース名, スイッチ設定辞書) のリスト
+        variants: (バリエーション名, テキスト変換) のリスト
+    """
+
+    cases: list[tuple[str, dict[str, str]]]
+    variants: list[tuple[str, Optional[TextTransform]]]
+
+
+def load_scenario_spec(path: Path) -> dict:
+    """シナリオファイル（TOMLまたはYAML）を読み込む。
+
+    Args:
+        path: シナリオファイルのパス（.toml / .yaml / .yml）
+
+    Returns:
+        シナリオの辞書
+
+    Raises:
+        RuntimeError: YAMLファイルでPyYAMLがインストールされていない場合
+        ValueError: 未対応の拡張子の場合
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python 3.10以前
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    if suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as exc:
+            raise RuntimeError("YAML scenario files require PyYAML (pip install pyyaml)") from exc
+        return yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    raise ValueError(f"Unsupported scenario file: {path} (use .toml, .yaml or .yml)")
+
+
+def _switch_values(switches: dict[str, dict[str, str]], on: Sequence[str]) -> dict[str, str]:
+    """ONにするスイッチのリストからスイッチ設定辞書を作成する。"""
+    unknown = [ref for ref in on if ref not in switches]
+    if unknown:
+        raise ValueError(f"Unknown switch source(s): {', '.join(unknown)}")
+    return {
+        ref: str(spec["on"]) if ref in on else str(spec["off"]) for ref, spec in switches.items()
+    }
+
+
+def expand_scenario(spec: dict) -> Scenario:
+    """シナリオの辞書をケース表に展開する。
+
+    スイッチの組み合わせは名前付きプリセットと、matrix.switches のON/OFFの全組み合わせ
+    （min_on / max_on / require_any / exclude で絞り込み）から作成する。
+    バリエーションはモードと掃引パラメータ（params）の全組み合わせ。
+
+    Args:
+        spec: load_scenario_spec の戻り値
+
+    Returns:
+        Scenario
+
+    Raises:
+        ValueError: シナリオの内容が不正な場合
+    """
+    switches = {
+        str(ref): {"label": str(item.get("label", ref)), "on": item.get("on", "5"),
+                   "off": item.get("off", "0")}
+        for ref, item in spec.get("switches", {}).items()
+    }
+    if not switches:
+        raise ValueError("Scenario defines no switch sources ([switches])")
+
+    presets = {str(name): list(on) for name, on in spec.get("presets", {}).items()}
+    matrix = spec.get("matrix", {})
+    expand = matrix.get("expand", "presets" if presets else "product")
+    if expand not in SCENARIO_EXPAND:
+        raise ValueError(f"matrix.expand must be one of {SCENARIO_EXPAND}: {expand!r}")
+
+    cases: list[tuple[str, dict[str, str]]] = []
+    if expand in ("presets", "both"):
+        cases.extend((name, _switch_values(switches, on)) for name, on in presets.items())
+
+    if expand in ("product", "both"):
+        refs = list(matrix.get("switches", switches))
+        require_any = set(matrix.get("require_any", ()))
+        exclude = [set(group) for group in matrix.get("exclude", ())]
+        min_on = int(matrix.get("min_on", 0))
+        max_on = int(matrix.get("max_on", len(refs)))
+        preset_names = {frozenset(on): name for name, on in presets.items()}
+        seen = {frozenset(on) for name, on in presets.items()} if expand == "both" else set()
+        for states in itertools.product((False, True), repeat=len(refs)):
+            on = [ref for ref, state in zip(refs, states) if state]
+            key = frozenset(on)
+            if (
+                key in seen
+                or not min_on <= len(on) <= max_on
+                or (require_any and not require_any & key)
+                or any(group <= key for group in exclude)
+            ):
+                continue
+            seen.add(key)
+            name = preset_names.get(key) or "-".join(switches[ref]["label"] for ref in on) or "AllOff"
+            cases.append((name, _switch_values(switches, on)))
+
+    names = [name for name, _ in cases]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"Duplicate case names in scenario: {', '.join(duplicated)}")
+
+    # バリエーション = モード × 掃引パラメータの全組み合わせ
+    modes = spec.get("modes") or {"Vol": {"transform": "none"}}
+    sweep = {
+        str(name): [str(v) for v in (values if isinstance(values, list) else [values])]
+        for name, values in spec.get("params", {}).items()
+    }
+    variants: list[tuple[str, Optional[TextTransform]]] = []
+    for mode, item in modes.items():
+        transform_name = item.get("transform", "none")
+        if transform_name not in TEXT_TRANSFORMS:
+            raise ValueError(
+                f"Unknown transform {transform_name!r} in mode {mode!r}"
+                f" (available: {', '.join(TEXT_TRANSFORMS)})"
+            )
+        base = TEXT_TRANSFORMS[transform_name]
+        if "knob_points" in item:
+            points = int(item["knob_points"])
+            if points < 2:
+                raise ValueError(f"knob_points must be 2 or more in mode {mode!r}: {points}")
+            base = KnobGridTransform(base, points)
+        fixed = tuple((str(k), str(v)) for k, v in item.get("params", {}).items())
+        for values in itertools.product(*sweep.values()):
+            swept = tuple(zip(sweep, values))
+            params = fixed + swept
+            suffix = "_".join([str(mode)] + [f"{k}-{v}" for k, v in swept])
+            variants.append((suffix, ParamTransform(base, params) if params else base))
+
+    return Scenario(cases=cases, variants=variants)
+
+
+def load_scenario(path: Path) -> Scenario:
+    """シナリオファイルを読み込み、ケース表に展開する。"""
+    return expand_scenario(load_scenario_spec(path))
+
+
+def plan_unique_cases(
+    input_path: Path,
+    cases: Sequence[tuple[str, dict[str, str]]],
+    variants: Sequence[tuple[str, Optional[TextTransform]]],
+) -> tuple[dict[str, list[tuple[str, dict[str, str]]]], dict[tuple[str, str], list[tuple[str, str]]]]:
+    """最終的なネットリストが同じになるケースを1つにまとめる。
+
+    各ケースのネットリストをテンプレートからメモリ上で生成して比較する。
+    テンプレートで部品が見つからない場合は、スイッチ設定とテキスト変換の組で比較する。
+
+    Args:
+        input_path: 入力ファイルのパス
+        cases: (ケース名, スイッチ設定辞書) のリスト
+        variants: (バリエーション名, テキスト変換) のリスト
+
+    Returns:
+        (unique, aliases) のタプル
+        - unique: バリエーション名→シミュレーションするケースのリスト
+        - aliases: (バリエーション名, ケース名)→同じ結果になる他のケースのリスト
+    """
+    template = load_netlist_template(input_path)
+    use_template = template.has_components([ref for _, values in cases for ref in values])
+
+    unique: dict[str, list[tuple[str, dict[str, str]]]] = {}
+    aliases: dict[tuple[str, str], list[tuple[str, str]]] = {}
+    first: dict[object, tuple[str, str]] = {}
+    for suffix, transform in variants:
+        unique[suffix] = []
+        for name, values in cases:
+            if use_template:
+                key: object = template.render(values, transform)
+            else:
+                key = (tuple(sorted(values.items())), transform)
+            if key in first:
+                aliases.setdefault(first[key], []).append((suffix, name))
+                continue
+            first[key] = (suffix, name)
+            unique[suffix].append((name, values))
+    return unique, aliases
+
+
+def copy_duplicate_results(
+    outdir: Path,
+    aliases: dict[tuple[str, str], list[tuple[str, str]]],
+    output_format: str = OUTPUT_FORMAT,
+    dataset_dir: Optional[Path] = None,
+) -> None:
+    """まとめて実行したケースの結果を、同じ結果になる他のケースの名前でもコピーする。
+
+    Args:
+        outdir: 出力フォルダ
+        aliases: plan_unique_cases の戻り値
+        output_format: 出力形式（"csv", "parquet", "feather"）
+        dataset_dir: バッチ全体のParquetデータセットのフォルダ（Noneの場合はコピーしない）
+    """
+    for (suffix, name), duplicates in aliases.items():
+        source = result_path(outdir, name, suffix, output_format)
+        for dup_suffix, dup_name in duplicates:
+            target = result_path(outdir, dup_name, dup_suffix, output_format)
+            copy2(source, target)
+            if dataset_dir is not None:
+                part = dataset_dir / f"variant={suffix}" / f"case={name}" / "part-0.parquet"
+                dup_dir = dataset_dir / f"variant={dup_suffix}" / f"case={dup_name}"
+                dup_dir.mkdir(parents=True, exist_ok=True)
+                copy2(part, dup_dir / part.name)
+            print(f"saved (same as {name}_{suffix}): {target}")
+
+
+# ========================================================================
+# 一括ステップ実行（全ケースを1回のシミュレーションで実行）
+# ========================================================================
+
+def build_case_step(
+    cases: Sequence[tuple[str, dict[str, str]]],
+    param: str = CASE_STEP_PARAM,
+) -> tuple[dict[str, str], str]:
+    """ケース表を .step param と table() 式に変換する。
+
+    各スイッチ電源の値を table(case, 1, 値1, 2, 値2, ...) とし、
+    .step param case list 1 2 ... で全ケースを1回のシミュレーションで掃引する。
+
+    Args:
+        cases: (ケース名, スイッチ設定辞書) のリスト
+        param: ケース番号として使用するパラメータ名
+
+    Returns:
+        (component_values, instruction) のタプル
+        - component_values: 部品名→table()式の辞書
+        - instruction: 追加する .step ディレクティブ
+    """
+    refs: list[str] = []
+    for _, values in cases:
+        for ref in values:
+            if ref not in refs:
+                refs.append(ref)
+
+    component_values = {}
+    for ref in refs:
+        points = ",".join(
+            f"{number},{values[ref]}" for number, (_, values) in enumerate(cases, start=1)
+        )
+        component_values[ref] = f"{{table({param},{points})}}"
+
+    numbers = " ".join(str(number) for number in range(1, len(cases) + 1))
+    instruction = f".step param {param} list {numbers}"
+    return component_values, instruction
+
+
+def split_stepped_cases(
+    df: pd.DataFrame,
+    case_names: Sequence[str],
+    param: str = CASE_STEP_PARAM,
+) -> dict[str, pd.DataFrame]:
+    """ケース番号でステップ掃引したデータをケースごとに分割する。
+
+    各ケースのデータは、ケース番号の列を除き、step_index を0から振り直すため、
+    ケースごとに個別実行した場合と同じ形式になる。
+
+    Args:
+        df: data_from_raw の戻り値
+        case_names: ケース名のリスト（ケース番号1, 2, ...の順）
+        param: ケース番号として使用したパラメータ名
+
+    Returns:
+        ケース名→DataFrameの辞書
+
+    Raises:
+        RuntimeError: ケース番号のステップ情報が見つからない場合
+    """
+    target = f"step_{param}".lower()
+    case_col = next((col for col in df.columns if str(col).lower() == target), None)
+    if case_col is None:
+        raise RuntimeError(
+            f"Step information for '{param}' not found. Columns: {', '.join(map(str, df.columns))}"
+        )
 
-    if not ANALYSIS_TEMPLATE.exists():
-        raise FileNotFoundError(f"Template workbook not found: {ANALYSIS_TEMPLATE}")
+    numbers = np.rint(df[case_col].to_numpy(dtype=float)).astype(int)
+    result: dict[str, pd.DataFrame] = {}
+    for number, name in enumerate(case_names, start=1):
+        part = df.loc[numbers == number].drop(columns=case_col).reset_index(drop=True)
+        # ケース内のステップ番号を0から振り直す
+        part["step_index"] = pd.factorize(part["step_index"], sort=True)[0]
+        result[name] = part
+    return result
+
+
+@dataclass(frozen=True)
+class SteppedJob:
+    """1バリエーション分の一括ステップ実行に必要な情報。
+
+    Attributes:
+        suffix: バリエーション名（例: "Vol", "Tone"）
+        cases: (ケース名, スイッチ設定辞書) のタプル
+        text_transform: テキスト変換関数（モジュールレベルの関数であること）
+        outdir: 出力フォルダ
+        work_dir: このバリエーションの作業ディレクトリ
+        input_path: 入力ファイルのパス
+        executable: LTspice実行ファイルのパス
+        cache: シミュレーション結果キャッシュ（Noneの場合は無効）
+        output_format: 出力形式（"csv", "parquet", "feather"）
+        dataset_dir: バッチ全体のParquetデータセットのフォルダ（Noneの場合は書き出さない）
+        adaptive: 適応周波数スイープの設定（Noneの場合は回路ファイルの .ac のまま実行）
+        timeout: LTspice 1回の実行の制限時間 [秒]
+        input_hashes: 各ケースの入力のハッシュ（cases と同じ順。空の場合は完了マーカーを書き出さない）
+    """
 
-    # 出力ディレクトリを作成
-    outdir = make_outdir(base_dir)
-    dest_template = outdir / f"{PU_Name}_Analysis{ANALYSIS_TEMPLATE.suffix}"
-    copy2(ANALYSIS_TEMPLATE, dest_template)
+    suffix: str
+    cases: tuple[tuple[str, dict[str, str]], ...]
+    text_transform: Optional[TextTransform]
+    outdir: Path
+    work_dir: Path
+    input_path: Path
+    executable: str
+    cache: Optional[SimulationCache] = None
+    output_format: str = OUTPUT_FORMAT
+    dataset_dir: Optional[Path] = None
+    adaptive: Optional[AdaptiveSweep] = None
+    timeout: Optional[float] = LTSPICE_TIMEOUT
+    input_hashes: tuple[str, ...] = ()
 
-    # ========================================================================
-    # B. スイッチの組み合わせ設定（ここを変更してスイッチパターンをカスタマイズ）
-    # ========================================================================
-    # 各組み合わせは (名前, スイッチ設定辞書) のタプル
-    # スイッチ設定辞書: {"V2": "5"=ON/"0"=OFF, "V3": ..., "V4": ..., "V5": ..., "V6": ...}
 
-    cases = [
-        # Neck単独
-        ("Neck",
-            {"V2": "5", "V3": "0", "V4": "0", "V5": "0", "V6": "0"}),
+def run_stepped_job(job: SteppedJob) -> tuple[list[Path], bool]:
+    """全ケースを1回のシミュレーションで実行し、ケースごとのファイルに分割して保存する。
 
-        # Middle単独
-        ("Middle",
-            {"V2": "0", "V3": "5", "V4": "0", "V5": "0", "V6": "0"}),
+    Args:
+        job: 実行するバリエーションの情報
 
-        # Bridge単独
-        ("Bridge",
-            {"V2": "0", "V3": "0", "V4": "5", "V5": "0", "V6": "0"}),
+    Returns:
+        (paths, cached) のタプル
+        - paths: 保存した結果ファイルのパス
+        - cached: キャッシュの結果を再利用した場合はTrue
+    """
+    component_values, instruction = build_case_step(job.cases)
+    with case_scope(f"step:{job.suffix}"):
+        df, cached = simulate_frame(
+            job.input_path,
+            job.work_dir,
+            component_values,
+            text_transform=job.text_transform,
+            executable=job.executable,
+            cache=job.cache,
+            instructions=[instruction],
+            adaptive=job.adaptive,
+            timeout=job.timeout,
+        )
+        with measure_stage("split_stepped_cases"):
+            frames = split_stepped_cases(df, [name for name, _ in job.cases])
+
+    paths = []
+    hashes = dict(zip((name for name, _ in job.cases), job.input_hashes))
+    for name, frame in frames.items():
+        with case_scope(f"{name}_{job.suffix}"):
+            out_path = result_path(job.outdir, name, job.suffix, job.output_format)
+            write_frame(frame, out_path, job.output_format)
+            if job.dataset_dir is not None:
+                write_dataset_partition(frame, job.dataset_dir, name, job.suffix)
+        mark_case_done(out_path, hashes.get(name, ""))
+        paths.append(out_path)
+    return paths, cached
 
-        # Neck + Middle
-        ("Neck-Middle",
-            {"V2": "5", "V3": "5", "V4": "0", "V5": "5", "V6": "0"}),
 
-        # Middle + Bridge
-        ("Middle-Bridge",
-            {"V2": "0", "V3": "5", "V4": "5", "V5": "0", "V6": "0"}),
+# ========================================================================
+# 並列実行（ケースごとの作業ディレクトリ＋プロセスプール）
+# ========================================================================
 
-        # Bridge + Neck
-        ("Bridge-Neck",
-            {"V2": "5", "V3": "0", "V4": "5", "V5": "0", "V6": "0"}),
+@dataclass(frozen=True)
+class CaseJob:
+    """1ケース分のシミュレーション実行に必要な情報。
 
-        # Hum（ハムバッキング）
-        ("Hum",
-            {"V2": "0", "V3": "0", "V4": "5", "V5": "5", "V6": "5"}),
+    プロセスプールへ渡すため、全てのフィールドはpickle可能な値で構成する。
 
-        # Neck + Hum
-        ("Neck-Hum",
-            {"V2": "5", "V3": "0", "V4": "5", "V5": "0", "V6": "5"}),
+    Attributes:
+        name: ケース名（例: "Neck"）
+        suffix: バリエーション名（例: "Vol", "Tone"）
+        values: スイッチ設定辞書（{"V2": "5", ...}）
+        text_transform: テキスト変換関数（モジュールレベルの関数であること）
+        out_path: 最終的な出力ファイルのパス
+        work_dir: このケースの作業ディレクトリ（逐次実行時は出力フォルダそのもの）
+        input_path: 入力ファイルのパス
+        executable: LTspice実行ファイルのパス
+        cache: シミュレーション結果キャッシュ（Noneの場合は無効）
+        output_format: 出力形式（"csv", "parquet", "feather"）
+        dataset_dir: バッチ全体のParquetデータセットのフォルダ（Noneの場合は書き出さない）
+        adaptive: 適応周波数スイープの設定（Noneの場合は回路ファイルの .ac のまま実行）
+        timeout: LTspice 1回の実行の制限時間 [秒]
+        input_hash: 入力のハッシュ（case_input_hash の戻り値。空の場合は完了マーカーを書き出さない）
+    """
 
-        # Middle + Hum
-        ("Middle-Hum",
-            {"V2": "0", "V3": "5", "V4": "5", "V5": "0", "V6": "5"}),
-    ]
+    name: str
+    suffix: str
+    values: dict[str, str]
+    text_transform: Optional[TextTransform]
+    out_path: Path
+    work_dir: Path
+    input_path: Path
+    executable: str
+    cache: Optional[SimulationCache] = None
+    output_format: str = OUTPUT_FORMAT
+    dataset_dir: Optional[Path] = None
+    adaptive: Optional[AdaptiveSweep] = None
+    timeout: Optional[float] = LTSPICE_TIMEOUT
+    input_hash: str = ""
+
+
+def run_case_job(job: CaseJob) -> tuple[Path, bool]:
+    """作業ディレクトリ内で1ケースを実行し、作業ディレクトリ内の結果ファイルのパスを返す。
+
+    各ケースが専用ディレクトリで編集済み回路ファイル・RAWファイルを扱うため、
+    複数のLTspiceプロセスを同時に実行しても互いのファイルを上書きしない。
+
+    Args:
+        job: 実行するケースの情報
+
+    Returns:
+        (path, cached) のタプル
+        - path: 作業ディレクトリに書き出された結果ファイルのパス
+        - cached: キャッシュの結果を再利用した場合はTrue
+    """
+    # キャッシュヒットや内蔵ソルバーでは回路ファイルを書き出さないため、ここで作成しておく
+    job.work_dir.mkdir(parents=True, exist_ok=True)
+    scratch_path = job.work_dir / job.out_path.name
+    with case_scope(f"{job.name}_{job.suffix}"):
+        df, cached = run_case(
+            job.input_path,
+            scratch_path,
+            job.values,
+            text_transform=job.text_transform,
+            executable=job.executable,
+            work_dir=job.work_dir,
+            cache=job.cache,
+            output_format=job.output_format,
+            adaptive=job.adaptive,
+            timeout=job.timeout,
+        )
+        if job.dataset_dir is not None:
+            write_dataset_partition(df, job.dataset_dir, job.name, job.suffix)
+    return scratch_path, cached
+
+
+def run_jobs_parallel(jobs: Sequence[CaseJob], max_workers: int) -> None:
+    """プロセスプールで複数ケースを同時に実行し、結果ファイルを出力フォルダに集約する。
+
+    完了したケースから順に結果ファイルを出力フォルダへ移動し、作業ディレクトリを削除する。
+    失敗したケースの作業ディレクトリは原因調査のために残す。
+
+    Args:
+        jobs: 実行するケースのリスト
+        max_workers: 同時に実行するプロセス数の上限
+
+    Raises:
+        RuntimeError: 1つ以上のケースが失敗した場合（全ケースの終了後に送出）
+    """
+    failures: list[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(call_with_stage_records, run_case_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                (scratch_path, cached), records = future.result()
+                add_stage_records(records)
+            except Exception as exc:
+                failures.append(f"{job.name}_{job.suffix}: {exc}")
+                print(f"failed: {job.name}_{job.suffix} (work dir kept: {job.work_dir})")
+                continue
+            move(str(scratch_path), str(job.out_path))
+            mark_case_done(job.out_path, job.input_hash)
+            rmtree(job.work_dir, ignore_errors=True)
+            print(f"saved{' (cached)' if cached else ''}: {job.out_path}")
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(jobs)} cases failed.\n" + "\n".join(failures)
+        )
+
+    # 全ケースが成功した場合は空になった作業フォルダも削除
+    if jobs:
+        try:
+            jobs[0].work_dir.parent.rmdir()
+        except OSError:
+            pass
+
+
+def run_stepped_batch(jobs: Sequence[SteppedJob], max_workers: int) -> None:
+    """一括ステップ実行のジョブを実行する。
+
+    max_workers が2以上の場合はバリエーションごとの作業ディレクトリで同時に実行する。
+    失敗したバリエーションがあっても他のバリエーションの実行・保存は続け、
+    失敗したバリエーションの作業ディレクトリは原因調査のために残す。
+
+    Args:
+        jobs: 実行するバリエーションのリスト
+        max_workers: 同時に実行するプロセス数の上限
+
+    Raises:
+        RuntimeError: 1つ以上のバリエーションが失敗した場合（全バリエーションの終了後に送出）
+    """
+    failures: list[str] = []
+
+    def finished(job: SteppedJob, result: tuple[list[Path], bool]) -> None:
+        paths, cached = result
+        for out_path in paths:
+            print(f"saved{' (cached)' if cached else ''}: {out_path}")
+        # 作業ディレクトリを出力フォルダと分けた場合は削除
+        if job.work_dir != job.outdir:
+            rmtree(job.work_dir, ignore_errors=True)
+            try:
+                job.work_dir.parent.rmdir()
+            except OSError:
+                pass
+
+    def failed(job: SteppedJob, exc: Exception) -> None:
+        failures.append(f"step:{job.suffix} ({len(job.cases)} cases): {exc}")
+        print(f"failed: step:{job.suffix} (work dir kept: {job.work_dir})")
+
+    if max_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            futures = {pool.submit(call_with_stage_records, run_stepped_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result, records = future.result()
+                except Exception as exc:
+                    failed(job, exc)
+                    continue
+                add_stage_records(records)
+                finished(job, result)
+    else:
+        for job in jobs:
+            try:
+                result = run_stepped_job(job)
+            except Exception as exc:
+                failed(job, exc)
+                continue
+            finished(job, result)
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(jobs)} stepped runs failed.\n" + "\n".join(failures)
+        )
+
+
+# ========================================================================
+# パイプライン実行（シミュレーション中に前のケースの読み込み・書き出しを行う）
+# ========================================================================
+
+def run_jobs_pipelined(
+    jobs: Sequence[CaseJob],
+    parse_workers: int = PARSE_WORKERS,
+    queue_size: int = PIPELINE_DEPTH,
+) -> None:
+    """シミュレーションを1つずつ実行しながら、完了したケースの読み込み・書き出しを並行して行う。
+
+    メインスレッドがシミュレーションを順に実行し、完了したRAWファイルを上限付きのキューに入れる。
+    読み込み用のスレッドがキューから取り出して data_from_raw・キャッシュ保存・結果ファイルの
+    書き出しを行い、作業ディレクトリ（RAWファイル）を削除する。
+    キューが一杯の場合はシミュレーションを待機させるため、ディスク上に残るRAWファイルは
+    queue_size + parse_workers 個までに抑えられる。
+    LTspiceのライセンスやCPUの都合でシミュレーションを1つずつしか実行できない場合に、
+    読み込み・書き出しの時間をシミュレーションの裏に隠すことができる。
 
-    # ボリューム/トーン切り替えバリエーション
-    # ("Vol", None): ボリュームスイープのみ（トーンは固定）
-    # ("Tone", tone_param_transform): トーンスイープのみ（ボリュームは固定）
-    variants: list[tuple[str, Optional[TextTransform]]] = [
-        ("Vol", None),
-        ("Tone", tone_param_transform),
+    Args:
+        jobs: 実行するケースのリスト（ケースごとに別の作業ディレクトリを指定すること）
+        parse_workers: 読み込み・書き出しを行うスレッド数
+        queue_size: 読み込み待ちにできるRAWファイル数の上限
+
+    Raises:
+        RuntimeError: 1つ以上のケースが失敗した場合（全ケースの終了後に送出）
+    """
+    pending: "queue.Queue[Optional[tuple[CaseJob, SimulationOutput]]]" = queue.Queue(
+        maxsize=queue_size
+    )
+    lock = threading.Lock()
+    failures: list[str] = []
+    done = 0
+    total = len(jobs)
+
+    def fail(job: CaseJob, exc: Exception) -> None:
+        with lock:
+            failures.append(f"{job.name}_{job.suffix}: {exc}")
+            print(f"failed: {job.name}_{job.suffix} (work dir kept: {job.work_dir})")
+
+    def export_worker() -> None:
+        nonlocal done
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            job, output = item
+            try:
+                with case_scope(f"{job.name}_{job.suffix}"):
+                    df, cached = finish_simulation(output, job.cache)
+                    write_frame(df, job.out_path, job.output_format)
+                    if job.dataset_dir is not None:
+                        write_dataset_partition(df, job.dataset_dir, job.name, job.suffix)
+            except Exception as exc:
+                fail(job, exc)
+                continue
+            mark_case_done(job.out_path, job.input_hash)
+            rmtree(job.work_dir, ignore_errors=True)
+            with lock:
+                done += 1
+                print(f"[{done}/{total}] saved{' (cached)' if cached else ''}: {job.out_path}")
+
+    workers = [
+        threading.Thread(target=export_worker, name=f"export-{i}", daemon=True)
+        for i in range(max(parse_workers, 1))
     ]
+    for worker in workers:
+        worker.start()
 
-    # 全ての組み合わせでシミュレーションを実行
-    for suffix, transform in variants:
-        for name, values in cases:
-            out_csv = outdir / f"{PU_Name}__{name}_{suffix}.csv"
-            run_case(
-                INPUT_PATH,
-                out_csv,
-                values["V2"],  # A3. 制御したいスイッチ数に応じて引数を調整
-                values["V3"],
-                values["V4"],
-                values["V5"],
-                values["V6"],
-                text_transform=transform,
+    try:
+        for job in jobs:
+            try:
+                with case_scope(f"{job.name}_{job.suffix}"):
+                    if job.adaptive is not None:
+                        # 適応スイープは各回の結果を見て次の周波数を決めるため、読み込みまで行う
+                        df, cached = simulate_frame(
+                            job.input_path,
+                            job.work_dir,
+                            job.values,
+                            text_transform=job.text_transform,
+                            executable=job.executable,
+                            cache=job.cache,
+                            adaptive=job.adaptive,
+                            timeout=job.timeout,
+                        )
+                        output = SimulationOutput(df=df, cached=cached)
+                    else:
+                        output = start_simulation(
+                            job.input_path,
+                            job.work_dir,
+                            job.values,
+                            text_transform=job.text_transform,
+                            executable=job.executable,
+                            cache=job.cache,
+                            timeout=job.timeout,
+                        )
+            except Exception as exc:
+                fail(job, exc)
+                continue
+            # キューが一杯の場合は読み込みが追いつくまで待機する
+            pending.put((job, output))
+    finally:
+        for _ in workers:
+            pending.put(None)
+        for worker in workers:
+            worker.join()
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {total} cases failed.\n" + "\n".join(failures)
+        )
+
+    # 全ケースが成功した場合は空になった作業フォルダも削除
+    if jobs:
+        try:
+            jobs[0].work_dir.parent.rmdir()
+        except OSError:
+            pass
+
+
+# ========================================================================
+# 分散実行（共有フォルダのジョブキュー）
+# ========================================================================
+#
+# ジョブキューのフォルダ構成（全てのPCから読み書きできる共有フォルダに置く）:
+#   jobs/{id}.json             未実行のジョブ（生成済みのネットリストと実行設定）
+#   claimed/{id}__{worker}.json  ワーカーが実行中のジョブ（jobs から名前の変更で取得する）
+#   results/{id}.{形式}         実行結果（書き終えてから完了の印として results/{id}.json を置く）
+#   failed/{id}.json           失敗したジョブのエラー内容
+#   workers/{worker}.json      ワーカーの生存の知らせ（SPOOL_HEARTBEAT_S ごとに更新）
+# ジョブIDはネットリストと出力形式のハッシュのため、同じジョブを何度登録・実行しても結果は同じになる。
+
+SPOOL_SUBDIRS = ("jobs", "claimed", "results", "failed", "workers")
+
+
+def spool_dirs(spool: Path) -> dict[str, Path]:
+    """ジョブキューのサブフォルダを作成し、名前→パスの辞書を返す。"""
+    dirs = {name: spool / name for name in SPOOL_SUBDIRS}
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    return dirs
+
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    """JSONファイルを一時ファイル経由で書き出す（読み込み側が書きかけの内容を見ないようにする）。"""
+    with atomic_path(path) as tmp:
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+
+def spool_job_id(kind: str, netlist: str, output_format: str) -> str:
+    """ジョブIDを返す（ネットリストと出力形式が同じであれば同じID）。"""
+    digest = hashlib.sha256(f"{kind}\n{output_format}\n{netlist}".encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+def claim_spool_job(dirs: dict[str, Path], worker: str) -> Optional[tuple[Path, dict]]:
+    """未実行のジョブを1つ取得する。
+
+    jobs から claimed への名前の変更は1つのワーカーしか成功しないため、
+    複数のワーカーが同時に同じジョブを取得することはない。
+
+    Args:
+        dirs: spool_dirs の戻り値
+        worker: ワーカー名
+
+    Returns:
+        (claimed のファイルのパス, ジョブの内容) のタプル（未実行のジョブが無い場合はNone）
+    """
+    for path in sorted(dirs["jobs"].glob("*.json")):
+        claimed = dirs["claimed"] / f"{path.stem}__{worker}.json"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue  # 他のワーカーが先に取得した
+        try:
+            return claimed, json.loads(claimed.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            claimed.unlink(missing_ok=True)
+    return None
+
+
+def run_spool_job(dirs: dict[str, Path], job: dict, executable: str, worker: str) -> None:
+    """取得したジョブを実行し、結果ファイルまたはエラー内容をジョブキューに書き出す。
+
+    Args:
+        dirs: spool_dirs の戻り値
+        job: ジョブの内容（run_jobs_spooled が登録したもの）
+        executable: LTspice実行ファイルのパス（NATIVE_SIMULATOR の場合は内蔵ソルバー）
+        worker: ワーカー名
+    """
+    job_id = job["id"]
+    work_dir = Path(tempfile.mkdtemp(prefix=f"spool_{job_id}_"))
+    drain_stage_records()
+    try:
+        with case_scope(job["case"]):
+            output = launch_netlist(
+                job["kind"], job["netlist"], job["output_name"], work_dir, executable, job["timeout"]
+            )
+            df, _ = finish_simulation(output)
+            write_frame(df, dirs["results"] / f"{job_id}{OUTPUT_SUFFIXES[job['format']]}", job["format"])
+        # 結果ファイルを書き終えてから完了の印（計測結果など）を置く
+        meta = {
+            "id": job_id,
+            "worker": worker,
+            "simulator": simulator_identity(executable),
+            "records": [asdict(record) for record in drain_stage_records()],
+        }
+        write_json_atomic(dirs["results"] / f"{job_id}.json", meta)
+        print(f"done: {job['case']} ({job_id})")
+    except Exception as exc:
+        write_json_atomic(
+            dirs["failed"] / f"{job_id}.json",
+            {"id": job_id, "attempt": job["attempt"], "worker": worker, "error": f"{type(exc).__name__}: {exc}"},
+        )
+        print(f"failed: {job['case']} ({job_id}): {exc}")
+    finally:
+        rmtree(work_dir, ignore_errors=True)
+
+
+def run_spool_worker(spool: Path, executable: str, idle_exit: float = 0.0) -> None:
+    """ワーカーとしてジョブキューのジョブを1つずつ実行する。
+
+    実行中は別スレッドで SPOOL_HEARTBEAT_S ごとに生存の知らせを更新する。
+    知らせが途絶えたワーカーのジョブは、登録した側が別のワーカーでやり直す。
+
+    Args:
+        spool: ジョブキューのフォルダ
+        executable: LTspice実行ファイルのパス（NATIVE_SIMULATOR の場合は内蔵ソルバー）
+        idle_exit: ジョブキューが空のまま待つ時間の上限 [秒]（0以下の場合は停止されるまで待つ）
+    """
+    dirs = spool_dirs(spool)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    heartbeat_path = dirs["workers"] / f"{worker}.json"
+    state = {"job": None, "beat": 0}
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while True:
+            state["beat"] += 1
+            write_json_atomic(
+                heartbeat_path,
+                {"worker": worker, "pid": os.getpid(), "job": state["job"], "beat": state["beat"],
+                 "time": datetime.now().isoformat(timespec="seconds")},
+            )
+            if stop.wait(SPOOL_HEARTBEAT_S):
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    print(f"worker {worker}: waiting for jobs in {spool}")
+    idle_since = time.monotonic()
+    try:
+        while True:
+            claimed = claim_spool_job(dirs, worker)
+            if claimed is None:
+                if idle_exit > 0 and time.monotonic() - idle_since > idle_exit:
+                    break
+                time.sleep(SPOOL_POLL_S)
+                continue
+            claim_path, job = claimed
+            state["job"] = job["id"]
+            try:
+                run_spool_job(dirs, job, executable, worker)
+            finally:
+                claim_path.unlink(missing_ok=True)
+                state["job"] = None
+                idle_since = time.monotonic()
+    finally:
+        stop.set()
+        thread.join()
+        heartbeat_path.unlink(missing_ok=True)
+
+
+class HeartbeatMonitor:
+    """ワーカーの生存の知らせが更新されているかを、登録した側の時計で判定する。
+
+    PCごとの時計のずれの影響を受けないよう、知らせのファイルの時刻ではなく
+    内容（更新回数）が最後に変わった時点をこのプロセスの時計で記録する。
+    """
+
+    def __init__(self, workers_dir: Path, stale_s: float = SPOOL_STALE_S) -> None:
+        self.workers_dir = workers_dir
+        self.stale_s = stale_s
+        self._seen: dict[str, tuple[object, float]] = {}
+
+    def alive(self, worker: str) -> bool:
+        """ワーカーの知らせが stale_s 以内に更新されていればTrueを返す。"""
+        now = time.monotonic()
+        try:
+            beat = json.loads((self.workers_dir / f"{worker}.json").read_text(encoding="utf-8"))["beat"]
+        except (OSError, ValueError, KeyError):
+            beat = None
+        previous = self._seen.get(worker)
+        if previous is None or previous[0] != beat:
+            # 初めて見た時点・更新された時点から stale_s の猶予を与える
+            self._seen[worker] = (beat, now)
+            return True
+        return now - previous[1] <= self.stale_s
+
+
+def run_jobs_spooled(
+    jobs: Sequence[CaseJob],
+    spool: Path,
+    max_attempts: int = SPOOL_MAX_ATTEMPTS,
+    idle_timeout: Optional[float] = SPOOL_IDLE_TIMEOUT_S,
+) -> None:
+    """ケースをジョブキューに登録し、ワーカーの結果を出力フォルダに集約する。
+
+    ネットリストはこのPCで生成してジョブに含めるため、ワーカーには入力ファイルや
+    シナリオは不要。失敗したジョブと、実行中にワーカーが停止したジョブは
+    max_attempts 回まで登録し直す。結果が既にジョブキューにあるジョブ（前回の実行や
+    他のバッチで実行済み）は登録せずにそのまま集約する。
+    生存の知らせを更新しているワーカーが idle_timeout の間1つも無い場合は、
+    未完了のジョブを失敗扱いにして待つのをやめる（ジョブはキューに残す）。
+
+    Args:
+        jobs: 実行するケースのリスト（adaptive は使用できない）
+        spool: ジョブキューのフォルダ
+        max_attempts: 1ケースを実行する回数の上限
+        idle_timeout: 生存しているワーカーを待つ時間の上限 [秒]（Noneまたは0以下の場合は無制限）
+
+    Raises:
+        RuntimeError: ネットリストを生成できない回路の場合、
+            1つ以上のケースが失敗した場合（全ケースの終了後に送出）
+    """
+    dirs = spool_dirs(spool)
+    payloads: dict[str, dict] = {}
+    waiting: dict[str, list[CaseJob]] = {}
+    cache_keys: dict[str, str] = {}
+    for job in jobs:
+        case = f"{job.name}_{job.suffix}"
+        template = load_netlist_template(job.input_path)
+        if not template.has_components(list(job.values)):
+            raise RuntimeError(f"{case}: switch components not found in {job.input_path.name}; cannot spool")
+        with case_scope(case), measure_stage("render_netlist"):
+            netlist = template.render(job.values, job.text_transform)
+
+        if job.cache is not None:
+            key = SimulationCache.make_key(netlist, simulator_identity(job.executable))
+            cached = job.cache.get(key)
+            if cached is not None:
+                write_frame(cached, job.out_path, job.output_format)
+                if job.dataset_dir is not None:
+                    write_dataset_partition(cached, job.dataset_dir, job.name, job.suffix)
+                mark_case_done(job.out_path, job.input_hash)
+                print(f"saved (cached): {job.out_path}")
+                continue
+
+        job_id = spool_job_id(template.kind, netlist, job.output_format)
+        if job.cache is not None:
+            cache_keys[job_id] = key
+        waiting.setdefault(job_id, []).append(job)
+        if job_id in payloads:
+            continue
+        payloads[job_id] = {
+            "id": job_id,
+            "case": case,
+            "kind": template.kind,
+            "output_name": template.output_name,
+            "netlist": netlist,
+            "format": job.output_format,
+            "timeout": job.timeout,
+            "attempt": 1,
+        }
+        queued = (dirs["jobs"] / f"{job_id}.json").exists() or any(dirs["claimed"].glob(f"{job_id}__*.json"))
+        if not queued and not (dirs["results"] / f"{job_id}.json").exists():
+            write_json_atomic(dirs["jobs"] / f"{job_id}.json", payloads[job_id])
+    print(f"spooled: {len(payloads)} jobs in {spool}")
+
+    monitor = HeartbeatMonitor(dirs["workers"], SPOOL_STALE_S)
+    failures: list[str] = []
+
+    def retry(job_id: str, reason: str) -> None:
+        payload = payloads[job_id]
+        if payload["attempt"] >= max_attempts:
+            failures.append(f"{payload['case']}: {reason} (after {payload['attempt']} attempts)")
+            del waiting[job_id]
+            return
+        payload["attempt"] += 1
+        print(f"retry {payload['attempt']}/{max_attempts}: {payload['case']} ({reason})")
+        write_json_atomic(dirs["jobs"] / f"{job_id}.json", payload)
+
+    last_alive = time.monotonic()
+    while waiting:
+        for job_id in list(waiting):
+            result = dirs["results"] / f"{job_id}{OUTPUT_SUFFIXES[payloads[job_id]['format']]}"
+            failed = dirs["failed"] / f"{job_id}.json"
+            if result.with_suffix(".json").exists():
+                collect_spooled_result(result, waiting.pop(job_id), cache_keys.get(job_id))
+                (dirs["jobs"] / f"{job_id}.json").unlink(missing_ok=True)
+                failed.unlink(missing_ok=True)
+            elif failed.exists():
+                try:
+                    error = json.loads(failed.read_text(encoding="utf-8")).get("error", "unknown error")
+                except (OSError, ValueError):
+                    continue  # 書き込み中
+                failed.unlink(missing_ok=True)
+                retry(job_id, error)
+            else:
+                # 実行中のワーカーが停止した場合は登録し直す（停止したワーカーが複数でも1回だけ）
+                for claim in dirs["claimed"].glob(f"{job_id}__*.json"):
+                    worker = claim.stem.split("__", 1)[1]
+                    if not monitor.alive(worker):
+                        claim.unlink(missing_ok=True)
+                        retry(job_id, f"worker {worker} stopped responding")
+                        break
+        if not waiting:
+            break
+        if any(monitor.alive(beat.stem) for beat in dirs["workers"].glob("*.json")):
+            last_alive = time.monotonic()
+        elif idle_timeout and idle_timeout > 0 and time.monotonic() - last_alive > idle_timeout:
+            failures.extend(
+                f"{payloads[job_id]['case']}: no worker is running on {spool} "
+                f"(waited {idle_timeout:g} s; start one with --worker)"
+                for job_id in waiting
             )
-            print(f"saved: {out_csv}")
+            break
+        time.sleep(SPOOL_POLL_S)
+
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(payloads)} spooled jobs failed.\n" + "\n".join(failures))
+
+
+def collect_spooled_result(result: Path, jobs: Sequence[CaseJob], cache_key: Optional[str]) -> None:
+    """ワーカーの結果ファイルを出力フォルダにコピーし、ジョブキューから削除する。
+
+    ワーカーの計測結果は run_report.json に含め、ワーカーのシミュレータが
+    このPCと同じ場合はキャッシュにも保存する。
+
+    Args:
+        result: ジョブキュー内の結果ファイルのパス
+        jobs: この結果を使うケースのリスト（ネットリストが同じケース）
+        cache_key: このPCのキャッシュキー（キャッシュ無効時はNone）
+    """
+    meta_path = result.with_suffix(".json")
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = {}
+    add_stage_records([StageRecord(**record) for record in meta.get("records", [])])
+
+    df = None
+    for job in jobs:
+        with atomic_path(job.out_path) as tmp:
+            copy2(result, tmp)
+        if job.dataset_dir is not None or (job.cache is not None and cache_key is not None):
+            df = df if df is not None else read_frame(job.out_path, job.output_format)
+        if job.dataset_dir is not None:
+            write_dataset_partition(df, job.dataset_dir, job.name, job.suffix)
+        if job.cache is not None and cache_key is not None:
+            if meta.get("simulator") == simulator_identity(job.executable):
+                job.cache.put(cache_key, df)
+        mark_case_done(job.out_path, job.input_hash)
+        print(f"saved ({meta.get('worker', 'worker')}): {job.out_path}")
+
+    result.unlink(missing_ok=True)
+    meta_path.unlink(missing_ok=True)
+
+
+def start_loopback_workers(spool: Path, count: int, args: argparse.Namespace) -> list[subprocess.Popen]:
+    """このPCでワーカーのプロセスを count 個起動する。
+
+    Args:
+        spool: ジョブキューのフォルダ
+        count: 起動するワーカー数
+        args: コマンドライン引数（シミュレータの設定をワーカーに引き継ぐ）
+
+    Returns:
+        起動したプロセスのリスト
+    """
+    command = [
+        sys.executable, str(Path(__file__).resolve()), "--worker", str(spool),
+        "--simulator", args.simulator, "--ltspice", args.ltspice,
+    ]
+    return [subprocess.Popen(command, stdout=subprocess.DEVNULL) for _ in range(count)]
+
+
+def stop_loopback_workers(workers: Sequence[subprocess.Popen]) -> None:
+    """start_loopback_workers で起動したワーカーを停止する。"""
+    for process in workers:
+        process.terminate()
+    for process in workers:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ========================================================================
+# ケース表の確認（--dry-run）
+# ========================================================================
+
+def print_case_plan(
+    scenario: Scenario,
+    aliases: dict[tuple[str, str], list[tuple[str, str]]],
+    executable: str,
+    cache: Optional[SimulationCache],
+    per_case_cache: bool = True,
+    outdir: Optional[Path] = None,
+    input_hashes: Optional[dict[tuple[str, str], str]] = None,
+    output_format: str = OUTPUT_FORMAT,
+) -> None:
+    """展開したケース表と、各ケースのキャッシュ・完了の状態を表示する。
+
+    シミュレーションは実行せず、ファイルも書き出さない。
+
+    Args:
+        scenario: load_scenario の戻り値
+        aliases: plan_unique_cases の戻り値（同じネットリストになるケース）
+        executable: LTspice実行ファイルのパス（キャッシュキーの計算に使用）
+        cache: シミュレーション結果キャッシュ（Noneの場合は "off" と表示）
+        per_case_cache: ケースごとのネットリストでキャッシュを確認する場合はTrue
+            （一括ステップ実行・適応スイープではキャッシュキーが異なるため "-" と表示）
+        outdir: 再開する出力フォルダ（Noneの場合は完了の状態を表示しない）
+        input_hashes: case_input_hash の戻り値（outdir を指定した場合に使用）
+        output_format: 出力形式（"csv", "parquet", "feather"）
+    """
+    template = load_netlist_template(INPUT_PATH)
+    simulator_id = simulator_identity(executable)
+    duplicate_of = {dup: first for first, dups in aliases.items() for dup in dups}
+
+    rows = []
+    for suffix, transform in scenario.variants:
+        for name, values in scenario.cases:
+            switches = "+".join(ref for ref, value in values.items() if value != "0") or "-"
+            if (suffix, name) in duplicate_of:
+                first_suffix, first_name = duplicate_of[(suffix, name)]
+                rows.append((suffix, name, switches, f"= {first_name}_{first_suffix}", ""))
+                continue
+            if cache is None:
+                cached = "off"
+            elif not per_case_cache or not template.has_components(list(values)):
+                cached = "-"
+            else:
+                key = SimulationCache.make_key(template.render(values, transform), simulator_id)
+                cached = "hit" if cache.contains(key) else "miss"
+            status = ""
+            if outdir is not None and input_hashes is not None:
+                status = case_status(result_path(outdir, name, suffix, output_format), input_hashes[(suffix, name)])
+            rows.append((suffix, name, switches, cached, status))
+
+    headers = ("variant", "case", "switches", "cache", "status")
+    widths = [max(len(str(row[i])) for row in [headers, *rows]) for i in range(len(headers))]
+    for row in [headers, *rows]:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+    unique = [row for row in rows if not row[3].startswith("=")]
+    print(
+        f"\n{len(rows)} cases, {len(unique)} to simulate"
+        f", cache hits: {sum(row[3] == 'hit' for row in unique)}"
+        + (f", done: {sum(row[4] == 'done' for row in unique)}" if outdir is not None else "")
+    )
+
+
+# ========================================================================
+# 中断したバッチの再開（マニフェストと完了マーカー）
+# ========================================================================
+
+def case_input_hash(
+    input_path: Path,
+    values: dict[str, str],
+    text_transform: Optional[TextTransform],
+    executable: str,
+    settings: dict,
+) -> str:
+    """ケースの入力（最終的なネットリスト、シミュレータ、出力の設定）のハッシュを返す。
+
+    回路ファイル・シナリオ・シミュレータ・出力の設定のいずれかが変わるとハッシュが変わるため、
+    再開時に以前の結果が古くなったケースを判定できる。
+
+    Args:
+        input_path: 入力ファイルのパス
+        values: スイッチ設定辞書
+        text_transform: テキスト変換関数
+        executable: LTspice実行ファイルのパス（内蔵ソルバーの場合は NATIVE_SIMULATOR）
+        settings: 結果に影響する設定（出力形式、適応スイープの設定など。JSONに変換できる値）
+
+    Returns:
+        SHA-256の16進文字列
+    """
+    template = load_netlist_template(input_path)
+    if template.has_components(list(values)):
+        netlist = template.render(values, text_transform)
+    else:
+        text = normalize_micro_symbols(read_text_auto(input_path))
+        netlist = (text_transform(text) if text_transform else text) + repr(sorted(values.items()))
+    netlist += json.dumps(settings, sort_keys=True, default=str)
+    return SimulationCache.make_key(netlist, simulator_identity(executable))
+
+
+def done_marker_path(out_path: Path) -> Path:
+    """結果ファイルに対応する完了マーカーのパスを返す。"""
+    return out_path.parent / DONE_DIRNAME / f"{out_path.name}.done"
+
+
+def mark_case_done(out_path: Path, input_hash: str) -> None:
+    """結果ファイルを書き出し終えたケースの完了マーカー（入力のハッシュ）を書き出す。
+
+    結果ファイルを置き換えた後に呼ぶこと。input_hash が空の場合は何もしない。
+    """
+    if not input_hash:
+        return
+    marker = done_marker_path(out_path)
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_path(marker) as tmp:
+        tmp.write_text(input_hash, encoding="ascii")
+
+
+def case_status(out_path: Path, input_hash: str) -> str:
+    """ケースの状態を返す。
+
+    Returns:
+        "done": 同じ入力で完了済み / "stale": 完了済みだが入力が変わった /
+        "missing": 未完了（結果ファイルまたは完了マーカーが無い）
+    """
+    try:
+        saved = done_marker_path(out_path).read_text(encoding="ascii").strip()
+    except OSError:
+        return "missing"
+    if not out_path.exists():
+        return "missing"
+    return "done" if saved == input_hash else "stale"
+
+
+def write_manifest(
+    outdir: Path,
+    unique_cases: dict[str, list[tuple[str, dict[str, str]]]],
+    aliases: dict[tuple[str, str], list[tuple[str, str]]],
+    input_hashes: dict[tuple[str, str], str],
+    output_format: str,
+    settings: dict,
+) -> Path:
+    """計画したケースと入力のハッシュを出力フォルダの manifest.json に書き出す。
+
+    再開時に書き直す場合も、最初に作成した日時は残す。
+
+    Args:
+        outdir: 出力フォルダ
+        unique_cases: plan_unique_cases の戻り値（バリエーション名→ケースのリスト）
+        aliases: plan_unique_cases の戻り値（同じ結果になるケース）
+        input_hashes: (バリエーション名, ケース名)→case_input_hash の戻り値
+        output_format: 出力形式（"csv", "parquet", "feather"）
+        settings: 実行時の設定（コマンドライン引数など）
+
+    Returns:
+        書き出したファイルのパス
+    """
+    path = outdir / MANIFEST_NAME
+    now = datetime.now().isoformat(timespec="seconds")
+    try:
+        created = json.loads(path.read_text(encoding="utf-8")).get("created", now)
+    except (OSError, ValueError, AttributeError):
+        created = now
+    cases = [
+        {
+            "variant": suffix,
+            "case": name,
+            "file": result_path(outdir, name, suffix, output_format).name,
+            "input_hash": input_hashes[(suffix, name)],
+            "switches": values,
+            "duplicates": [
+                f"{dup_name}_{dup_suffix}" for dup_suffix, dup_name in aliases.get((suffix, name), [])
+            ],
+        }
+        for suffix, items in unique_cases.items()
+        for name, values in items
+    ]
+    manifest = {
+        "script": Path(__file__).name,
+        "created": created,
+        "updated": now,
+        "input": str(INPUT_PATH),
+        "settings": settings,
+        "cases": cases,
+    }
+    with atomic_path(path) as tmp:
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    return path
+
+
+def pending_cases(
+    outdir: Path,
+    unique_cases: dict[str, list[tuple[str, dict[str, str]]]],
+    input_hashes: dict[tuple[str, str], str],
+    output_format: str,
+) -> dict[str, list[tuple[str, dict[str, str]]]]:
+    """再開時に実行が必要なケース（未完了または入力が変わったケース）だけを返す。
+
+    書きかけの一時ファイル（atomic_path の "." で始まる .tmp ファイル）は削除する。
+
+    Args:
+        outdir: 再開する出力フォルダ
+        unique_cases: plan_unique_cases の戻り値（バリエーション名→ケースのリスト）
+        input_hashes: (バリエーション名, ケース名)→case_input_hash の戻り値
+        output_format: 出力形式（"csv", "parquet", "feather"）
+
+    Returns:
+        バリエーション名→実行するケースのリスト
+    """
+    for tmp in itertools.chain(outdir.glob(".*.tmp"), outdir.glob(f"{DATASET_DIRNAME}/*/*/.*.tmp")):
+        tmp.unlink(missing_ok=True)
+
+    pending: dict[str, list[tuple[str, dict[str, str]]]] = {}
+    counts = {"done": 0, "stale": 0, "missing": 0}
+    for suffix, items in unique_cases.items():
+        pending[suffix] = []
+        for name, values in items:
+            out_path = result_path(outdir, name, suffix, output_format)
+            status = case_status(out_path, input_hashes[(suffix, name)])
+            counts[status] += 1
+            if status == "done":
+                print(f"skipped (done): {out_path}")
+                continue
+            if status == "stale":
+                print(f"stale (input changed): {out_path}")
+            pending[suffix].append((name, values))
+    print(f"resume: {counts['done']} done, {counts['stale']} stale, {counts['missing']} missing")
+    return pending
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。
+
+    Args:
+        argv: 引数リスト（Noneの場合はsys.argvを使用）
+
+    Returns:
+        解析結果
+    """
+    parser = argparse.ArgumentParser(
+        description="LTspiceのACスイープを複数のスイッチ組み合わせで実行し、CSVに出力する。"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=JOBS,
+        help="同時に実行するシミュレーション数（1の場合は逐次実行）",
+    )
+    parser.add_argument(
+        "--engine", choices=("case", "step"), default=ENGINE,
+        help="case: ケースごとにLTspiceを起動 / step: 全ケースを .step で1回のシミュレーションにまとめる",
+    )
+    parser.add_argument(
+        "--scenario", type=Path, default=SCENARIO_PATH,
+        help="ケース表（スイッチの組み合わせ・モード・掃引パラメータ）を定義したTOML/YAMLファイル",
+    )
+    parser.add_argument(
+        "--adaptive", action=argparse.BooleanOptionalAction, default=ADAPTIVE,
+        help="粗い周波数スイープの後、補間誤差が大きい帯域だけを再シミュレーションする",
+    )
+    parser.add_argument(
+        "--adaptive-coarse", type=int, default=ADAPTIVE_COARSE_PER_OCT,
+        help="適応スイープの最初のスイープの1オクターブあたりの点数",
+    )
+    parser.add_argument(
+        "--adaptive-tol-db", type=float, default=ADAPTIVE_TOL_DB,
+        help="適応スイープで許容するゲインの補間誤差 [dB]",
+    )
+    parser.add_argument(
+        "--adaptive-tol-deg", type=float, default=ADAPTIVE_TOL_DEG,
+        help="適応スイープで許容する位相の補間誤差 [度]",
+    )
+    parser.add_argument(
+        "--pipeline", action=argparse.BooleanOptionalAction, default=PIPELINE,
+        help="逐次実行時に、次のケースのシミュレーション中に前のケースの読み込み・書き出しを行う",
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=PARSE_WORKERS,
+        help="パイプライン実行時に読み込み・書き出しを行うスレッド数",
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=PIPELINE_DEPTH,
+        help="パイプライン実行時に読み込み待ちにできるRAWファイル数の上限",
+    )
+    parser.add_argument(
+        "--simulator", choices=("ltspice", NATIVE_SIMULATOR), default=SIMULATOR,
+        help=f"ltspice: LTspiceを実行 / {NATIVE_SIMULATOR}: 内蔵のAC解析ソルバー（R/L/C/V/I/SWのみ、LTspice不要）",
+    )
+    parser.add_argument(
+        "--ltspice", default=LTSPICE_EXE,
+        help="LTspice実行ファイルのパス（テスト用の代替シミュレータも指定可能）",
+    )
+    parser.add_argument(
+        "--sim-timeout", type=float, default=LTSPICE_TIMEOUT,
+        help="LTspice 1回の実行の制限時間 [秒]（超えた場合は強制終了して失敗扱い。0で無制限）",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="シミュレーション結果キャッシュを使用せず、全ケースを再シミュレーションする",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, default=CACHE_DIR,
+        help="シミュレーション結果キャッシュの保存先",
+    )
+    parser.add_argument(
+        "--cache-size-mb", type=float, default=CACHE_MAX_MB,
+        help="キャッシュの最大サイズ [MB]",
+    )
+    parser.add_argument(
+        "--format", choices=tuple(OUTPUT_SUFFIXES), default=OUTPUT_FORMAT,
+        help="ケースごとの結果ファイルの形式（parquet/featherはpyarrowが必要）",
+    )
+    parser.add_argument(
+        "--metrics", action=argparse.BooleanOptionalAction, default=METRICS,
+        help=f"全ケース・全ステップの共振周波数・ピーク・帯域幅・Q・高域の傾きの一覧表を {SUMMARY_DIRNAME} に書き出す",
+    )
+    parser.add_argument(
+        "--merge", action=argparse.BooleanOptionalAction, default=MERGE,
+        help=f"全ケース・全ステップのゲインを共通の周波数軸で並べた表を {SUMMARY_DIRNAME} に書き出す",
+    )
+    parser.add_argument(
+        "--plots", action=argparse.BooleanOptionalAction, default=PLOTS,
+        help=f"ケースごとのゲイン・位相のグラフを {PLOTS_DIRNAME} に画像で書き出す（matplotlibが必要）",
+    )
+    parser.add_argument(
+        "--plot-formats", nargs="+", choices=("png", "svg"), default=list(PLOT_FORMATS),
+        help="グラフの画像形式",
+    )
+    parser.add_argument(
+        "--plot-workers", type=int, default=PLOT_WORKERS,
+        help="グラフを同時に描画するプロセス数",
+    )
+    parser.add_argument(
+        "--spool", type=Path, metavar="DIR",
+        help="共有フォルダのジョブキューにケースを登録し、--worker で起動した他のPCのワーカーで実行する",
+    )
+    parser.add_argument(
+        "--spool-workers", type=int, default=0, metavar="N",
+        help="このPCでN個のワーカーを起動してジョブキューを処理する（--spool が無い場合は出力フォルダ内に作成）",
+    )
+    parser.add_argument(
+        "--spool-idle-timeout", type=float, default=SPOOL_IDLE_TIMEOUT_S, metavar="SECONDS",
+        help="生存しているワーカーが無い状態がこの時間続いたら未完了のケースを失敗扱いにする [秒]（0で無制限）",
+    )
+    parser.add_argument(
+        "--worker", type=Path, metavar="DIR",
+        help="ワーカーとして起動し、ジョブキュー DIR のケースを実行する（--simulator / --ltspice で実行方法を指定）",
+    )
+    parser.add_argument(
+        "--worker-idle", type=float, default=0.0, metavar="SECONDS",
+        help="ワーカーが空のジョブキューを待つ時間の上限 [秒]（0の場合は停止されるまで待つ）",
+    )
+    parser.add_argument(
+        "--resume", type=Path, metavar="OUTDIR",
+        help="中断したバッチの出力フォルダを指定し、未完了のケースと入力が変わったケースだけを実行する",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="シミュレーションを実行せず、展開したケース表とキャッシュ・完了の状態を表示する",
+    )
+    parser.add_argument(
+        "--summary", action="store_true",
+        help=f"処理段階ごとの時間・リソースの集計を表示する（{RUN_REPORT_NAME} は常に書き出す）",
+    )
+    parser.add_argument(
+        "--dataset", action="store_true",
+        help=f"バッチ全体を1つのParquetデータセット（出力フォルダ/{DATASET_DIRNAME}）にもまとめて書き出す",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be >= 1")
+    if args.adaptive_coarse < 1:
+        parser.error("--adaptive-coarse must be >= 1")
+    if args.parse_workers < 1 or args.queue_size < 1:
+        parser.error("--parse-workers and --queue-size must be >= 1")
+    if (args.format != "csv" or args.dataset) and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--format parquet/feather and --dataset require pyarrow (pip install pyarrow)")
+    if args.spool_workers < 0:
+        parser.error("--spool-workers must be >= 0")
+    if (args.spool is not None or args.spool_workers) and (args.engine == "step" or args.adaptive):
+        parser.error("--spool/--spool-workers cannot be combined with --engine step or --adaptive")
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """メイン処理：全てのスイッチ組み合わせでシミュレーションを実行する。"""
+    args = parse_args(argv)
+    base_dir = Path(__file__).parent.resolve()
+    # 内蔵ソルバーを使う場合は LTspice の実行ファイルの代わりに NATIVE_SIMULATOR を渡す
+    executable = NATIVE_SIMULATOR if args.simulator == NATIVE_SIMULATOR else args.ltspice
+    if args.worker is not None:
+        # ワーカーは入力ファイルやシナリオを使わず、ジョブキューのネットリストだけを実行する
+        run_spool_worker(args.worker, executable, args.worker_idle)
+        return
+
+    if not INPUT_PATH.exists():
+        raise FileNotFoundError(f"Input file not found: {INPUT_PATH}")
+
+    if not args.scenario.exists():
+        raise FileNotFoundError(f"Scenario file not found: {args.scenario}")
+
+    if not ANALYSIS_TEMPLATE.exists():
+        raise FileNotFoundError(f"Template workbook not found: {ANALYSIS_TEMPLATE}")
+
+    # ケース表（スイッチの組み合わせ × トーン/ボリュームのモード）をシナリオファイルから作成
+    # 最終的なネットリストが同じになるケースは1回だけシミュレーションし、結果をコピーする
+    scenario = load_scenario(args.scenario)
+    unique_cases, aliases = plan_unique_cases(INPUT_PATH, scenario.cases, scenario.variants)
+    for (suffix, name), duplicates in aliases.items():
+        for dup_suffix, dup_name in duplicates:
+            print(f"duplicate: {dup_name}_{dup_suffix} (same netlist as {name}_{suffix})")
+
+    # シミュレーション結果キャッシュ
+    cache = None
+    if not args.no_cache:
+        cache = SimulationCache(args.cache_dir, int(args.cache_size_mb * 1024 * 1024))
+
+    adaptive = None
+    if args.adaptive:
+        adaptive = AdaptiveSweep(
+            coarse_per_octave=args.adaptive_coarse,
+            tol_db=args.adaptive_tol_db,
+            tol_deg=args.adaptive_tol_deg,
+        )
+
+    # 計画したケースと入力のハッシュをマニフェストに記録する（--resume で再開できるようにする）
+    # 各ケースは結果ファイルを書き出し終えた時点で完了マーカーを書き出す
+    transforms = dict(scenario.variants)
+    hash_settings = {
+        "format": args.format,
+        "dataset": args.dataset,
+        "adaptive": asdict(adaptive) if adaptive is not None else None,
+    }
+    input_hashes = {
+        (suffix, name): case_input_hash(INPUT_PATH, values, transforms[suffix], executable, hash_settings)
+        for suffix, items in unique_cases.items()
+        for name, values in items
+    }
+
+    # 再開時は指定されたフォルダを使う
+    resume_dir = args.resume.resolve() if args.resume is not None else None
+    if resume_dir is not None and not resume_dir.is_dir():
+        raise FileNotFoundError(f"Output folder to resume not found: {resume_dir}")
+
+    if args.dry_run:
+        # ケース表とキャッシュ・完了の状態を表示するだけで、出力フォルダは作成しない
+        print_case_plan(
+            scenario, aliases, executable, cache,
+            per_case_cache=args.engine == "case" and adaptive is None,
+            outdir=resume_dir, input_hashes=input_hashes, output_format=args.format,
+        )
+        return
+
+    # 出力ディレクトリを作成
+    outdir = resume_dir if resume_dir is not None else make_outdir(base_dir)
+    dest_template = outdir / f"{PU_Name}_Analysis{ANALYSIS_TEMPLATE.suffix}"
+    if not dest_template.exists():
+        copy2(ANALYSIS_TEMPLATE, dest_template)
+
+    spool = args.spool
+    if spool is None and args.spool_workers:
+        spool = outdir / SPOOL_DIRNAME
+    parallel = args.jobs > 1 and spool is None
+    # パイプライン実行はケースごとの逐次実行でのみ使用する
+    pipelined = args.pipeline and not parallel and args.engine == "case"
+    dataset_dir = outdir / DATASET_DIRNAME if args.dataset else None
+    write_manifest(outdir, unique_cases, aliases, input_hashes, args.format, vars(args))
+    if args.resume is not None:
+        unique_cases = pending_cases(outdir, unique_cases, input_hashes, args.format)
+
+    # 処理段階ごとの時間・リソースを計測し、失敗した場合も run_report.json に書き出す
+    drain_stage_records()
+    started = datetime.now()
+    run_start = time.perf_counter()
+    try:
+        if args.engine == "step":
+            # バリエーションごとに全ケースを1回のシミュレーションで実行
+            step_jobs = [
+                SteppedJob(
+                    suffix=suffix,
+                    cases=tuple(unique_cases[suffix]),
+                    text_transform=transform,
+                    outdir=outdir,
+                    work_dir=outdir / WORK_DIRNAME / suffix if parallel else outdir,
+                    input_path=INPUT_PATH,
+                    executable=executable,
+                    cache=cache,
+                    output_format=args.format,
+                    dataset_dir=dataset_dir,
+                    adaptive=adaptive,
+                    timeout=args.sim_timeout,
+                    input_hashes=tuple(input_hashes[(suffix, name)] for name, _ in unique_cases[suffix]),
+                )
+                for suffix, transform in scenario.variants
+                if unique_cases[suffix]
+            ]
+            run_stepped_batch(step_jobs, args.jobs)
+        else:
+            # 全ての組み合わせのジョブを作成
+            # 並列実行・パイプライン実行時はケースごとに専用の作業ディレクトリを割り当てる
+            jobs = [
+                CaseJob(
+                    name=name,
+                    suffix=suffix,
+                    values=values,
+                    text_transform=transform,
+                    out_path=result_path(outdir, name, suffix, args.format),
+                    work_dir=(
+                        outdir / WORK_DIRNAME / f"{name}_{suffix}" if parallel or pipelined else outdir
+                    ),
+                    input_path=INPUT_PATH,
+                    executable=executable,
+                    cache=cache,
+                    output_format=args.format,
+                    dataset_dir=dataset_dir,
+                    adaptive=adaptive,
+                    timeout=args.sim_timeout,
+                    input_hash=input_hashes[(suffix, name)],
+                )
+                for suffix, transform in scenario.variants
+                for name, values in unique_cases[suffix]
+            ]
+
+            if spool is not None:
+                # 共有フォルダのジョブキューに登録し、ワーカー（他のPC・このPC）の結果を出力フォルダに集約
+                workers = start_loopback_workers(spool, args.spool_workers, args)
+                try:
+                    run_jobs_spooled(jobs, spool, SPOOL_MAX_ATTEMPTS, args.spool_idle_timeout)
+                finally:
+                    stop_loopback_workers(workers)
+                if args.spool is None:
+                    rmtree(spool, ignore_errors=True)
+            elif parallel:
+                # ケースごとの作業ディレクトリで同時実行し、CSVを出力フォルダに集約
+                run_jobs_parallel(jobs, args.jobs)
+            elif pipelined:
+                # シミュレーションは1つずつ、読み込み・書き出しは別スレッドで並行して実行
+                run_jobs_pipelined(jobs, args.parse_workers, args.queue_size)
+            else:
+                # 逐次実行（出力フォルダ内で直接シミュレーション）
+                for job in jobs:
+                    _, cached = run_case_job(job)
+                    mark_case_done(job.out_path, job.input_hash)
+                    print(f"saved{' (cached)' if cached else ''}: {job.out_path}")
+
+        copy_duplicate_results(outdir, aliases, args.format, dataset_dir)
+
+        planned = [(suffix, name) for suffix, _ in scenario.variants for name, _ in scenario.cases]
+        loaded: list[LoadedCase] = []
+        if args.metrics or args.merge:
+            with measure_stage("load_batch"):
+                loaded = load_batch(outdir, planned, args.format)
+            (outdir / SUMMARY_DIRNAME).mkdir(exist_ok=True)
+        if args.metrics:
+            # 全ケース・全ステップの指標を1つの表にまとめる
+            with measure_stage("batch_metrics"):
+                metrics = batch_metrics(loaded)
+            metrics_path = outdir / SUMMARY_DIRNAME / f"{PU_Name}__metrics{OUTPUT_SUFFIXES[args.format]}"
+            write_frame(metrics, metrics_path, args.format)
+            print(f"metrics: {metrics_path}")
+        if args.merge:
+            # 全ケース・全ステップのゲインを共通の周波数軸で並べる
+            with measure_stage("aligned_matrix"):
+                matrix = aligned_matrix(loaded)
+            matrix_path = outdir / SUMMARY_DIRNAME / f"{PU_Name}__gain_matrix{OUTPUT_SUFFIXES[args.format]}"
+            write_frame(matrix, matrix_path, args.format)
+            print(f"gain matrix: {matrix_path} ({len(matrix)} x {len(matrix.columns) - 1})")
+
+        if args.plots:
+            # ケースごとのグラフを描画（Excelテンプレートでの取り込み・書式設定・画像出力の代わり）
+            result_files = [
+                path for suffix, name in planned
+                if (path := result_path(outdir, name, suffix, args.format)).exists()
+            ]
+            plot_dir = outdir / PLOTS_DIRNAME
+            written = plot_results(result_files, plot_dir, args.plot_formats, args.format, args.plot_workers)
+            print(f"plots: {plot_dir} ({len(written)} files)")
+
+    finally:
+        records = drain_stage_records()
+        wall_s = time.perf_counter() - run_start
+        report_path = write_run_report(outdir, records, vars(args), started, wall_s)
+        if args.summary:
+            print_stage_summary(records, wall_s)
+        print(f"report: {report_path}")
+
+    if dataset_dir is not None:
+        unify_dataset_columns(dataset_dir)
+        print(f"dataset: {dataset_dir}")
+
+    if cache is not None:
+        cache.evict()
 
     print("\nDone.")
     print(f"Output folder: {outdir}")
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""data_from_raw のマイクロベンチマーク。
+
+合成したLTspice形式のステップ付きAC RAWファイル（tests/ltspice_raw.py で作成）を読み込み、
+ステップごとにDataFrameを作って結合する従来の実装と、
+全ステップを一括で処理する現在の data_from_raw の処理時間を比較する。
+
+使い方:
+    python bench_data_from_raw.py --steps 100 --points 1000
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import ModuleType
+
+import numpy as np
+import pandas as pd
+from PyLTSpice import RawRead
+
+from tests.ltspice_raw import write_ac_raw
+
+BASE_DIR = Path(__file__).parent.resolve()  # スクリプトのあるディレクトリ
+RUNNER_GLOB = "*run_ac_switch_scenarios*.py"  # ベンチマーク対象のスクリプト
+
+
+def load_runner() -> ModuleType:
+    """同じフォルダにあるスイープ実行スクリプトをモジュールとして読み込む。
+
+    Returns:
+        読み込んだモジュール
+
+    Raises:
+        FileNotFoundError: スクリプトが見つからない場合
+    """
+    candidates = sorted(BASE_DIR.glob(RUNNER_GLOB))
+    if not candidates:
+        raise FileNotFoundError(f"Runner script not found: {BASE_DIR / RUNNER_GLOB}")
+    spec = importlib.util.spec_from_file_location("run_ac_switch_scenarios", candidates[-1])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # dataclassの型解決のために登録してから実行
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_synthetic_raw(raw_path: Path, target_node: str, n_steps: int, n_points: int) -> None:
+    """ピックアップの共振に似た応答を持つ合成RAWファイルを作成する。
+
+    Args:
+        raw_path: 書き出すRAWファイルのパス
+        target_node: 測定対象のノード名
+        n_steps: ステップ数
+        n_points: 1ステップあたりの周波数点数
+    """
+    freq = np.logspace(1, np.log10(50e3), n_points)
+    k = np.linspace(0.0, 0.999, n_steps)[:, None]
+    f0 = 2e3 + 8e3 * k
+    wave = 1.0 / (1.0 - (freq / f0) ** 2 + 1j * freq / (f0 * (1.0 + 4.0 * k)))
+    traces = {
+        f"V({target_node.lower()})": wave,
+        "V(sig)": np.ones_like(wave),
+        "I(R1)": wave * 1e-3,
+    }
+    step_params = [{"k": float(value)} for value in k.ravel()] if n_steps > 1 else []
+    write_ac_raw(raw_path, freq, traces, step_params)
+
+
+def data_from_raw_reference(raw_path: Path, target_node: str) -> pd.DataFrame:
+    """比較用：ステップごとにDataFrameを作成して結合する従来の実装。
+
+    Args:
+        raw_path: RAWファイルのパス
+        target_node: 測定対象のノード名
+
+    Returns:
+        data_from_raw と同じ形式のDataFrame
+    """
+    raw = RawRead(str(raw_path), verbose=False)
+    target_lower = f"v({target_node.lower()})"
+    trace_name = next(name for name in raw.get_trace_names() if name.lower() == target_lower)
+    trace = raw.get_trace(trace_name)
+    plot = raw._plots[0] if raw._plots else None
+    steps_info = plot.steps if plot and getattr(plot, "steps", None) else None
+
+    frames: list[pd.DataFrame] = []
+    steps = list(raw.get_steps())
+    if not steps:
+        steps = [0]
+
+    for step_idx in steps:
+        freq = np.asarray(raw.get_axis(step_idx)).real.astype(float)
+        wave = np.asarray(trace.get_wave(step_idx))
+        mag = np.abs(wave)
+        mag_db = 20.0 * np.log10(np.where(mag > 0.0, mag, np.finfo(float).tiny))
+        phase = np.degrees(np.angle(wave))
+
+        df = pd.DataFrame(
+            {
+                "frequency_Hz": freq,
+                "mag_dB": mag_db,
+                "phase_deg": phase,
+                "step_index": step_idx,
+            }
+        )
+        if steps_info and step_idx < len(steps_info):
+            for key, value in steps_info[step_idx].items():
+                df[f"step_{key}"] = value
+        frames.append(df)
+
+    result = pd.concat(frames, ignore_index=True)
+    ordered = ["frequency_Hz", "mag_dB", "phase_deg"]
+    extras = [col for col in result.columns if col not in ordered]
+    return result[ordered + extras]
+
+
+def best_time(func, repeat: int) -> float:
+    """関数を繰り返し実行し、最短の実行時間 [秒] を返す。"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """合成RAWファイルで従来実装と現在の実装を比較する。"""
+    parser = argparse.ArgumentParser(description="data_from_raw のマイクロベンチマーク")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 10, 100], help="ステップ数")
+    parser.add_argument("--points", type=int, default=1000, help="1ステップあたりの周波数点数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    runner = load_runner()
+    target_node = runner.TARGET_NODE
+
+    print(f"{'steps':>6} {'points':>7} {'reference [ms]':>15} {'current [ms]':>13} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_steps in args.steps:
+            raw_path = Path(tmp) / f"bench_{n_steps}.raw"
+            make_synthetic_raw(raw_path, target_node, n_steps, args.points)
+
+            # 出力が一致することを確認してから計測
+            pd.testing.assert_frame_equal(
+                runner.data_from_raw(raw_path), data_from_raw_reference(raw_path, target_node)
+            )
+            t_ref = best_time(lambda: data_from_raw_reference(raw_path, target_node), args.repeat)
+            t_new = best_time(lambda: runner.data_from_raw(raw_path), args.repeat)
+            print(
+                f"{n_steps:>6} {args.points:>7} {t_ref * 1e3:>15.2f} {t_new * 1e3:>13.2f}"
+                f" {t_ref / t_new:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
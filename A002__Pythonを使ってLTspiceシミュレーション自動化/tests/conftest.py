@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""run_ac_switch_scenarios のテスト用フィクスチャ。
+
+スクリプトは名前にハイフンを含むため、ファイルのパスからモジュールとして読み込む。
+コマンドラインから実行するテストでは、スクリプトと入力ファイルを一時フォルダにコピーし、
+LTspiceの代わりに fake_ltspice.py を使う（出力フォルダもその一時フォルダ内に作成される）。
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Optional
+
+import pytest
+
+TESTS_DIR = Path(__file__).parent.resolve()
+BASE_DIR = TESTS_DIR.parent  # スクリプトのあるディレクトリ
+RUNNER_GLOB = "*run_ac_switch_scenarios*.py"  # テスト対象のスクリプト
+FAKE_LTSPICE = TESTS_DIR / "fake_ltspice.py"
+
+# テスト用の小さなケース表（3つの組み合わせ × ボリューム/トーンの2モード）
+SMALL_SCENARIO = """\
+[switches.V2]
+label = "Neck"
+on = "5"
+off = "0"
+
+[switches.V3]
+label = "Middle"
+on = "5"
+off = "0"
+
+[switches.V4]
+label = "Bridge"
+on = "5"
+off = "0"
+
+[switches.V5]
+label = "Tone1"
+on = "5"
+off = "0"
+
+[switches.V6]
+label = "Tone2"
+on = "5"
+off = "0"
+
+[modes.Vol]
+transform = "none"
+
+[modes.Tone]
+transform = "tone"
+
+[presets]
+Neck = ["V2"]
+Neck-Middle = ["V2", "V3", "V5"]
+Hum = ["V4", "V5", "V6"]
+"""
+
+
+def runner_script() -> Path:
+    """テスト対象のスクリプトのパスを返す。"""
+    candidates = sorted(BASE_DIR.glob(RUNNER_GLOB))
+    if not candidates:
+        raise FileNotFoundError(f"Runner script not found: {BASE_DIR / RUNNER_GLOB}")
+    return candidates[-1]
+
+
+@pytest.fixture(scope="session")
+def runner() -> ModuleType:
+    """スクリプトをモジュールとして読み込む（main は実行しない）。"""
+    spec = importlib.util.spec_from_file_location("run_ac_switch_scenarios", runner_script())
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # dataclassの型解決のために登録してから実行
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_launcher(path: Path) -> Path:
+    """fake_ltspice.py を実行ファイルとして起動するためのランチャーを作成する。
+
+    POSIXでは exec で置き換えるため、代替シミュレータの親プロセスはスクリプト自身になる。
+    """
+    if os.name == "nt":
+        path = path.with_suffix(".bat")
+        path.write_text(f'@"{sys.executable}" "{FAKE_LTSPICE}" %*\n', encoding="utf-8")
+    else:
+        path.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_LTSPICE}" "$@"\n', encoding="utf-8")
+        path.chmod(0o755)
+    return path
+
+
+class Workspace:
+    """スクリプトと入力ファイルをコピーした作業フォルダ。"""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        root.mkdir(parents=True, exist_ok=True)
+        for name in ("asc", "scenarios", "Template"):
+            shutil.copytree(BASE_DIR / name, root / name)
+        self.script = root / runner_script().name
+        shutil.copy2(runner_script(), self.script)
+        self.scenario = root / "scenarios" / "small.toml"
+        self.scenario.write_text(SMALL_SCENARIO, encoding="utf-8")
+        self.ltspice = write_launcher(root / "fake_ltspice")
+
+    def run(
+        self, *args: str, env: Optional[dict[str, str]] = None, check: bool = True
+    ) -> subprocess.CompletedProcess:
+        """代替シミュレータ・小さなケース表・キャッシュ無しでスクリプトを実行する。"""
+        command = [
+            sys.executable, str(self.script),
+            "--ltspice", str(self.ltspice), "--scenario", str(self.scenario), "--no-cache", *args,
+        ]
+        result = subprocess.run(
+            command, cwd=self.root, env={**os.environ, **(env or {})},
+            capture_output=True, text=True, errors="replace", timeout=300,
+        )
+        if check and result.returncode != 0:
+            raise AssertionError(f"{' '.join(command)} failed:\n{result.stdout}\n{result.stderr}")
+        return result
+
+    def outdirs(self) -> list[Path]:
+        """作成された出力フォルダ（manifest.json があるフォルダ）を古い順に返す。"""
+        return sorted(path.parent for path in self.root.glob("*/manifest.json"))
+
+
+@pytest.fixture
+def workspace(tmp_path: Path) -> Workspace:
+    """スクリプトを実行するための作業フォルダ。"""
+    return Workspace(tmp_path / "workspace")
+
+
+@pytest.fixture
+def make_workspace(tmp_path: Path):
+    """名前を指定して作業フォルダを作成する（同じテストで複数の出力フォルダを比較する場合）。"""
+    return lambda name: Workspace(tmp_path / name)
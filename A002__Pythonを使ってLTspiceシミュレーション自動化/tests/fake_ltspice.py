@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""テスト用のLTspiceの代替シミュレータ（`LTspice -b <回路ファイル>` と同じ呼び出し方）。
+
+回路ファイルのスイッチ電源（V2～V6）の値と .step param・.ac の設定から、
+決まった形の応答（2次の共振）を計算して、LTspice形式のAC RAWファイルと .log を書き出す。
+同じ回路ファイルからは常に同じRAWファイルができるため、実行方法による結果の違いを比較できる。
+
+環境変数:
+    FAKE_LTSPICE_LOG: 呼び出されるたびに回路ファイル名を1行追記するファイル
+    FAKE_LTSPICE_KILL_PARENT_AT: この回数目の呼び出しで、結果を書き出さずに呼び出し元を強制終了する
+        （バッチの途中でスクリプトが停止した場合の再現。FAKE_LTSPICE_LOG が必要）
+    FAKE_LTSPICE_FAIL_PATTERN: 回路ファイルにこの正規表現に一致する部分があれば、結果を書き出さずに失敗する
+    FAKE_LTSPICE_HANG_PATTERN: 回路ファイルにこの正規表現に一致する部分があれば、終了せずに待ち続ける
+        （応答しなくなったLTspiceの再現。--sim-timeout で強制終了される）
+    FAKE_LTSPICE_REQUIRE_ARGS: 回路ファイルの前の引数がこの値（空白区切り）と異なれば失敗する
+        （特定の起動方法だけを受け付けるLTspiceの再現）
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import signal
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ltspice_raw import write_ac_raw
+
+SWITCH_SOURCES = ("V2", "V3", "V4", "V5", "V6")
+_SCALE = {"t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3, "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15}
+
+
+def spice_number(text: str) -> float:
+    """SPICEの数値（"50k", "1meg" など）を変換する。"""
+    match = re.match(r"([-+]?[\d.]+(?:e[-+]?\d+)?)(meg|[tgkmunpf])?", text.strip(), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Not a number: {text}")
+    return float(match.group(1)) * _SCALE.get((match.group(2) or "").lower(), 1.0)
+
+
+def directives(text: str) -> list[str]:
+    """有効なSPICEディレクティブ（.ascでは "!" のTEXT行）を返す。"""
+    lines = []
+    for line in text.splitlines():
+        if line.startswith("TEXT ") and "!" in line:
+            lines.extend(part.strip() for part in line.split("!", 1)[1].split("\\n"))
+        elif line.startswith("."):
+            lines.append(line.strip())
+    return lines
+
+
+def source_values(text: str) -> dict[str, str]:
+    """スイッチ電源の値を返す（.ascの SYMATTR Value 行、またはSPICEネットリストの素子行）。"""
+    values = {}
+    for name, value in re.findall(r"SYMATTR InstName (V\d+)\s*\nSYMATTR Value (\S+)", text):
+        values[name.upper()] = value
+    for line in text.splitlines():
+        tokens = line.split()
+        if len(tokens) >= 4 and tokens[0].upper() in SWITCH_SOURCES:
+            values[tokens[0].upper()] = tokens[3]
+    return values
+
+
+def step_values(lines: list[str]) -> list[tuple[str, list[float]]]:
+    """.step param の名前と値のリストを返す。"""
+    steps = []
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) < 4 or tokens[0].lower() != ".step" or tokens[1].lower() != "param":
+            continue
+        if tokens[3].lower() == "list":
+            values = [spice_number(token) for token in tokens[4:]]
+        else:
+            start, stop, step = (spice_number(token) for token in tokens[3:6])
+            values = list(np.arange(start, stop + step / 2, step))
+        steps.append((tokens[2], values))
+    return steps
+
+
+def ac_frequencies(lines: list[str]) -> np.ndarray:
+    """.ac の設定から周波数軸を作成する（oct / dec / lin / list）。"""
+    for line in lines:
+        tokens = line.split()
+        if not tokens or tokens[0].lower() != ".ac":
+            continue
+        mode = tokens[1].lower()
+        if mode == "list":
+            return np.array([spice_number(token) for token in tokens[2:]])
+        count, start, stop = int(spice_number(tokens[2])), spice_number(tokens[3]), spice_number(tokens[4])
+        if mode == "lin":
+            return np.linspace(start, stop, count)
+        per = {"oct": np.log(2.0), "dec": np.log(10.0)}[mode]
+        n = int(np.floor(np.log(stop / start) / per * count + 1e-9))
+        return start * np.exp(np.arange(n + 1) * per / count)
+    return np.logspace(1, np.log10(50e3), 200)
+
+
+def switch_value(value: str, step: dict[str, float]) -> float:
+    """スイッチ電源の値を返す（一括ステップ実行の {table(case, ...)} 式にも対応）。"""
+    match = re.fullmatch(r"\{table\((\w+),(.*)\)\}", value)
+    if match is None:
+        return spice_number(value)
+    points = [float(token) for token in match.group(2).split(",")]
+    x = step[match.group(1)]
+    return next((y for px, y in zip(points[::2], points[1::2]) if px == x), 0.0)
+
+
+def count_call(netlist: Path) -> int:
+    """呼び出しを記録し、何回目の呼び出しかを返す（記録しない場合は0）。"""
+    log = os.environ.get("FAKE_LTSPICE_LOG")
+    if not log:
+        return 0
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(netlist.name + "\n")
+    with open(log, encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def main() -> None:
+    netlist = Path(sys.argv[-1])
+    kill_at = int(os.environ.get("FAKE_LTSPICE_KILL_PARENT_AT", "0"))
+    if count_call(netlist) == kill_at > 0:
+        os.kill(os.getppid(), signal.SIGTERM)
+        sys.exit(1)
+
+    required = os.environ.get("FAKE_LTSPICE_REQUIRE_ARGS")
+    if required is not None and sys.argv[1:-1] != required.split():
+        sys.exit(3)
+
+    text = netlist.read_bytes().decode("cp932", errors="ignore")
+    hang_pattern = os.environ.get("FAKE_LTSPICE_HANG_PATTERN")
+    if hang_pattern and re.search(hang_pattern, text):
+        time.sleep(3600)
+    fail_pattern = os.environ.get("FAKE_LTSPICE_FAIL_PATTERN")
+    if fail_pattern and re.search(fail_pattern, text):
+        sys.exit(2)
+    lines = directives(text)
+    values = source_values(text)
+    steps = step_values(lines)
+    names = [name for name, _ in steps]
+    combos = [dict(zip(names, combo)) for combo in itertools.product(*(v for _, v in steps))]
+
+    freq = ac_frequencies(lines)
+    waves = []
+    for step in combos:
+        gain = 1.0 + sum(switch_value(values.get(name, "0"), step) for name in SWITCH_SOURCES)
+        knobs = sum(value for name, value in step.items() if name != "case")
+        f0 = 3000.0 * (1.0 + knobs)
+        waves.append(gain / (1.0 - (freq / f0) ** 2 + 1j * freq / (4.0 * f0)))
+    wave = np.array(waves)
+    write_ac_raw(
+        netlist.with_suffix(".raw"),
+        freq,
+        {"V(amp-in)": wave, "I(R1)": wave * 1e-3},
+        combos if steps else [],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""テスト・ベンチマーク用のLTspice形式RAWファイルの書き出し。
+
+LtspiceRawReader と PyLTSpice の RawRead の両方で読めるバイナリRAWファイルを作成する。
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+RAW_LAYOUTS = ("complex", "real", "double")  # complex: AC解析 / real: 軸だけdouble / double: 全てdouble
+
+
+def write_raw(
+    raw_path: Path,
+    axis: np.ndarray,
+    traces: dict[str, np.ndarray],
+    step_params: Sequence[dict[str, float]] = (),
+    layout: str = "complex",
+    fastaccess: bool = False,
+) -> None:
+    """LTspice形式のバイナリRAWファイルを書き出す。
+
+    ステップ情報がある場合は、ステップのパラメータを読み込むための同名の.logファイルも書き出す。
+
+    Args:
+        raw_path: 書き出すRAWファイルのパス
+        axis: 軸（AC解析では周波数 [Hz]、過渡解析では時間 [秒]）。全ステップ共通
+        traces: トレース名→波形の辞書。波形は (ステップ数, 点数) または (点数,) の配列
+        step_params: ステップごとのパラメータ辞書のリスト
+        layout: データの形式（RAW_LAYOUTS のいずれか）
+        fastaccess: Trueの場合はトレースごとに全点を並べる（FastAccess形式）
+    """
+    if layout not in RAW_LAYOUTS:
+        raise ValueError(f"Unknown RAW layout: {layout}")
+    n_steps = max(len(step_params), 1)
+    n_points = len(axis)
+    names = list(traces)
+
+    if layout == "complex":
+        types = ["<c16"] * (len(names) + 1)
+    elif layout == "double":
+        types = ["<f8"] * (len(names) + 1)
+    else:
+        types = ["<f8"] + ["<f4"] * len(names)
+    columns = [np.tile(np.asarray(axis), n_steps)]
+    columns += [np.asarray(traces[name]).reshape(-1) for name in names]
+    for column in columns:
+        if len(column) != n_steps * n_points:
+            raise ValueError("Each trace needs one value per axis point and step")
+
+    if fastaccess:
+        data = b"".join(column.astype(t).tobytes() for column, t in zip(columns, types))
+    else:
+        record = np.empty(n_steps * n_points, dtype=[(f"v{i}", t) for i, t in enumerate(types)])
+        for i, column in enumerate(columns):
+            record[f"v{i}"] = column
+        data = record.tobytes()
+
+    flags = {"complex": "complex", "real": "real", "double": "real double"}[layout]
+    flags += " forward" + (" log" if layout == "complex" else "")
+    flags += " stepped" if step_params else ""
+    flags += " fastaccess" if fastaccess else ""
+    axis_name = "frequency" if layout == "complex" else "time"
+    variables = "".join(f"\t{i}\t{name}\tvoltage\n" for i, name in enumerate(names, start=1))
+    header = (
+        f"Title: * {raw_path.stem}\n"
+        "Date: Thu Jan  1 00:00:00 2026\n"
+        f"Plotname: {'AC Analysis' if layout == 'complex' else 'Transient Analysis'}\n"
+        f"Flags: {flags}\n"
+        f"No. Variables: {len(names) + 1}\n"
+        f"No. Points: {n_steps * n_points}\n"
+        "Offset:   0.0000000000000000e+000\n"
+        "Command: Linear Technology Corporation LTspice XVII\n"
+        "Variables:\n"
+        f"\t0\t{axis_name}\t{axis_name}\n"
+        f"{variables}"
+        "Binary:\n"
+    )
+    with open(raw_path, "wb") as f:
+        f.write(header.encode("utf-16-le"))
+        f.write(data)
+
+    if step_params:
+        write_step_log(raw_path.with_suffix(".log"), raw_path.stem, step_params)
+
+
+def write_step_log(log_path: Path, title: str, step_params: Sequence[dict[str, float]]) -> None:
+    """ステップごとのパラメータを書いたLTspice形式の.logファイルを書き出す。"""
+    lines = [f"Circuit: * {title}", ""]
+    for params in step_params:
+        lines.append(".step " + " ".join(f"{key}={value:g}" for key, value in params.items()))
+    lines.append("Total elapsed time: 0.000 seconds.")
+    log_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def write_ac_raw(
+    raw_path: Path,
+    freq: np.ndarray,
+    traces: dict[str, np.ndarray],
+    step_params: Sequence[dict[str, float]] = (),
+) -> None:
+    """LTspice形式のバイナリAC RAWファイル（複素double）を書き出す。
+
+    Args:
+        raw_path: 書き出すRAWファイルのパス
+        freq: 周波数軸 [Hz]（全ステップ共通）
+        traces: トレース名→波形の辞書。波形は (ステップ数, 点数) の複素配列
+        step_params: ステップごとのパラメータ辞書のリスト
+    """
+    write_raw(raw_path, freq, traces, step_params, layout="complex")
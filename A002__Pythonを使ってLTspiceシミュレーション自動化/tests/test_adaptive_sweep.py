@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""適応周波数スイープ（merge_sweeps / refine_frequencies / simulate_frame_adaptive）のテスト。"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+F0, Q = 2000.0, 5.0
+TOL_DB, TOL_DEG = 0.05, 0.5
+
+
+def resonance(freq: np.ndarray) -> np.ndarray:
+    """2次のローパス（共振周波数 F0、Q）の応答。"""
+    s = 1j * freq / F0
+    return 1.0 / (1.0 + s / Q + s ** 2)
+
+
+def frame(freq: np.ndarray, step: int = 0, response=resonance) -> pd.DataFrame:
+    h = response(freq)
+    return pd.DataFrame({
+        "frequency_Hz": freq,
+        "mag_dB": 20 * np.log10(np.abs(h)),
+        "phase_deg": np.degrees(np.angle(h)),
+        "step_index": np.full(len(freq), step),
+    })
+
+
+def test_merge_sweeps_drops_rounded_duplicates(runner):
+    coarse = pd.concat([frame(np.array([100.0, 1000.0, 10000.0]), step) for step in (0, 1)])
+    # ".ac list" の有効数字9桁で丸めた周波数（丸め誤差だけ異なる）と、新しい周波数
+    extra = frame(np.array([float(f"{1000.0 * (1 + 3e-10):.9g}") + 2e-7, 3162.27766]), 1)
+    merged = runner.merge_sweeps([coarse, extra])
+
+    assert merged["step_index"].tolist() == [0, 0, 0, 1, 1, 1, 1]
+    np.testing.assert_array_equal(merged["frequency_Hz"][3:], [100.0, 1000.0, 3162.27766, 10000.0])
+
+
+def test_refine_only_where_interpolation_error_exceeds_tolerance(runner):
+    freq = np.geomspace(20.0, 20e3, 41)  # 1/4オクターブ刻み
+    refined = runner.refine_frequencies(frame(freq), 0.01, TOL_DB, TOL_DEG)
+
+    # 各区間の中点で、対数周波数上の直線補間の実際の誤差を求める
+    mid = np.sqrt(freq[:-1] * freq[1:])
+    h_mid, h = resonance(mid), resonance(freq)
+    mag, phase = 20 * np.log10(np.abs(h)), np.unwrap(np.degrees(np.angle(h)), period=360.0)
+    err_db = np.abs(20 * np.log10(np.abs(h_mid)) - (mag[:-1] + mag[1:]) / 2)
+    err_deg = np.abs(np.degrees(np.angle(h_mid)) - (phase[:-1] + phase[1:]) / 2)
+
+    assert set(np.round(refined, 6)) <= set(np.round(mid, 6))
+    added = np.isin(np.round(mid, 6), np.round(refined, 6))
+    # 誤差が許容値の2倍を超える区間は必ず分割し、1/4未満の区間（平坦な帯域）は分割しない
+    assert added[(err_db > 2 * TOL_DB) | (err_deg > 2 * TOL_DEG)].all()
+    assert not added[(err_db < TOL_DB / 4) & (err_deg < TOL_DEG / 4)].any()
+    assert 0 < added.sum() < len(mid) / 2
+    assert (refined > F0 / 4).all() and (refined < F0 * 4).all()
+
+    # 元の .ac の刻み（min_octaves）より細かくは分割しない
+    assert len(runner.refine_frequencies(frame(freq), 0.25, TOL_DB, TOL_DEG)) == 0
+
+
+def test_refine_handles_ragged_steps(runner):
+    freq = np.geomspace(20.0, 20e3, 41)
+    flat = frame(np.geomspace(20.0, 20e3, 7), 1, response=lambda f: np.ones_like(f, dtype=complex))
+    ragged = pd.concat([frame(freq), flat], ignore_index=True)
+
+    # 点数の異なるステップがあっても、ステップごとに判定する（平坦なステップからは追加されない）
+    np.testing.assert_array_equal(
+        runner.refine_frequencies(ragged, 0.01, TOL_DB, TOL_DEG),
+        runner.refine_frequencies(frame(freq), 0.01, TOL_DB, TOL_DEG),
+    )
+
+
+def test_adaptive_sweep_with_native_solver(runner, tmp_path):
+    netlist = tmp_path / "rlc.net"
+    netlist.write_text("\n".join([
+        "* series RLC lowpass",
+        "V1 in 0 AC 1",
+        "R1 in a 80",  # Q = sqrt(L/C) / R = 5
+        f"L1 a {runner.TARGET_NODE} 10m",  # 測定対象のノードの電圧が出力
+        f"C1 {runner.TARGET_NODE} 0 {{1/((2*pi*2k)**2*10m)}}",
+        ".ac oct 40 20 20k",
+        ".end",
+    ]) + "\n", encoding="utf-8")
+    adaptive = runner.AdaptiveSweep(coarse_per_octave=4, tol_db=TOL_DB, tol_deg=TOL_DEG)
+    dense, _ = runner.simulate_frame(netlist, tmp_path, {}, executable=runner.NATIVE_SIMULATOR)
+    sparse, _ = runner.simulate_frame(
+        netlist, tmp_path, {}, executable=runner.NATIVE_SIMULATOR, adaptive=adaptive
+    )
+
+    assert len(sparse) < len(dense) / 2
+    assert sparse["frequency_Hz"].is_monotonic_increasing
+    np.testing.assert_allclose(sparse["frequency_Hz"].iloc[[0, -1]], [20.0, 20e3])
+    # 粗い点の間を補間しても、細かいスイープとの差は許容値の程度に収まる
+    x = np.log2(sparse["frequency_Hz"])
+    interpolated = np.interp(np.log2(dense["frequency_Hz"]), x, sparse["mag_dB"])
+    assert np.abs(interpolated - dense["mag_dB"]).max() < 2 * TOL_DB
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""SimulationCache（シミュレーション結果の永続キャッシュ）のテスト。"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def frame() -> pd.DataFrame:
+    freq = np.logspace(1, 4, 30)
+    return pd.DataFrame({
+        "frequency_Hz": freq,
+        "mag_dB": -10 * np.log10(1 + (freq / 1e3) ** 2),
+        "phase_deg": -np.degrees(np.arctan(freq / 1e3)),
+        "step_index": np.zeros(len(freq), dtype=np.int64),
+    })
+
+
+def test_round_trip(runner, tmp_path, frame):
+    cache = runner.SimulationCache(tmp_path / "cache", max_bytes=1 << 20)
+    key = runner.SimulationCache.make_key("* netlist\n.end\n", "native")
+    assert cache.get(key) is None
+    cache.put(key, frame)
+    assert cache.contains(key)
+    pd.testing.assert_frame_equal(cache.get(key), frame)
+
+
+@pytest.mark.parametrize("keep", [0, 0.5])
+def test_corrupt_entry_is_a_miss_and_removed(runner, tmp_path, frame, keep):
+    cache = runner.SimulationCache(tmp_path / "cache", max_bytes=1 << 20)
+    key = runner.SimulationCache.make_key("* netlist\n.end\n", "native")
+    cache.put(key, frame)
+    path = cache._path(key)
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep)])  # 書き込みが中断したエントリ
+
+    assert cache.get(key) is None
+    assert not path.exists()
+    cache.put(key, frame)
+    pd.testing.assert_frame_equal(cache.get(key), frame)
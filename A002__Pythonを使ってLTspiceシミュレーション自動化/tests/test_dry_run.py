@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""--dry-run（ケース表の表示だけで、シミュレーションも出力フォルダの作成もしない）のテスト。"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+# スクリプトを __main__ として実行した後に、pandas が読み込まれたかを表示する
+CHECK_IMPORTS = """\
+import runpy, sys
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    print("pandas imported:", "pandas" in sys.modules)
+"""
+
+
+def run_checked(workspace, *args: str) -> subprocess.CompletedProcess:
+    command = [
+        sys.executable, "-c", CHECK_IMPORTS, str(workspace.script),
+        "--ltspice", str(workspace.ltspice), "--scenario", str(workspace.scenario), *args,
+    ]
+    result = subprocess.run(
+        command, cwd=workspace.root, env=dict(os.environ),
+        capture_output=True, text=True, errors="replace", timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result
+
+
+def test_dry_run_creates_nothing_and_skips_pandas(workspace):
+    before = sorted(path.relative_to(workspace.root) for path in workspace.root.rglob("*"))
+    result = run_checked(workspace, "--dry-run", "--no-cache")
+
+    assert "pandas imported: False" in result.stdout
+    assert "6 cases, 6 to simulate, cache hits: 0" in result.stdout
+    assert workspace.outdirs() == []
+    assert sorted(path.relative_to(workspace.root) for path in workspace.root.rglob("*")) == before
+
+
+def test_dry_run_reports_cache_without_pandas(workspace):
+    # キャッシュの状態の確認（エントリの有無）にも pandas は不要
+    run_checked(workspace, "--jobs", "1", "--no-metrics", "--no-merge", "--cache-dir", str(workspace.root / "cache"))
+    (outdir,) = workspace.outdirs()
+    result = run_checked(workspace, "--dry-run", "--cache-dir", str(workspace.root / "cache"))
+
+    assert "pandas imported: False" in result.stdout
+    assert "cache hits: 6" in result.stdout
+    assert workspace.outdirs() == [outdir]
+
+
+def test_real_run_imports_pandas(workspace):
+    # 上のテストが pandas の読み込みを検出できることの確認
+    result = run_checked(workspace, "--jobs", "1", "--no-metrics", "--no-merge", "--no-cache")
+    assert "pandas imported: True" in result.stdout
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""interp_log_frequency（全ステップまとめての対数周波数補間）のテスト。"""
+from __future__ import annotations
+
+import numpy as np
+
+GRID = np.logspace(1, 5, 33)
+
+
+def test_matches_per_step_interp(runner):
+    freq = np.array([np.logspace(1, 4, 20), np.logspace(2, 5, 20)])
+    freq[1, -5:] = np.nan  # stack_steps の埋め草
+    values = np.sin(np.log(freq)) * np.array([[1.0], [2.0]])
+    result = runner.interp_log_frequency(freq, values, GRID)
+
+    for row, f, v in zip(result, freq, values):
+        ok = np.isfinite(f)
+        inside = (GRID >= f[ok].min() * (1 - 1e-12)) & (GRID <= f[ok].max() * (1 + 1e-12))
+        np.testing.assert_allclose(row[inside], np.interp(np.log(GRID[inside]), np.log(f[ok]), v[ok]))
+        assert np.isnan(row[~inside]).all()
+
+
+def test_all_nan_or_empty_sweep_returns_nan(runner):
+    freq = np.full((2, 5), np.nan)
+    result = runner.interp_log_frequency(freq, np.zeros((2, 5)), GRID)
+    assert result.shape == (2, len(GRID))
+    assert np.isnan(result).all()
+
+    empty = runner.interp_log_frequency(np.empty((1, 0)), np.empty((1, 0)), GRID)
+    assert empty.shape == (1, len(GRID))
+    assert np.isnan(empty).all()
+
+    # 一部のステップだけが全てNaNの場合は、そのステップだけが NaN になる
+    freq = np.vstack([np.logspace(1, 5, 9), np.full(9, np.nan)])
+    result = runner.interp_log_frequency(freq, np.ones((2, 9)), GRID)
+    np.testing.assert_allclose(result[0], 1.0)
+    assert np.isnan(result[1]).all()
+
+
+def loaded_case(runner, freq: np.ndarray):
+    freq = np.atleast_2d(freq)
+    zeros = np.zeros_like(freq)
+    return ("Vol", "Neck", runner.StepArrays(freq=freq, mag_db=zeros, phase_deg=zeros, steps=[{}] * len(freq)))
+
+
+def test_canonical_frequencies_follows_finest_step(runner):
+    coarse = loaded_case(runner, np.logspace(1, 5, 41))  # 10点/decade
+    fine = loaded_case(runner, np.logspace(2, 3, 51))  # 50点/decade
+    grid = runner.canonical_frequencies([coarse, fine], 0)
+    assert grid[0] == 10.0 and grid[-1] == 1e5
+    assert len(grid) == 4 * 50 + 1
+
+    assert len(runner.canonical_frequencies([coarse, fine], 20)) == 4 * 20 + 1
+
+
+def test_canonical_frequencies_ignores_near_duplicates(runner):
+    # 丸め誤差でほぼ重複した点（相対差 1e-9）は密度の計算に使わない
+    freq = np.sort(np.concatenate([np.logspace(1, 5, 41), [1000.0 * (1 + 1e-9)]]))
+    grid = runner.canonical_frequencies([loaded_case(runner, freq)], 0)
+    assert len(grid) == 4 * 10 + 1
+
+    # 重複ではないが極端に狭い間隔は、点数の上限までに抑える
+    freq = np.sort(np.concatenate([np.logspace(1, 5, 41), [1000.0 * (1 + 1e-5)]]))
+    grid = runner.canonical_frequencies([loaded_case(runner, freq)], 0)
+    assert len(grid) == 4 * runner.MERGE_MAX_POINTS_PER_DECADE + 1
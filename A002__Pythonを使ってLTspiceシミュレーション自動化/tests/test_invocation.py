@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""LTspiceの起動方法の記録と、応答しない実行の強制終了（--sim-timeout）のテスト。"""
+from __future__ import annotations
+
+import json
+import time
+
+RUN_ARGS = ("--jobs", "1", "--no-metrics", "--no-merge")
+HANG_HUM = {"FAKE_LTSPICE_HANG_PATTERN": r"InstName V4\s*\nSYMATTR Value 5"}  # V4 をオンにする Hum だけ応答しない
+
+
+def test_working_invocation_is_saved_and_reused(workspace, tmp_path):
+    env = {"FAKE_LTSPICE_REQUIRE_ARGS": "-Run -b", "FAKE_LTSPICE_LOG": str(tmp_path / "calls.log")}
+    workspace.run(*RUN_ARGS, env=env)
+
+    # 最初のケースで "-b" が失敗し "-Run -b" が成功する。以降のケースは記録した起動方法だけを使う
+    assert len((tmp_path / "calls.log").read_text(encoding="utf-8").splitlines()) == 6 + 1
+    saved = json.loads((workspace.root / ".ltspice_invocation.json").read_text(encoding="utf-8"))
+    assert list(saved.values()) == [["-Run", "-b"]]
+
+    # 次回の実行は記録を読み込むため、失敗する起動方法を試さない
+    (tmp_path / "calls.log").unlink()
+    workspace.run(*RUN_ARGS, env=env)
+    assert len((tmp_path / "calls.log").read_text(encoding="utf-8").splitlines()) == 6
+
+
+def test_hung_simulation_is_killed_and_reported(workspace):
+    start = time.monotonic()
+    result = workspace.run(*RUN_ARGS, "--sim-timeout", "1", env=HANG_HUM, check=False)
+    elapsed = time.monotonic() - start
+
+    # 逐次実行は最初の Hum ケースで停止する（それより前の Neck / Neck-Middle は保存済み）
+    assert result.returncode != 0
+    assert "did not finish within 1 s and was killed" in result.stderr
+    assert elapsed < 60  # 待ち続ける代替シミュレータ（3600秒）の終了を待っていない
+    (outdir,) = workspace.outdirs()
+    assert sorted(path.name for path in outdir.glob("*.csv")) == [
+        "AM-Pro__Neck-Middle_Vol.csv", "AM-Pro__Neck_Vol.csv",
+    ]
+
+
+def test_hung_simulation_fails_only_its_case(workspace):
+    result = workspace.run(*RUN_ARGS, "--pipeline", "--sim-timeout", "1", env=HANG_HUM, check=False)
+
+    output = result.stdout + result.stderr
+    assert result.returncode != 0
+    assert "2 of 6 cases failed" in output
+    assert output.count("did not finish within 1 s and was killed") == 2
+    (outdir,) = workspace.outdirs()
+    assert len(list(outdir.glob("*.csv"))) == 4
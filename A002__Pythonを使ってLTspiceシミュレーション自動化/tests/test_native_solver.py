@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""内蔵ソルバー（修正節点解析）のテスト。解析的に求めた伝達関数と比較する。"""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+AC_SWEEP = ".ac dec 20 10 100k"
+
+
+def solve(runner, netlist: str, target: str = "out"):
+    """SPICEネットリストを内蔵ソルバーで解き、(周波数, 応答, ステップ情報) を返す。"""
+    freq, response, lengths, steps, steps_info = runner.solve_circuit_ac(
+        runner.parse_spice_circuit(netlist), target_node=target
+    )
+    n_steps = len(lengths)
+    return freq.reshape(n_steps, -1)[0], response.reshape(n_steps, -1), steps_info
+
+
+def test_rc_lowpass(runner):
+    freq, response, steps_info = solve(runner, "\n".join([
+        "* RC lowpass",
+        "V1 in 0 AC 1",
+        "R1 in out 1k",
+        "C1 out 0 {c}",
+        ".param c=0.1u",
+        AC_SWEEP,
+        ".end",
+    ]))
+    assert steps_info is None
+    np.testing.assert_allclose(freq, runner.ac_frequencies(AC_SWEEP.split()[1:]))
+    omega = 2 * np.pi * freq
+    np.testing.assert_allclose(response[0], 1 / (1 + 1j * omega * 1e3 * 0.1e-6), rtol=1e-9)
+
+
+def test_stepped_rlc_lowpass(runner):
+    freq, response, steps_info = solve(runner, "\n".join([
+        "* series RLC lowpass",
+        "V1 in 0 DC 0 AC 1",
+        "R1 in a {r}",
+        "R0 a b 0",  # 0Ωの抵抗は短絡（節点 a と b が1つになる）
+        "L1 b out 10m",
+        "C1 out 0 100n",
+        ".step param r list 10 100 1k",
+        AC_SWEEP,
+        ".end",
+    ]))
+    assert [step["r"] for step in steps_info] == [10, 100, 1000]
+    omega = 2 * np.pi * freq
+    for r, row in zip((10.0, 100.0, 1e3), response):
+        expected = 1 / (1 - omega ** 2 * 10e-3 * 100e-9 + 1j * omega * r * 100e-9)
+        np.testing.assert_allclose(row, expected, rtol=1e-6)
+
+
+def switched_netlist(sweep: list[str]) -> str:
+    """スイッチ（制御電圧で切り替え）と可変抵抗を含む回路。"""
+    return "\n".join([
+        "* switched tone circuit",
+        "V1 in 0 AC 1",
+        "R1 in out 10k",
+        "C1 out 0 10n",
+        "S1 out mid ctl 0 TONE",
+        "C2 mid 0 47n",
+        "R3 out 0 {rk}",
+        "Vc ctl 0 {ctl}",
+        ".model TONE SW(Ron=10 Roff=1meg Vt=2.5)",
+        *sweep,
+        AC_SWEEP,
+        ".end",
+    ])
+
+
+def test_low_rank_update_matches_full_solve(runner, monkeypatch):
+    # 周波数方向の分割も通るように、一度に解く行列を小さくする
+    monkeypatch.setattr(runner, "NATIVE_CHUNK_BYTES", 4096)
+    # 未知数6（節点4 + 電源2）に対して変わる部品は S1 と R3 の2つなので、低ランク更新で解かれる
+    _, stepped, steps_info = solve(runner, switched_netlist([
+        ".step param ctl list 0 5",
+        ".step param rk list 1k 22k 470k",
+    ]))
+    assert len(steps_info) == 6
+
+    for step, row in zip(steps_info, stepped):
+        # ステップ無し（1回の行列の解）で同じ値の回路を解き直す
+        _, full, _ = solve(runner, switched_netlist([f".param ctl={step['ctl']} rk={step['rk']}"]))
+        np.testing.assert_allclose(row, full[0], rtol=1e-9, atol=1e-12)
+
+    # スイッチが入ると C2 が並列に入り、高域がさらに下がる
+    off, on = stepped[0], stepped[3]
+    assert np.abs(on[-1]) < np.abs(off[-1])
+
+
+def test_param_expressions(runner):
+    evaluator = runner.ParamEvaluator(
+        {"x": "10k", "px": "(x**k-1)/(x-1)", "r": "{if(k>=0.5, 1meg, 250k)}"},
+        {"k": np.array([0.0, 0.5, 1.0])},
+    )
+    assert evaluator.evaluate("0.022u") == pytest.approx(22e-9)
+    assert evaluator.evaluate("4.7µF") == pytest.approx(4.7e-6)
+    assert evaluator.evaluate("{-2**2 + 3*sqrt(4)/2}") == pytest.approx(-1.0)
+    np.testing.assert_allclose(evaluator.evaluate("{Px*250k+50m}"), [0.05, 250e3 / 101 + 0.05, 250e3 + 0.05])
+    np.testing.assert_allclose(evaluator.evaluate("r"), [250e3, 1e6, 1e6])
+    np.testing.assert_allclose(evaluator.evaluate("{0.2 < k <= 0.5}"), [False, True, False])
+    assert evaluator.evaluate("table(2, 1, 10, 3, 30)") == pytest.approx(20.0)
+
+
+@pytest.mark.parametrize("expr, message", [
+    ("{().__class__.__base__.__subclasses__()}", "Unsupported expression"),
+    ("{x.real}", "Unsupported expression"),
+    ("{__import__('os')}", "Unsupported expression"),
+    ("{(lambda: 1)()}", "Unsupported expression"),
+    ("{[1, 2][0]}", "Unsupported expression"),
+    ("{sqrt}", "used as a value"),
+    ("{x^2}", "Use '\\*\\*' for powers"),
+    ("{1 +}", "Invalid expression"),
+])
+def test_param_expressions_reject_other_syntax(runner, expr, message):
+    evaluator = runner.ParamEvaluator({"x": "2"}, {})
+    with pytest.raises(ValueError, match=message):
+        evaluator.evaluate(expr)
+
+
+def test_resistor_that_is_zero_in_some_steps(runner):
+    def netlist(sweep: list[str]) -> str:
+        return "\n".join([
+            "* volume pot at its end stop",
+            "V1 in 0 AC 1",
+            "R1 in out {100k*(1-k)}",  # k=1 で0Ω
+            "R2 out 0 {100k*k+1k}",
+            "C1 out 0 1n",
+            *sweep,
+            AC_SWEEP,
+            ".end",
+        ])
+
+    _, stepped, _ = solve(runner, netlist([".step param k list 0 0.5 1"]))
+    assert np.isfinite(stepped).all()
+    for k, row in zip((0, 0.5, 1), stepped):
+        # ステップ無しで解いた回路（k=1 では R1 を短絡としてまとめる）と一致する
+        _, full, _ = solve(runner, netlist([f".param k={k}"]))
+        np.testing.assert_allclose(row, full[0], rtol=1e-6)
+    np.testing.assert_allclose(stepped[2], 1.0, rtol=1e-6)
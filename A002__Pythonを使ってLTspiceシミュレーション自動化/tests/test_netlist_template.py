@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""NetlistTemplate（メモリ上で部品値を差し替えたネットリストの生成）のテスト。"""
+from __future__ import annotations
+
+SPICE = """\
+* test circuit
+V1 in 0 AC 1
+V2 sw 0 0 Rser=1m
+V3 sw2 0 DC 0 AC 0
+C1 out 0 1u ic=0
+R1 in out 1k
+.ac dec 10 10 100k
+.wrdata out.txt V(out)
+.end
+"""
+
+
+def test_spice_render_keeps_tokens_after_value(runner, tmp_path):
+    path = tmp_path / "circuit.net"
+    path.write_text(SPICE, encoding="utf-8")
+    template = runner.NetlistTemplate(path)
+    assert template.kind == "spice"
+    assert template.has_components(["V2", "v3", "C1"])
+
+    text = template.render({"V2": "5", "V3": "5", "C1": "2.2u"}, instructions=[".step param k list 1 2"])
+    lines = text.splitlines()
+    assert "V2 sw 0 5 Rser=1m" in lines
+    assert "V3 sw2 0 DC 5 AC 0" in lines
+    assert "C1 out 0 2.2u ic=0" in lines
+    assert "R1 in out 1k" in lines
+    assert not any(".wrdata" in line for line in lines)
+    # 追加のディレクティブは .end の前に入る
+    assert lines[-2:] == [".step param k list 1 2", ".end"]
+    # テンプレート自体は変更されない
+    assert "V2 sw 0 0 Rser=1m" in template.render({}).splitlines()
+
+
+def test_asc_render_replaces_value_lines(runner):
+    template = runner.NetlistTemplate(runner.INPUT_PATH)
+    assert template.kind == "asc"
+    text = template.render({"V2": "5", "V6": "5"}, runner.tone_param_transform)
+    lines = text.splitlines()
+    v2 = lines.index("SYMATTR InstName V2")
+    assert lines[v2 + 1] == "SYMATTR Value 5"
+    assert ".step param j 0 0.999 0.111" in text
+    v6 = lines.index("SYMATTR InstName V6")
+    assert lines[v6 + 1] == "SYMATTR Value 5"
+    # 指定しなかった部品は入力ファイルのまま
+    original = template.render({}).splitlines()
+    v3 = lines.index("SYMATTR InstName V3")
+    assert lines[v3 + 1] == original[original.index("SYMATTR InstName V3") + 1]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""結果ファイルの形式（CSV / Parquet / Feather）とParquetデータセットのテスト。"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RUN_ARGS = ("--jobs", "1", "--no-metrics", "--no-merge")
+
+
+def case_frame(step_name: str, values: list[float]) -> pd.DataFrame:
+    """ステップパラメータの列（step_*）を持つ、data_from_raw と同じ形式のDataFrame。"""
+    freq = np.logspace(1, 4, 5)
+    return pd.DataFrame({
+        "frequency_Hz": np.tile(freq, len(values)),
+        "mag_dB": np.linspace(-3.0, 0.0, 5 * len(values)),
+        "phase_deg": np.linspace(-90.0, 0.0, 5 * len(values)),
+        "step_index": np.repeat(np.arange(len(values)), 5),
+        step_name: np.repeat(values, 5),
+    })
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "feather"])
+def test_round_trip(runner, tmp_path, output_format):
+    df = case_frame("step_k", [0.1, 0.5])
+    path = runner.result_path(tmp_path, "Neck", "Vol", output_format)
+    assert path.suffix == runner.OUTPUT_SUFFIXES[output_format]
+    runner.write_frame(df, path, output_format)
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]  # 一時ファイルは残らない
+
+    loaded = runner.read_frame(path, output_format)
+    if output_format == "csv":
+        pd.testing.assert_frame_equal(loaded, df, check_exact=False, rtol=1e-12)
+    else:
+        pd.testing.assert_frame_equal(loaded, df)  # 型も含めてそのまま戻る
+
+
+def test_unknown_format_is_rejected(runner, tmp_path):
+    with pytest.raises(ValueError, match="Unsupported output format"):
+        runner.write_frame(case_frame("step_k", [0.1]), tmp_path / "x.xlsx", "xlsx")
+
+
+def test_unify_dataset_columns(runner, tmp_path):
+    dataset = tmp_path / runner.DATASET_DIRNAME
+    runner.write_dataset_partition(case_frame("step_k", [0.1, 0.5]), dataset, "Neck", "Vol")
+    runner.write_dataset_partition(case_frame("step_j", [0.2]), dataset, "Neck", "Tone")
+    runner.unify_dataset_columns(dataset)
+
+    import pyarrow.parquet as pq
+
+    schemas = {tuple(pq.read_schema(path).names) for path in dataset.glob("*/*/*.parquet")}
+    assert len(schemas) == 1
+    assert {"step_k", "step_j"} <= set(next(iter(schemas)))
+
+    # バッチ全体を1回で読み込むと、パーティションの variant・case が列になる
+    batch = pd.read_parquet(dataset)
+    assert len(batch) == 15
+    vol = batch[batch["variant"] == "Vol"]
+    tone = batch[batch["variant"] == "Tone"]
+    assert (batch["case"] == "Neck").all()
+    np.testing.assert_allclose(vol["step_k"], np.repeat([0.1, 0.5], 5))
+    assert vol["step_j"].isna().all()
+    np.testing.assert_allclose(tone["step_j"], 0.2)
+    assert tone["step_k"].isna().all()
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "feather"])
+def test_columnar_output_matches_csv(make_workspace, runner, output_format):
+    csv = make_workspace("csv")
+    columnar = make_workspace(output_format)
+    csv.run(*RUN_ARGS)
+    columnar.run(*RUN_ARGS, "--format", output_format, "--dataset")
+    (csv_dir,) = csv.outdirs()
+    (columnar_dir,) = columnar.outdirs()
+
+    expected = {path.stem: runner.read_frame(path, "csv") for path in csv_dir.glob("*.csv")}
+    suffix = runner.OUTPUT_SUFFIXES[output_format]
+    actual = {path.stem: runner.read_frame(path, output_format) for path in columnar_dir.glob(f"*{suffix}")}
+    assert actual.keys() == expected.keys()
+    for name, df in expected.items():
+        pd.testing.assert_frame_equal(actual[name], df, check_exact=False, rtol=1e-12)
+
+    batch = pd.read_parquet(columnar_dir / runner.DATASET_DIRNAME)
+    assert len(batch) == sum(len(df) for df in expected.values())
+    assert set(batch["variant"]) == {"Vol", "Tone"}
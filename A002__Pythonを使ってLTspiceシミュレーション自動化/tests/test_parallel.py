@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""--jobs による並列実行の結果が逐次実行と一致することのテスト。"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+RUN_ARGS = ("--no-metrics", "--no-merge")
+
+
+def result_files(outdir: Path) -> dict[str, bytes]:
+    """ケースごとの結果ファイルの内容を返す。"""
+    return {path.name: path.read_bytes() for path in outdir.glob("*.csv")}
+
+
+def planned_cases(outdir: Path) -> list[tuple[str, str, str]]:
+    """マニフェストに記録されたケースの並び（バリエーション名, ケース名, ファイル名）を返す。"""
+    manifest = json.loads((outdir / "manifest.json").read_text(encoding="utf-8"))
+    return [(case["variant"], case["case"], case["file"]) for case in manifest["cases"]]
+
+
+def test_parallel_matches_serial(make_workspace):
+    serial = make_workspace("serial")
+    parallel = make_workspace("parallel")
+    serial.run("--jobs", "1", *RUN_ARGS)
+    result = parallel.run("--jobs", "2", *RUN_ARGS)
+
+    (serial_dir,) = serial.outdirs()
+    (parallel_dir,) = parallel.outdirs()
+    expected = result_files(serial_dir)
+    assert len(expected) == 6
+    assert result_files(parallel_dir) == expected
+    assert planned_cases(parallel_dir) == planned_cases(serial_dir)
+    # 完了マーカーは結果ファイルを置き終えたケースごとに書き出される
+    assert {path.name for path in (parallel_dir / ".done").iterdir()} == {f"{name}.done" for name in expected}
+
+    # 作業ディレクトリは全ケースの成功後に削除される
+    assert not (parallel_dir / "_work").exists()
+    assert result.stdout.count("saved: ") == 6
+
+
+def test_parallel_summary_order_matches_serial(make_workspace):
+    serial = make_workspace("serial")
+    parallel = make_workspace("parallel")
+    serial.run("--jobs", "1")
+    parallel.run("--jobs", "3")
+
+    (serial_dir,) = serial.outdirs()
+    (parallel_dir,) = parallel.outdirs()
+    for name in ("AM-Pro__metrics.csv", "AM-Pro__gain_matrix.csv"):
+        assert (parallel_dir / "summary" / name).read_bytes() == (serial_dir / "summary" / name).read_bytes()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""パイプライン実行（シミュレーション中に前のケースを書き出す）のテスト。"""
+from __future__ import annotations
+
+from pathlib import Path
+
+RUN_ARGS = ("--jobs", "1", "--no-metrics", "--no-merge")
+FAIL_HUM = {"FAKE_LTSPICE_FAIL_PATTERN": r"InstName V4\s*\nSYMATTR Value 5"}  # V4 をオンにする Hum だけ失敗
+
+
+def result_files(outdir: Path) -> dict[str, bytes]:
+    return {path.name: path.read_bytes() for path in outdir.glob("*.csv")}
+
+
+def test_pipeline_matches_serial(make_workspace):
+    serial = make_workspace("serial")
+    pipelined = make_workspace("pipelined")
+    serial.run(*RUN_ARGS, "--no-pipeline")
+    result = pipelined.run(*RUN_ARGS, "--pipeline")
+
+    (serial_dir,) = serial.outdirs()
+    (pipelined_dir,) = pipelined.outdirs()
+    expected = result_files(serial_dir)
+    assert len(expected) == 6
+    assert result_files(pipelined_dir) == expected
+    assert {path.name for path in (pipelined_dir / ".done").iterdir()} == {f"{name}.done" for name in expected}
+    assert not (pipelined_dir / "_work").exists()
+    assert result.stdout.count("saved: ") == 6
+
+
+def test_pipeline_keeps_going_after_a_failed_case(make_workspace):
+    serial = make_workspace("serial")
+    pipelined = make_workspace("pipelined")
+    serial.run(*RUN_ARGS, "--no-pipeline")
+    result = pipelined.run(*RUN_ARGS, "--pipeline", env=FAIL_HUM, check=False)
+
+    assert result.returncode != 0
+    assert "2 of 6 cases failed" in result.stdout + result.stderr
+    (serial_dir,) = serial.outdirs()
+    (pipelined_dir,) = pipelined.outdirs()
+    expected = {name: data for name, data in result_files(serial_dir).items() if "__Hum_" not in name}
+    assert len(expected) == 4
+    # 失敗したケースの前後のケースも書き出され、失敗したケースの作業ディレクトリは残る
+    assert result_files(pipelined_dir) == expected
+    assert {path.name for path in (pipelined_dir / ".done").iterdir()} == {f"{name}.done" for name in expected}
+    assert sorted(path.name for path in (pipelined_dir / "_work").iterdir()) == ["Hum_Tone", "Hum_Vol"]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""ケースごとのグラフの書き出し（--plots, plot_results）のテスト。"""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("matplotlib")
+
+RUN_ARGS = ("--jobs", "1", "--no-metrics", "--no-merge")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def check_images(paths, formats):
+    for path in paths:
+        data = path.read_bytes()
+        if path.suffix == ".png":
+            assert data.startswith(PNG_SIGNATURE)
+        else:
+            assert b"<svg" in data[:2000]
+    assert {path.suffix for path in paths} == {f".{fmt}" for fmt in formats}
+
+
+def test_plots_option_writes_every_case(workspace):
+    result = workspace.run(*RUN_ARGS, "--plots", "--plot-formats", "png", "svg", "--plot-workers", "2")
+
+    (outdir,) = workspace.outdirs()
+    plot_dir = outdir / "plots"
+    expected = {f"{path.stem}.{fmt}" for path in outdir.glob("*.csv") for fmt in ("png", "svg")}
+    assert len(expected) == 12
+    assert {path.name for path in plot_dir.iterdir()} == expected
+    check_images(list(plot_dir.iterdir()), ("png", "svg"))
+    assert f"plots: {plot_dir} (12 files)" in result.stdout
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_plot_results_returns_written_files(runner, workspace, tmp_path, max_workers):
+    workspace.run(*RUN_ARGS)
+    (outdir,) = workspace.outdirs()
+    result_files = sorted(outdir.glob("*.csv"))[:3]
+
+    written = runner.plot_results(result_files, tmp_path / "plots", ("png",), "csv", max_workers)
+
+    assert sorted(written) == sorted(tmp_path / "plots" / f"{path.stem}.png" for path in result_files)
+    assert sorted((tmp_path / "plots").iterdir()) == sorted(written)
+    check_images(written, ("png",))
+
+
+def test_plot_results_reports_failed_cases(runner, workspace, tmp_path):
+    workspace.run(*RUN_ARGS)
+    (outdir,) = workspace.outdirs()
+    result_files = sorted(outdir.glob("*.csv"))[:2] + [outdir / "missing.csv"]
+
+    with pytest.raises(RuntimeError, match=r"1 of 3 plots failed\.\nmissing\.csv: "):
+        runner.plot_results(result_files, tmp_path / "plots", ("png",), "csv", 2)
+    # 失敗したケース以外のグラフは書き出されている
+    assert sorted(path.name for path in (tmp_path / "plots").iterdir()) == sorted(
+        f"{path.stem}.png" for path in result_files[:2]
+    )
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""LtspiceRawReader（メモリマップによるRAWファイルの読み込み）と data_from_raw のテスト。"""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from ltspice_raw import write_raw
+
+FREQ = np.logspace(1, np.log10(50e3), 40)
+TIME = np.linspace(0.0, 1e-3, 25)
+
+
+def resonance(n_steps: int) -> np.ndarray:
+    """ステップごとに共振周波数が変わる (ステップ数, 点数) の複素応答。"""
+    f0 = np.linspace(2e3, 8e3, n_steps)[:, None]
+    return 1.0 / (1.0 - (FREQ / f0) ** 2 + 1j * FREQ / (4.0 * f0))
+
+
+def test_complex_layout(runner, tmp_path):
+    path = tmp_path / "ac.raw"
+    wave = resonance(1)
+    write_raw(path, FREQ, {"V(amp-in)": wave, "I(R1)": wave * 1e-3})
+
+    with runner.LtspiceRawReader(path) as reader:
+        assert reader.trace_names == ["frequency", "V(amp-in)", "I(R1)"]
+        assert reader.find_trace("v(AMP-IN)") == 1
+        np.testing.assert_array_equal(reader.axis().real, FREQ)
+        np.testing.assert_array_equal(reader.trace(2), wave[0] * 1e-3)
+        np.testing.assert_array_equal(reader.step_lengths(), [len(FREQ)])
+
+    df = runner.data_from_raw(path)
+    assert list(df.columns) == ["frequency_Hz", "mag_dB", "phase_deg", "step_index"]
+    np.testing.assert_allclose(df["mag_dB"], 20 * np.log10(np.abs(wave[0])))
+    np.testing.assert_allclose(df["phase_deg"], np.degrees(np.angle(wave[0])))
+    assert (df["step_index"] == 0).all()
+
+
+def test_stepped_layout_matches_rawread(runner, tmp_path):
+    path = tmp_path / "stepped.raw"
+    steps = [{"k": value} for value in (0.111, 0.5, 0.999)]
+    wave = resonance(len(steps))
+    write_raw(path, FREQ, {"V(amp-in)": wave}, steps)
+
+    with runner.LtspiceRawReader(path) as reader:
+        assert "stepped" in reader.flags
+        np.testing.assert_array_equal(reader.step_lengths(), [len(FREQ)] * 3)
+        np.testing.assert_array_equal(reader.trace(1), wave.ravel())
+
+    df = runner.data_from_raw(path)
+    expected = runner.frame_from_traces(runner._target_trace_from_rawread(path))
+    assert list(df.columns) == ["frequency_Hz", "mag_dB", "phase_deg", "step_index", "step_k"]
+    np.testing.assert_array_equal(df["step_index"], np.repeat([0, 1, 2], len(FREQ)))
+    np.testing.assert_allclose(df["step_k"], np.repeat([0.111, 0.5, 0.999], len(FREQ)))
+    np.testing.assert_allclose(df.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize("layout, dtype", [("real", np.float32), ("double", np.float64)])
+def test_real_layouts(runner, tmp_path, layout, dtype):
+    path = tmp_path / f"{layout}.raw"
+    wave = np.sin(2 * np.pi * 1e3 * TIME)[None, :] * np.array([[1.0], [0.5]])
+    write_raw(path, TIME, {"V(out)": wave, "V(in)": -wave}, [{"a": 1}, {"a": 2}], layout=layout)
+
+    with runner.LtspiceRawReader(path) as reader:
+        assert reader.trace(1).dtype == dtype
+        np.testing.assert_array_equal(reader.axis(), np.tile(TIME, 2))
+        np.testing.assert_array_equal(reader.trace(1), wave.ravel().astype(dtype))
+        np.testing.assert_array_equal(reader.trace(2), -wave.ravel().astype(dtype))
+        # 軸が先頭の値に戻る位置がステップの区切り
+        np.testing.assert_array_equal(reader.step_lengths(), [len(TIME)] * 2)
+
+
+def test_fastaccess_falls_back_to_rawread(runner, tmp_path):
+    path = tmp_path / "fastaccess.raw"
+    steps = [{"k": 0.2}, {"k": 0.4}]
+    wave = resonance(len(steps))
+    write_raw(path, FREQ, {"V(amp-in)": wave}, steps, fastaccess=True)
+
+    with pytest.raises(ValueError, match="FastAccess"):
+        runner.LtspiceRawReader(path)
+    assert runner._target_trace_from_native(path) is None
+
+    df = runner.data_from_raw(path)
+    np.testing.assert_allclose(df["mag_dB"], 20 * np.log10(np.abs(wave.ravel())))
+    np.testing.assert_allclose(df["step_k"], np.repeat([0.2, 0.4], len(FREQ)))
+
+
+def test_header_longer_than_one_chunk(runner, tmp_path):
+    path = tmp_path / "many_nodes.raw"
+    wave = resonance(1)
+    traces = {f"V(n{i:04d})": wave * (i + 1) for i in range(3000)}
+    traces["V(amp-in)"] = wave
+    write_raw(path, FREQ, traces)
+    header, offset = runner.LtspiceRawReader._read_header(path)
+    assert offset > runner.RAW_HEADER_CHUNK
+
+    # 読み込みの遅い RawRead に切り替わらず、メモリマップで読み込める
+    loaded = runner._target_trace_from_native(path)
+    assert loaded is not None
+    freq, target, lengths, steps, steps_info = loaded
+    np.testing.assert_array_equal(freq, FREQ)
+    np.testing.assert_array_equal(target, wave[0])
+
+
+def test_rejects_truncated_and_ascii_files(runner, tmp_path):
+    path = tmp_path / "truncated.raw"
+    write_raw(path, FREQ, {"V(amp-in)": resonance(1)})
+    path.write_bytes(path.read_bytes()[:-16])
+    with pytest.raises(ValueError, match="truncated"):
+        runner.LtspiceRawReader(path)
+
+    ascii_path = tmp_path / "ascii.raw"
+    ascii_path.write_text(
+        "Title: * ascii\nFlags: complex forward\nNo. Variables: 1\nNo. Points: 1\n"
+        "Variables:\n\t0\tfrequency\tfrequency\nValues:\n0\t10.0,0.0\n",
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="Not a binary RAW file"):
+        runner.LtspiceRawReader(ascii_path)
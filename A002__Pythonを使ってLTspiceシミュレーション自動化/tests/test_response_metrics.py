@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""共振の指標（response_metrics）を解析解のわかっているRLC回路の応答と比較するテスト。"""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+HALF_POWER_DB = 10 * np.log10(2.0)  # 帯域幅の解析解（電力が半分になる点）と同じ低下量
+FREQ = np.logspace(np.log10(20.0), np.log10(200e3), 2001)  # 20 Hz ～ 200 kHz（500点/decade）
+
+
+def bandpass_db(f0: float, q: float) -> np.ndarray:
+    """直列RLCの抵抗の電圧（バンドパス、ピーク 0 dB @ f0）[dB]。"""
+    return -10 * np.log10(1 + (q * (FREQ / f0 - f0 / FREQ)) ** 2)
+
+
+def lowpass_db(f0: float, q: float) -> np.ndarray:
+    """直列RLCのコンデンサの電圧（2次ローパス）[dB]。"""
+    r = FREQ / f0
+    return -10 * np.log10((1 - r * r) ** 2 + (r / q) ** 2)
+
+
+def half_power(f0: float, q: float) -> tuple[float, float]:
+    """バンドパスの -3 dB 点の解析解。"""
+    root = np.sqrt(1 + 1 / (4 * q * q))
+    return f0 * (root - 1 / (2 * q)), f0 * (root + 1 / (2 * q))
+
+
+def metrics(runner, *rows: np.ndarray) -> dict[str, np.ndarray]:
+    mag_db = np.vstack(rows)
+    return runner.response_metrics(np.broadcast_to(FREQ, mag_db.shape), mag_db, bandwidth_db=HALF_POWER_DB)
+
+
+@pytest.mark.parametrize("f0, q", [(2000.0, 5.0), (350.0, 0.8), (12e3, 20.0)])
+def test_bandpass_matches_analytic(runner, f0, q):
+    result = metrics(runner, bandpass_db(f0, q))
+    f_lo, f_hi = half_power(f0, q)
+
+    assert result["f0_Hz"][0] == pytest.approx(f0, rel=1e-3)
+    assert result["peak_dB"][0] == pytest.approx(0.0, abs=1e-3)
+    assert result["f_lo_Hz"][0] == pytest.approx(f_lo, rel=1e-3)
+    assert result["f_hi_Hz"][0] == pytest.approx(f_hi, rel=1e-3)
+    assert result["bandwidth_Hz"][0] == pytest.approx(f0 / q, rel=2e-3)
+    assert result["Q"][0] == pytest.approx(q, rel=2e-3)
+
+
+def test_lowpass_peak_and_rolloff(runner):
+    f0, q = 3000.0, 4.0
+    result = metrics(runner, lowpass_db(f0, q))
+
+    # 2次ローパスのピークは f0·√(1 - 1/2Q²)、高さは Q/√(1 - 1/4Q²)
+    assert result["f0_Hz"][0] == pytest.approx(f0 * np.sqrt(1 - 1 / (2 * q * q)), rel=1e-3)
+    assert result["peak_dB"][0] == pytest.approx(20 * np.log10(q / np.sqrt(1 - 1 / (4 * q * q))), abs=1e-3)
+    assert result["peak_rel_dB"][0] == pytest.approx(result["peak_dB"][0], abs=1e-3)  # 低域は 0 dB
+    assert result["rolloff_dB_per_oct"][0] == pytest.approx(-12.0, abs=0.2)
+
+
+def test_steps_without_peak_or_crossing(runner):
+    resonant = bandpass_db(2000.0, 5.0)
+    no_peak = -10 * np.log10(1 + (FREQ / 1000.0) ** 2)  # 1次ローパス（単調減少でピーク無し）
+    no_upper = bandpass_db(150e3, 1.0)  # 上側の -3 dB 点（約243 kHz）が測定範囲外
+    result = metrics(runner, resonant, no_peak, no_upper)
+
+    # ピークが無い場合は最大点（測定範囲の下端）をそのまま使い、ピークより下の交点は無い
+    assert result["f0_Hz"][1] == pytest.approx(FREQ[0])
+    assert result["peak_dB"][1] == pytest.approx(no_peak[0])
+    assert np.isnan(result["f_lo_Hz"][1])
+    assert result["f_hi_Hz"][1] == pytest.approx(1000.0, rel=1e-3)
+    assert np.isnan(result["bandwidth_Hz"][1]) and np.isnan(result["Q"][1])
+
+    # 上側の交点が無い場合は下側の交点だけを求め、帯域幅とQは NaN
+    assert result["f0_Hz"][2] == pytest.approx(150e3, rel=1e-3)
+    assert result["f_lo_Hz"][2] == pytest.approx(half_power(150e3, 1.0)[0], rel=1e-3)
+    assert np.isnan(result["f_hi_Hz"][2])
+    assert np.isnan(result["bandwidth_Hz"][2]) and np.isnan(result["Q"][2])
+
+    # 他のステップの結果は、単独で計算した場合と同じ
+    alone = metrics(runner, resonant)
+    for key, values in alone.items():
+        assert result[key][0] == pytest.approx(values[0], nan_ok=True)
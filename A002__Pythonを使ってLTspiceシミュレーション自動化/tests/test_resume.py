@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""途中で停止した実行を --resume で再開するテスト。"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+RUN_ARGS = ("--jobs", "1", "--no-metrics", "--no-merge")
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="呼び出し元の強制終了に SIGTERM を使う")
+
+
+def simulated(log: Path) -> list[str]:
+    """代替シミュレータが呼び出された回路ファイル名のリストを返す。"""
+    return log.read_text(encoding="utf-8").splitlines() if log.exists() else []
+
+
+def done_cases(outdir: Path) -> set[str]:
+    """完了マーカーのある結果ファイル名を返す。"""
+    return {path.name[:-len(".done")] for path in outdir.glob(".done/*.done")}
+
+
+@pytest.mark.parametrize("pipeline", ["--pipeline", "--no-pipeline"])
+def test_resume_after_interrupted_run(make_workspace, tmp_path, pipeline):
+    clean = make_workspace("clean")
+    clean.run(*RUN_ARGS, pipeline)
+    (clean_dir,) = clean.outdirs()
+    expected = {path.name: path.read_bytes() for path in clean_dir.glob("*.csv")}
+    assert len(expected) == 6
+
+    # 4回目のシミュレーションの途中でスクリプトが停止する
+    workspace = make_workspace("interrupted")
+    first_log = tmp_path / "first.log"
+    result = workspace.run(
+        *RUN_ARGS, pipeline,
+        env={"FAKE_LTSPICE_LOG": str(first_log), "FAKE_LTSPICE_KILL_PARENT_AT": "4"}, check=False,
+    )
+    assert result.returncode != 0
+    assert len(simulated(first_log)) == 4
+    (outdir,) = workspace.outdirs()
+    finished = done_cases(outdir)
+    if pipeline == "--no-pipeline":
+        assert len(finished) == 3
+    else:
+        # パイプライン実行では、書き出しがシミュレーションに遅れている分は未完了になる
+        assert len(finished) <= 3
+    # 完了マーカーの無いケースの結果ファイルは残っていても再実行される
+    assert finished <= {path.name for path in outdir.glob("*.csv")}
+
+    second_log = tmp_path / "second.log"
+    result = workspace.run(*RUN_ARGS, pipeline, "--resume", str(outdir), env={"FAKE_LTSPICE_LOG": str(second_log)})
+    assert f"resume: {len(finished)} done, 0 stale, {6 - len(finished)} missing" in result.stdout
+    assert result.stdout.count("skipped (done): ") == len(finished)
+    # 完了済みのケースはシミュレーションし直さない
+    assert len(simulated(second_log)) == 6 - len(finished)
+
+    assert workspace.outdirs() == [outdir]
+    assert {path.name: path.read_bytes() for path in outdir.glob("*.csv")} == expected
+    assert done_cases(outdir) == set(expected)
+    assert not list(outdir.glob(".*.tmp"))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""シナリオファイル（ケース表）の展開のテスト。"""
+from __future__ import annotations
+
+import pytest
+
+# 変更前のスクリプトに直接書かれていたケース表
+BASELINE_CASES = [
+    ("Neck", {"V2": "5", "V3": "0", "V4": "0", "V5": "0", "V6": "0"}),
+    ("Middle", {"V2": "0", "V3": "5", "V4": "0", "V5": "0", "V6": "0"}),
+    ("Bridge", {"V2": "0", "V3": "0", "V4": "5", "V5": "0", "V6": "0"}),
+    ("Neck-Middle", {"V2": "5", "V3": "5", "V4": "0", "V5": "5", "V6": "0"}),
+    ("Middle-Bridge", {"V2": "0", "V3": "5", "V4": "5", "V5": "0", "V6": "0"}),
+    ("Bridge-Neck", {"V2": "5", "V3": "0", "V4": "5", "V5": "0", "V6": "0"}),
+    ("Hum", {"V2": "0", "V3": "0", "V4": "5", "V5": "5", "V6": "5"}),
+    ("Neck-Hum", {"V2": "5", "V3": "0", "V4": "5", "V5": "0", "V6": "5"}),
+    ("Middle-Hum", {"V2": "0", "V3": "5", "V4": "5", "V5": "0", "V6": "5"}),
+]
+
+SWITCHES = {ref: {"label": label} for ref, label in [("V2", "Neck"), ("V3", "Middle"), ("V4", "Bridge")]}
+
+
+def test_default_scenario_matches_baseline_cases(runner):
+    scenario = runner.load_scenario(runner.SCENARIO_PATH)
+    assert scenario.cases == BASELINE_CASES
+    assert scenario.variants == [("Vol", None), ("Tone", runner.tone_param_transform)]
+
+
+def test_product_expansion_with_filters(runner):
+    scenario = runner.expand_scenario({
+        "switches": SWITCHES,
+        "presets": {"Full": ["V2", "V3", "V4"]},
+        "matrix": {"expand": "product", "min_on": 1, "max_on": 2, "exclude": [["V2", "V4"]]},
+    })
+    names = [name for name, _ in scenario.cases]
+    assert names == ["Bridge", "Middle", "Middle-Bridge", "Neck", "Neck-Middle"]
+    assert dict(scenario.cases)["Middle-Bridge"] == {"V2": "0", "V3": "5", "V4": "5"}
+
+
+def test_both_keeps_preset_names_without_duplicates(runner):
+    scenario = runner.expand_scenario({
+        "switches": SWITCHES,
+        "presets": {"Rhythm": ["V2", "V3"]},
+        "matrix": {"expand": "both", "require_any": ["V2"]},
+    })
+    names = [name for name, _ in scenario.cases]
+    assert names[0] == "Rhythm"
+    assert sorted(names[1:]) == ["Neck", "Neck-Bridge", "Neck-Middle-Bridge"]
+
+
+def test_params_expand_into_variants(runner):
+    scenario = runner.expand_scenario({
+        "switches": SWITCHES,
+        "presets": {"Neck": ["V2"]},
+        "modes": {"Vol": {"transform": "none"}, "Tone": {"transform": "tone", "params": {"R_T": "1k"}}},
+        "params": {"C_C": ["470p", "1n"]},
+    })
+    assert [suffix for suffix, _ in scenario.variants] == [
+        "Vol_C_C-470p", "Vol_C_C-1n", "Tone_C_C-470p", "Tone_C_C-1n",
+    ]
+    # モードの params と掃引パラメータの両方で .param の値を上書きする
+    _, tone_1n = scenario.variants[3]
+    assert tone_1n.params == (("R_T", "1k"), ("C_C", "1n"))
+    assert tone_1n("* test\n.param C_C=650p R_T=10k\n") == "* test\n.param C_C=1n R_T=1k\n"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({}, "no switch sources"),
+    ({"switches": SWITCHES, "presets": {"A": ["V9"]}}, "Unknown switch"),
+    ({"switches": SWITCHES, "presets": {"A": ["V2"]}, "matrix": {"expand": "all"}}, "matrix.expand"),
+    ({"switches": SWITCHES, "presets": {"A": ["V2"]}, "modes": {"X": {"transform": "bass"}}}, "Unknown transform"),
+    ({"switches": SWITCHES, "presets": {"Neck": ["V3"]}, "matrix": {"expand": "both"}}, "Duplicate case names"),
+])
+def test_invalid_scenarios(runner, spec, message):
+    with pytest.raises(ValueError, match=message):
+        runner.expand_scenario(spec)
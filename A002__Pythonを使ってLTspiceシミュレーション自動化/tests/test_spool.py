@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""ジョブキュー（分散実行）のテスト。"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+SWITCHES = {"V2": "5", "V3": "0", "V4": "0", "V5": "0", "V6": "0"}
+
+
+def wait_for(condition, timeout: float = 30.0) -> None:
+    """condition() がTrueになるまで待つ。"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def make_job(runner, tmp_path):
+    """内蔵ソルバーで実行する Neck_Vol のケース。"""
+    job = runner.CaseJob(
+        name="Neck",
+        suffix="Vol",
+        values=SWITCHES,
+        text_transform=None,
+        out_path=tmp_path / "out" / "Neck_Vol.csv",
+        work_dir=tmp_path / "out",
+        input_path=runner.INPUT_PATH,
+        executable=runner.NATIVE_SIMULATOR,
+        output_format="csv",
+        input_hash="test",
+    )
+    job.work_dir.mkdir()
+    return job
+
+
+def claim_by_ghost(runner, spool, worker: str):
+    """前回の実行で取得したまま停止したワーカー（生存の知らせが無い）のジョブを作成する。"""
+    template = runner.load_netlist_template(runner.INPUT_PATH)
+    netlist = template.render(SWITCHES)
+    job_id = runner.spool_job_id(template.kind, netlist, "csv")
+    ghost = runner.spool_dirs(spool)["claimed"] / f"{job_id}__{worker}.json"
+    runner.write_json_atomic(ghost, {
+        "id": job_id, "case": "Neck_Vol", "kind": template.kind, "output_name": template.output_name,
+        "netlist": netlist, "format": "csv", "timeout": None, "attempt": 1,
+    })
+    return job_id, ghost
+
+
+def fast_spool(runner, monkeypatch) -> None:
+    monkeypatch.setattr(runner, "SPOOL_HEARTBEAT_S", 0.05)
+    monkeypatch.setattr(runner, "SPOOL_STALE_S", 0.5)
+    monkeypatch.setattr(runner, "SPOOL_POLL_S", 0.05)
+
+
+def test_stale_claim_is_requeued(runner, tmp_path, monkeypatch):
+    fast_spool(runner, monkeypatch)
+    spool = tmp_path / "spool"
+    job = make_job(runner, tmp_path)
+    dirs = runner.spool_dirs(spool)
+    job_id, ghost = claim_by_ghost(runner, spool, "ghost")
+
+    errors = []
+
+    def collect() -> None:
+        try:
+            runner.run_jobs_spooled([job], spool)
+        except Exception as exc:
+            errors.append(exc)
+
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+
+    # 取得済みのジョブは登録し直さず、ワーカーの知らせが途絶えてから未実行に戻す
+    requeued = dirs["jobs"] / f"{job_id}.json"
+    wait_for(requeued.exists)
+    assert not ghost.exists()
+    assert json.loads(requeued.read_text(encoding="utf-8"))["attempt"] == 2
+
+    runner.run_spool_worker(spool, runner.NATIVE_SIMULATOR, idle_exit=0.2)
+    collector.join(timeout=30)
+    assert not collector.is_alive()
+    assert errors == []
+    assert runner.case_status(job.out_path, job.input_hash) == "done"
+    assert [path for name in ("jobs", "claimed", "results", "failed") for path in dirs[name].iterdir()] == []
+
+
+def test_gives_up_when_no_worker_is_running(runner, tmp_path, monkeypatch):
+    fast_spool(runner, monkeypatch)
+    spool = tmp_path / "spool"
+    job = make_job(runner, tmp_path)
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match=r"1 of 1 spooled jobs failed\.\nNeck_Vol: no worker is running"):
+        runner.run_jobs_spooled([job], spool, idle_timeout=0.3)
+    assert time.monotonic() - start < 10
+    # ジョブはキューに残し、後から起動したワーカーで実行できる
+    assert len(list(runner.spool_dirs(spool)["jobs"].iterdir())) == 1
+
+
+def test_worker_heartbeat_keeps_collector_waiting(runner, tmp_path, monkeypatch):
+    fast_spool(runner, monkeypatch)
+    spool = tmp_path / "spool"
+    job = make_job(runner, tmp_path)
+    errors = []
+
+    def collect() -> None:
+        try:
+            runner.run_jobs_spooled([job], spool, idle_timeout=0.3)
+        except Exception as exc:
+            errors.append(exc)
+
+    # 生存の知らせを更新しているワーカーがいる間は、idle_timeout を過ぎても待ち続ける
+    stop = threading.Event()
+    beat = runner.spool_dirs(spool)["workers"] / "idle.json"
+
+    def idle_worker() -> None:
+        count = 0
+        while not stop.is_set():
+            count += 1
+            runner.write_json_atomic(beat, {"beat": count})
+            time.sleep(0.05)
+
+    beating = threading.Thread(target=idle_worker, daemon=True)
+    beating.start()
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+    time.sleep(1.0)
+    assert collector.is_alive()
+    stop.set()
+    beating.join()
+    beat.unlink()
+
+    runner.run_spool_worker(spool, runner.NATIVE_SIMULATOR, idle_exit=0.2)
+    collector.join(timeout=30)
+    assert not collector.is_alive()
+    assert errors == []
+    assert runner.case_status(job.out_path, job.input_hash) == "done"
+
+
+def test_several_stale_claims_retry_once(runner, tmp_path, monkeypatch):
+    fast_spool(runner, monkeypatch)
+    spool = tmp_path / "spool"
+    job = make_job(runner, tmp_path)
+    claim_by_ghost(runner, spool, "ghost1")
+    claim_by_ghost(runner, spool, "ghost2")
+
+    # 1回目で上限に達してジョブが待ち行列から外れた後に、2つ目の停止したワーカーで再試行しない
+    with pytest.raises(RuntimeError, match=r"1 of 1 spooled jobs failed\.\nNeck_Vol: worker ghost\d stopped"):
+        runner.run_jobs_spooled([job], spool, max_attempts=1, idle_timeout=0)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""処理段階ごとのCPU時間の計測（子プロセスのCPU時間の割り当て）のテスト。"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+BUSY_SECONDS = 0.5  # 子プロセスがCPUを使う時間 [秒]
+BUSY_CHILD = [sys.executable, "-c", f"import time\nend = time.process_time() + {BUSY_SECONDS}\nwhile time.process_time() < end: pass"]
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="Windowsでは子プロセスのCPU時間を取得できない")
+
+
+def stage_record(runner, stage: str):
+    (record,) = [record for record in runner.drain_stage_records() if record.stage == stage]
+    return record
+
+
+def test_child_of_another_thread_is_not_counted(runner):
+    runner.drain_stage_records()
+    child = threading.Thread(target=subprocess.run, args=(BUSY_CHILD,))
+    with runner.measure_stage("data_from_raw"):
+        child.start()
+        child.join()
+
+    assert stage_record(runner, "data_from_raw").cpu_s < BUSY_SECONDS / 2
+
+
+def test_simulation_stage_includes_its_child(runner, tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "LTSPICE_INVOCATION_PATH", tmp_path / "invocation.json")
+    executable = tmp_path / "busy_ltspice"
+    executable.write_text(f'#!/bin/sh\nexec "{sys.executable}" -c "{BUSY_CHILD[2]}"\n', encoding="utf-8")
+    executable.chmod(0o755)
+    netlist = tmp_path / "circuit.asc"
+    netlist.write_text("Version 4\n", encoding="utf-8")
+
+    runner.drain_stage_records()
+    runner.run_ltspice_batch(str(executable), netlist)
+
+    assert stage_record(runner, "run_ltspice_batch").cpu_s >= BUSY_SECONDS * 0.8
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""--engine step（全ケースを .step で1回に実行）のテスト。"""
+from __future__ import annotations
+
+import pytest
+
+# トーンモードの回路ファイルだけが有効な .step param j を持つ
+FAIL_TONE = {"FAKE_LTSPICE_FAIL_PATTERN": r"!\.step param j "}
+
+
+def test_step_engine_matches_case_engine(make_workspace):
+    by_case = make_workspace("case")
+    by_step = make_workspace("step")
+    by_case.run("--no-metrics", "--no-merge")
+    by_step.run("--engine", "step", "--jobs", "2", "--no-metrics", "--no-merge")
+
+    (case_dir,) = by_case.outdirs()
+    (step_dir,) = by_step.outdirs()
+    expected = {path.name: path.read_bytes() for path in case_dir.glob("*.csv")}
+    assert {path.name: path.read_bytes() for path in step_dir.glob("*.csv")} == expected
+    assert not (step_dir / "_work").exists()
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_failed_stepped_run_keeps_other_results(workspace, jobs):
+    result = workspace.run("--engine", "step", "--jobs", jobs, "--no-metrics", "--no-merge",
+                           env=FAIL_TONE, check=False)
+    assert result.returncode != 0
+    assert "1 of 2 stepped runs failed" in result.stderr
+    assert "failed: step:Tone" in result.stdout
+
+    # 成功したバリエーションの結果と完了マーカーは残る
+    (outdir,) = workspace.outdirs()
+    saved = sorted(path.name for path in outdir.glob("*.csv"))
+    assert saved == ["AM-Pro__Hum_Vol.csv", "AM-Pro__Neck-Middle_Vol.csv", "AM-Pro__Neck_Vol.csv"]
+    assert sorted(path.name for path in (outdir / ".done").iterdir()) == [f"{name}.done" for name in saved]
+    if jobs != "1":
+        assert (outdir / "_work" / "Tone").is_dir()
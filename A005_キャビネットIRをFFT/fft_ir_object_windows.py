@@ -1,19 +1,267 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.io.wavfile as wavfile
+from scipy.fft import next_fast_len
+from scipy.signal import firwin, resample_poly
 import os
+import io
+import math
+import hashlib
+import zipfile
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from matplotlib.ticker import EngFormatter, MultipleLocator
 
 
+class SpectrumCache:  # IRごとのスペクトルを、ファイルの内容とFFTの条件をキーにしてディスクに保存するキャッシュ
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes  # 超えた分は最終アクセスが古いものから削除（LRU）
+
+    @staticmethod
+    def make_key(file_hash, rate, target_rate, head_ms, min_freq, max_freq):  # ファイルの内容と解析の条件が同じなら同じキー（他のIRには依存しない）
+        text = f'{file_hash}|{rate}|{target_rate}|{head_ms}|{min_freq}|{max_freq}'
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.npz')
+
+    def get(self, key):  # 保存した解析結果（名前→配列の辞書）を返す（無ければNone）
+        path = self._path(key)
+        try:
+            with np.load(path) as cached:
+                entry = {name: cached[name] for name in cached.files}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):  # 壊れたエントリ（書き込み中に停止した場合など）は削除して計算し直す
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)  # 最終アクセス時刻を更新（LRU用）
+        return entry
+
+    def put(self, key, entry):  # 解析結果（名前→配列の辞書）を保存
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'  # 書きかけのファイルを読まないよう一時ファイルから置き換える
+        np.savez(tmp, **entry)
+        os.replace(tmp, path)
+
+    def evict(self):  # サイズ上限を超えた分を最終アクセスが古い順に削除
+        entries = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.npz'):
+                    path = os.path.join(folder, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
 class ImpulseResponsePlotter:
-    def __init__(self, original_data, adjusted_data, rates, time_axes, file_names):
-        self.original_data = original_data
-        self.adjusted_data = adjusted_data
-        self.rates = rates
-        self.time_axes = time_axes
-        self.file_names = file_names
+    # グラフにプロットする周波数範囲（この範囲内の最大値で正規化する）
+    min_freq = 20  # 最小周波数
+    max_freq = 20000  # 最大周波数
+    # 位置合わせと波形の表示に使う先頭の長さ[ms]。波形は先頭のこの長さだけを保持し（それより後は破棄する）、
+    # ピークがこの範囲より後にあるIRは位置合わせできないためエラーにする（長いプリディレイのIRは値を大きくする）
+    head_ms = 50
+    chunk_size = 16  # まとめてFFTするIRの数の上限（同時にメモリに置く全体の波形の数もこれ以下になる）
+
+    def __init__(self, cache=None, common_rate=None, chunk_size=None):
+        self.cache = cache  # SpectrumCache（Noneの場合は毎回FFTを計算）
+        self.common_rate = common_rate  # 全IRをこのサンプルレートに揃える（Noneにすると元のレートのまま）
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self.file_names = []
+        self.rates = []
+        self.original_data = []  # 各IRの先頭 head_ms 分だけの波形（全体の波形はスペクトルを求めたら破棄する）
+        self.adjusted_data = []  # ピーク位置を合わせた先頭の波形（align()で作成）
+        self.nffts = []  # 各IRのFFT長（IRごとに自分の長さから決める）
+        self.magnitude_db = []  # 正規化したdB値（IRごとに周波数ビン数が異なる）
+        self.peak_indices = []  # 周波数範囲内で最大のビン番号
+        self.max_in_range = []  # 正規化に使った周波数範囲内の最大値
+        self.peak_samples = []  # 各IRの時間波形のピーク位置（サンプル番号）
+        self.head_spectra = []  # 先頭の波形のrfft（位置合わせの相互相関とずらしに使う）
+        self._pending = []  # キャッシュに無く、まだFFTしていないIR（番号, 元のレートの波形, 元のレート, キャッシュのキー）
+
+    def add(self, file_name, rate, data, file_hash=None):  # IRを1つ追加（キャッシュに無いIRは chunk_size 個ずつまとめて解析）
+        target_rate = self.common_rate if self.common_rate is not None else rate
+        key = None
+        entry = None
+        if self.cache is not None and file_hash is not None:
+            key = self.cache.make_key(file_hash, rate, target_rate, self.head_ms, self.min_freq, self.max_freq)
+            entry = self.cache.get(key)
+
+        index = len(self.file_names)
+        self.file_names.append(file_name)
+        self.rates.append(target_rate)
+        for values in (self.original_data, self.nffts, self.magnitude_db, self.peak_indices,
+                       self.max_in_range, self.peak_samples, self.head_spectra):
+            values.append(None)  # 解析の結果は _store() で設定する（追加した順に並ぶ）
+        if entry is not None:
+            self._store(index, entry)
+            return
+        # キャッシュに無いIRだけを、chunk_size 個たまったらまとめてリサンプリング・FFTする
+        self._pending.append((index, data, rate, key))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):  # たまっているIRを、FFT長とサンプルレートが同じものごとに1回のrfftでまとめて解析
+        pending, self._pending = self._pending, []
+        # 元のレートと長さが同じIRは1つの配列に並べて1回でリサンプリングする
+        # （レートの異なるIRも揃えた後は同じ長さになり、下で同じ配列・同じ周波数のマスクにまとめられる）
+        sources = {}
+        for index, data, rate, key in pending:
+            sources.setdefault((rate, self.rates[index], len(data)), []).append((index, data, key))
+        resampled = []
+        for (rate, target_rate, _), items in sources.items():
+            stacked = np.stack([data for _, data, _ in items])
+            if rate != target_rate:
+                stacked = resample_impulse_response(stacked, rate, target_rate)
+            resampled.extend((index, row, key) for (index, _, key), row in zip(items, stacked))
+
+        for index, data, _ in resampled:
+            # 先頭 head_ms より後のピークは残す波形に含まれず、位置合わせでも見つけられないため黙って切り捨てない
+            head_length = round(self.head_ms * self.rates[index] / 1000)
+            peak = int(np.argmax(data))
+            if peak >= head_length:
+                raise ValueError(
+                    f'{self.file_names[index]}: peak at {peak * 1000 / self.rates[index]:.1f} ms is outside '
+                    f'the first {self.head_ms} ms kept for alignment (increase head_ms)'
+                )
+
+        groups = {}
+        for item in resampled:
+            # FFT長はIRごとに自分の長さから決める（同じ長さのIRは同じFFT長になり、1つの配列にまとめられる）
+            # 他のIRに合わせてゼロ詰めしないため、結果は一緒に解析したIRによらない（キャッシュのキーも自分の条件だけ）
+            nfft = next_fast_len(len(item[1]), real=True)  # 素因数が2・3・5だけの長さ（FFTが速い長さ）
+            groups.setdefault((self.rates[item[0]], nfft), []).append(item)
+        for (rate, nfft), items in groups.items():
+            entries = self._analyze([data for _, data, _ in items], rate, nfft)
+            for (index, _, key), entry in zip(items, entries):
+                if key is not None:
+                    self.cache.put(key, entry)
+                self._store(index, entry)
+
+    def _store(self, index, entry):  # 1つのIRの解析結果（キャッシュと同じ辞書）を index 番目に設定
+        self.original_data[index] = entry['head']
+        self.nffts[index] = int(entry['nfft'])
+        self.magnitude_db[index] = entry['magnitude_db']
+        self.peak_indices[index] = int(entry['peak_index'])
+        self.max_in_range[index] = float(entry['max_in_range'])
+        self.peak_samples[index] = int(np.argmax(entry['head']))
+        self.head_spectra[index] = entry['head_spectrum']
+
+    def _head_nfft(self, rate):  # 先頭の波形のFFT長（2倍以上にゼロ詰めし、ずらしても先頭が末尾に回り込まないようにする）
+        return next_fast_len(2 * round(self.head_ms * rate / 1000), real=True)
+
+    def _analyze(self, datas, rate, nfft):  # 同じレート・FFT長のIRをまとめてrfftし、範囲内の最大値で正規化してデシベル変換
+        batch = np.zeros((len(datas), nfft), dtype=np.float32)  # IR数 × FFT長（末尾はゼロ詰め）
+        for row, data in zip(batch, datas):
+            row[:len(data)] = data
+        magnitude = np.abs(np.fft.rfft(batch, axis=1))  # 実数データなので正の周波数だけを計算
+        freqs = np.arange(magnitude.shape[1]) * (rate / nfft)  # 周波数軸と範囲のマスクは全IRで共有
+        in_range = np.where((freqs >= self.min_freq) & (freqs <= self.max_freq), magnitude, 0)
+        rows = np.arange(len(datas))
+        peak_index = np.argmax(in_range, axis=1)
+        max_in_range = in_range[rows, peak_index]
+        with np.errstate(divide='ignore'):  # 振幅0のビンは -inf dB
+            magnitude_db = (20 * np.log10(magnitude / max_in_range[:, None])).astype(np.float32)
+        head_length = min(round(self.head_ms * rate / 1000), nfft)
+        head_spectrum = np.fft.rfft(batch[:, :head_length], n=self._head_nfft(rate), axis=1).astype(np.complex64)
+        return [
+            {
+                'nfft': nfft,
+                'head': batch[i, :min(len(data), head_length)].copy(),  # 全体の波形（batch）を残さないようコピー
+                'magnitude_db': magnitude_db[i],
+                'peak_index': int(peak_index[i]),
+                'max_in_range': float(max_in_range[i]),
+                'head_spectrum': head_spectrum[i],
+            }
+            for i, data in enumerate(datas)
+        ]
+
+    def align(self):  # ピーク位置を最も早いIRに合わせ、サンプル未満のずれまで補正したadjusted_dataを作成
+        self.flush()
+        rates = np.asarray(self.rates, dtype=float)
+        peak_samples = np.asarray(self.peak_samples)
+        reference = np.argmin(peak_samples / rates)  # 最も早くピークが来るIRを基準にする
+
+        if np.all(rates == rates[0]):
+            # add()で求めた先頭のスペクトルを使い、基準のIRとの相互相関を全IRまとめて計算して最大となるずれを探す
+            # 相関は先頭 head_ms の波形だけから求めるため、ずれはピーク位置の差がとり得る範囲（±最も遅いピーク）より
+            # 1サンプル広い範囲で探す。ピークは先頭の中にあり、先頭の波形は2倍以上にゼロ詰めしているので巡回は起きない
+            nfft = self._head_nfft(self.rates[0])
+            spectrum = np.array(self.head_spectra, dtype=complex)
+            cross = spectrum * np.conj(spectrum[reference])
+            correlation = np.fft.irfft(cross, n=nfft, axis=1)
+            max_lag = int(peak_samples.max())
+            lags = np.arange(-max_lag - 1, max_lag + 2)
+            window = correlation[:, lags % nfft]
+            # 端で最大になった場合は、本当のずれがピーク位置の差を超えて範囲の外にあるため、端の値で黙って合わせない
+            edge = np.flatnonzero(np.isin(np.argmax(window, axis=1), (0, len(lags) - 1)))
+            if edge.size:
+                raise ValueError(
+                    f'{self.file_names[edge[0]]}: the best alignment lies outside ±{max_lag * 1000 / rates[0]:.2f} ms '
+                    f'(the peak range within the first {self.head_ms} ms); increase head_ms or check the IR'
+                )
+            shifts = self._refine_peak(window) + lags[0]
+            # 放物線近似の誤差を、相互スペクトルから直接求めた微分でニュートン法により詰める
+            omega = 2 * np.pi * np.arange(cross.shape[1]) / nfft
+            for _ in range(3):
+                rotated = cross * np.exp(1j * omega * shifts[:, None])
+                slope = -(rotated.imag * omega).sum(axis=1)
+                curvature = -(rotated.real * omega ** 2).sum(axis=1)
+                step = np.where(curvature < 0, slope / np.where(curvature < 0, curvature, 1), 0.0)
+                shifts = shifts - np.clip(step, -0.5, 0.5)
+            shifted = self._shift(spectrum, shifts, nfft)
+        else:
+            # サンプルレートが異なるIRは相互相関を取れないため、時間波形のピーク位置を時間で比べる
+            peaks = np.array([
+                self._refine_peak(data[None, :])[0] / rate for data, rate in zip(self.original_data, rates)
+            ])
+            shifts = (peaks - peaks.min()) * rates
+            shifted = [
+                self._shift(spectrum[None, :], shift, self._head_nfft(rate))[0]
+                for spectrum, shift, rate in zip(self.head_spectra, shifts, self.rates)
+            ]
+        # ずらした分だけ末尾がゼロ詰めの部分になるため切り落とす
+        self.adjusted_data = [
+            shifted[i][:len(data) - math.ceil(max(shift, 0))].astype(np.float32)
+            for i, (data, shift) in enumerate(zip(self.original_data, shifts))
+        ]
+
+    @staticmethod
+    def _shift(spectrum, shifts, nfft):  # 周波数領域で直線位相を掛けてずらす（np.rollと違い、サンプル未満のずれも補正できる）
+        bins = np.arange(spectrum.shape[1])
+        phase = np.exp(2j * np.pi * bins * np.reshape(shifts, (-1, 1)) / nfft)
+        return np.fft.irfft(spectrum * phase, n=nfft, axis=1)
+
+    @staticmethod
+    def _refine_peak(values):  # 各行の最大点を、前後の点を通る放物線の頂点でサンプル未満まで求める
+        rows = np.arange(len(values))
+        peak = np.argmax(values, axis=1)
+        inner = (peak > 0) & (peak < values.shape[1] - 1)
+        left = values[rows, np.where(inner, peak - 1, peak)]
+        center = values[rows, peak]
+        right = values[rows, np.where(inner, peak + 1, peak)]
+        curvature = left - 2 * center + right
+        with np.errstate(divide='ignore', invalid='ignore'):
+            offset = np.where(inner & (curvature < 0), 0.5 * (left - right) / curvature, 0.0)
+        return peak + offset
 
     def plot(self, mode='original'):  # modeを追加して波形の種類を選択
+        self.flush()
+        if mode == 'adjusted' and not self.adjusted_data:  # 位置合わせは 'adjusted' を描画する場合だけ行う
+            self.align()
         fig, axs = plt.subplots(2, 1, figsize=(15, 8))
         self._plot_waveform(axs[0], mode)
         self._plot_fft(axs[1])
@@ -41,14 +289,13 @@ class ImpulseResponsePlotter:
         ax.grid(True, which='major', linestyle='-')  # メジャーグリッド線
         ax.grid(True, which='minor', linestyle=':')  # マイナーグリッド線
         for i, data in enumerate(data_set):  # 選択されたデータのプロット
-            ax.plot(self.time_axes[i], data, label=self.file_names[i])
+            time_axis = np.arange(len(data)) * (1000 / self.rates[i])  # 時間軸[ms]はサンプルレートから作成
+            ax.plot(time_axis, data, label=self.file_names[i])
         ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left', fontsize='small')  # 凡例の設定
 
     def _plot_fft(self, ax): # インパルス応答のFFTプロット
-
-        # グラフにプロットする周波数範囲
-        min_freq = 20  # 最小周波数
-        max_freq = 20000  # 最大周波数
+        min_freq = self.min_freq
+        max_freq = self.max_freq
 
         ax.set_title('FFT of Impulse Responses')  # タイトル
         ax.set_xlabel('Frequency (Hz)')  # x軸ラベル
@@ -61,66 +308,67 @@ class ImpulseResponsePlotter:
         formatter = EngFormatter(unit='', sep='')  # 工学形式のフォーマッタ
         ax.xaxis.set_major_formatter(formatter)  # x軸フォーマットの設定
     
-        # FFTを実行しグラフにプロット
-        for i, data in enumerate(self.original_data):
-            N = len(data)
-            fft_result = np.fft.fft(data)
-            freqs = np.fft.fftfreq(N, 1 / self.rates[i])[:N // 2]
-            fft_magnitude = np.abs(fft_result)[:N // 2] # 絶対値を取得
-        
-            # 指定周波数範囲内のインデックスを取得
-            valid_indices = np.logical_and(freqs >= min_freq, freqs <= max_freq)
-        
-            max_in_range = np.max(fft_magnitude[valid_indices])  # 周波数範囲内の最大値で正規化
-            fft_magnitude_db = 20 * np.log10(fft_magnitude / max_in_range)  # デシベル変換
-        
-            ax.plot(freqs, fft_magnitude_db, label=self.file_names[i])  # データのプロット
+        # add()で求めたスペクトルをプロット（周波数軸はIRごとのサンプルレートとFFT長から作成）
+        for i, magnitude_db in enumerate(self.magnitude_db):
+            freqs = np.arange(len(magnitude_db)) * (self.rates[i] / self.nffts[i])
+            ax.plot(freqs, magnitude_db, label=self.file_names[i])  # データのプロット
         ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left', fontsize='small')  # 凡例の設定
 
-# データを保持するリスト
-original_data = []
-adjusted_data = []
-rates = []
-time_axes = []
-peak_positions = []
-file_name_x = []
-
-# スクリプトファイルの場所を基準にした相対パス
-script_dir = os.path.dirname(os.path.abspath(__file__))
-folder_path = os.path.join(script_dir, "IR")
-
-# フォルダ内のすべてのWAVファイルを処理
-for file_name in os.listdir(folder_path):
-    if file_name.endswith('.wav'):
-        file_path = os.path.join(folder_path, file_name)
-        rate, data = wavfile.read(file_path)
-        
-        if data.ndim > 1:  #ステレオの場合、片方のチャンネルを取得
-            data = data[:, 0]
-        
-        data = data / np.max(np.abs(data))  # データの規格化
-        time_axis = np.arange(len(data)) / rate * 1000  #時間軸をmsに
-        
-        #ピーク位置を合わせるためのデータを取得
-        peak_index = np.argmax(data)
-        peak_time = time_axis[peak_index]
-        
-        original_data.append(data)
-        rates.append(rate)
-        time_axes.append(time_axis)
-        peak_positions.append(peak_time)
-        file_name_x.append(file_name)
-
-# 基準となる最速のピーク位置を取得
-min_peak_time = min(peak_positions)
-
-# 時間軸を調整
-for i, data in enumerate(original_data):
-    shift_ms = peak_positions[i] - min_peak_time
-    shift_samples = int(shift_ms * rates[i] / 1000)
-    adjusted = np.roll(data, -shift_samples)
-    adjusted_data.append(adjusted)
-
-# 描画
-plotter = ImpulseResponsePlotter(original_data, adjusted_data, rates, time_axes, file_name_x)
-plotter.plot(mode='original')  # 'original' または 'adjusted' を指定
\ No newline at end of file
+def read_impulse_response(file_path):  # WAVファイルを読み込み、規格化したモノラルのfloat32配列と内容のハッシュを返す
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    file_hash = hashlib.sha256(raw).hexdigest()  # スペクトルのキャッシュのキーに使用
+    rate, data = wavfile.read(io.BytesIO(raw))
+    if data.ndim > 1:  #ステレオの場合、片方のチャンネルを取得
+        data = data[:, 0]
+    data = data.astype(np.float32)
+    data /= np.max(np.abs(data))  # データの規格化
+    return rate, data, file_hash
+
+
+def load_impulse_responses(folder_path, max_workers=4):  # フォルダ内のWAVファイルを並行して読み込み、順に返すジェネレータ
+    file_names = sorted(name for name in os.listdir(folder_path) if name.endswith('.wav'))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for file_name in file_names:
+            pending.append((file_name, pool.submit(read_impulse_response, os.path.join(folder_path, file_name))))
+            if len(pending) >= 2 * max_workers:  # 先読みするファイル数を制限してメモリ使用量を抑える
+                name, future = pending.popleft()
+                yield (name, *future.result())
+        while pending:
+            name, future = pending.popleft()
+            yield (name, *future.result())
+
+
+@lru_cache(maxsize=None)
+def resample_filter(up, down):  # resample_polyと同じローパスFIRを設計（同じ変換比なら設計は1回だけ）
+    max_rate = max(up, down)
+    return firwin(20 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0))
+
+
+def resample_impulse_response(data, rate, target_rate):  # IRをtarget_rateに変換（2次元配列の場合は各行をまとめて変換）
+    divisor = math.gcd(target_rate, rate)
+    up, down = target_rate // divisor, rate // divisor
+    return resample_poly(data, up, down, axis=-1, window=resample_filter(up, down)).astype(np.float32)
+
+
+def analyze_folder(folder_path, cache=None, common_rate=None, chunk_size=None):  # フォルダ内のWAVファイルを chunk_size 個ずつまとめて解析し、スペクトルと先頭の波形だけを残す（全IRの波形を同時にメモリに置かない）
+    plotter = ImpulseResponsePlotter(cache, common_rate, chunk_size)
+    for file_name, rate, data, file_hash in load_impulse_responses(folder_path):
+        plotter.add(file_name, rate, data, file_hash)
+    plotter.flush()
+    if cache is not None:
+        cache.evict()
+    return plotter
+
+
+if __name__ == '__main__':
+    # スクリプトファイルの場所を基準にした相対パス
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    folder_path = os.path.join(script_dir, "IR")
+    cache = SpectrumCache(os.path.join(script_dir, ".ir_cache"))  # スペクトルのキャッシュ（Noneにすると毎回計算）
+    common_rate = 48000  # 全IRをこのサンプルレートに揃える（Noneにすると元のレートのまま）
+
+    # 描画
+    plotter = analyze_folder(folder_path, cache, common_rate)
+    plotter.plot(mode='original')  # 'original' または 'adjusted' を指定（'adjusted' の場合はピーク位置を合わせてから描画）
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""fft_ir_object_windows のスペクトルのキャッシュと位置合わせのテスト。"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import scipy.io.wavfile as wavfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import fft_ir_object_windows as fft_ir  # noqa: E402
+
+
+def write_ir(path: Path, rate: int, delay_ms: float, length_ms: float = 300.0) -> None:
+    """遅れ delay_ms の減衰する共振（キャビネットIRの代わり）をWAVファイルに書き出す。"""
+    t = np.arange(round(length_ms * rate / 1000)) / rate - delay_ms / 1000
+    wave = np.where(t >= 0, np.exp(-t / 2e-3) * np.sin(2 * np.pi * 2500 * t), 0.0)
+    wavfile.write(path, rate, (wave / np.abs(wave).max() * 30000).astype(np.int16))
+
+
+@pytest.fixture
+def transforms(monkeypatch):
+    """rfft・irfft・resample_poly の呼び出し回数を数える。"""
+    counts = {'rfft': 0, 'irfft': 0, 'resample_poly': 0}
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(np.fft, 'rfft', counting('rfft', np.fft.rfft))
+    monkeypatch.setattr(np.fft, 'irfft', counting('irfft', np.fft.irfft))
+    monkeypatch.setattr(fft_ir, 'resample_poly', counting('resample_poly', fft_ir.resample_poly))
+    return counts
+
+
+def test_second_run_does_no_transforms(tmp_path, transforms):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    write_ir(folder / 'a.wav', 48000, 1.0)
+    write_ir(folder / 'b.wav', 44100, 1.3)
+    cache = fft_ir.SpectrumCache(str(tmp_path / 'cache'))
+
+    first = fft_ir.analyze_folder(str(folder), cache, common_rate=48000)
+    assert transforms == {'rfft': 2, 'irfft': 0, 'resample_poly': 1}  # 2つのIRをまとめて全体と先頭の2回
+
+    for name in transforms:
+        transforms[name] = 0
+    second = fft_ir.analyze_folder(str(folder), cache, common_rate=48000)
+    assert transforms == {'rfft': 0, 'irfft': 0, 'resample_poly': 0}
+    for expected, actual in zip(first.magnitude_db, second.magnitude_db):
+        np.testing.assert_array_equal(actual, expected)
+    for expected, actual in zip(first.original_data, second.original_data):
+        np.testing.assert_array_equal(actual, expected)
+
+    # 位置合わせは保存した先頭のスペクトルを使い、順方向のFFTをやり直さない
+    second.align()
+    assert transforms['rfft'] == 0
+    first.align()
+    for expected, actual in zip(first.adjusted_data, second.adjusted_data):
+        np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('keep', [0.0, 0.5])
+def test_corrupt_cache_entry_is_removed(tmp_path, keep):
+    cache = fft_ir.SpectrumCache(str(tmp_path / 'cache'))
+    entry = {'nfft': np.array(8), 'magnitude_db': np.arange(5, dtype=np.float32)}
+    cache.put('ab' * 32, entry)
+    np.testing.assert_array_equal(cache.get('ab' * 32)['magnitude_db'], entry['magnitude_db'])
+
+    path = Path(cache._path('ab' * 32))
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep)])  # 途中で切れたエントリ
+    assert cache.get('ab' * 32) is None
+    assert not path.exists()
+    assert cache.get('cd' * 32) is None  # 無いエントリ
+
+
+def test_adding_a_file_keeps_the_other_entries(tmp_path, transforms):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    write_ir(folder / 'a.wav', 48000, 1.0)
+    write_ir(folder / 'b.wav', 48000, 1.3)
+    cache = fft_ir.SpectrumCache(str(tmp_path / 'cache'))
+    fft_ir.analyze_folder(str(folder), cache, common_rate=48000)
+
+    # 最長・ピークが最も遅いIRを追加しても、既存のIRのキャッシュはそのまま使える
+    write_ir(folder / 'c.wav', 48000, 4.0, length_ms=900.0)
+    transforms['rfft'] = 0
+    plotter = fft_ir.analyze_folder(str(folder), cache, common_rate=48000)
+    assert transforms['rfft'] == 2
+    assert plotter.file_names == ['a.wav', 'b.wav', 'c.wav']
+
+
+def test_chunks_match_one_file_at_a_time(tmp_path, transforms):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    for i, delay_ms in enumerate([1.0, 1.4, 2.2, 0.7, 3.0]):
+        write_ir(folder / f'{i}.wav', 48000, delay_ms)
+    write_ir(folder / 'long.wav', 48000, 1.0, length_ms=500.0)  # FFT長が違うIRは別にまとめる
+
+    chunked = fft_ir.analyze_folder(str(folder), chunk_size=4)
+    # 最初の4つで1回、残りの同じ長さの1つと長いIRで1回ずつ（それぞれ全体と先頭の2回）
+    assert transforms['rfft'] == 2 * 3
+    single = fft_ir.analyze_folder(str(folder), chunk_size=1)
+
+    assert chunked.file_names == single.file_names == [f'{i}.wav' for i in range(5)] + ['long.wav']
+    assert chunked.nffts == single.nffts
+    assert chunked.peak_indices == single.peak_indices
+    for name in ('magnitude_db', 'original_data', 'head_spectra'):
+        for expected, actual in zip(getattr(single, name), getattr(chunked, name)):
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_mixed_rates_share_one_batch(tmp_path, transforms):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    for name, rate, delay_ms in [('a.wav', 44100, 1.0), ('b.wav', 96000, 1.5), ('c.wav', 44100, 2.0), ('d.wav', 48000, 0.5)]:
+        write_ir(folder / name, rate, delay_ms)
+
+    mixed = fft_ir.analyze_folder(str(folder), common_rate=48000)
+    # 44.1 kHz の2つを1回、96 kHz を1回でリサンプリングし、揃えた4つを1つの配列でFFTする
+    assert transforms == {'rfft': 2, 'irfft': 0, 'resample_poly': 2}
+    assert mixed.nffts == [mixed.nffts[0]] * 4
+
+    single = fft_ir.analyze_folder(str(folder), common_rate=48000, chunk_size=1)
+    for name in ('magnitude_db', 'original_data', 'head_spectra'):
+        for expected, actual in zip(getattr(single, name), getattr(mixed, name)):
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('common_rate', [48000, None])
+def test_align_matches_peaks(tmp_path, common_rate):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    for name, rate, delay_ms in [('a.wav', 48000, 1.0), ('b.wav', 48000, 2.37), ('c.wav', 44100, 3.1)]:
+        write_ir(folder / name, rate, delay_ms)
+
+    plotter = fft_ir.analyze_folder(str(folder), common_rate=common_rate)
+    assert plotter.adjusted_data == []  # 位置合わせは 'adjusted' を描画する場合か、align() を呼んだ場合だけ
+    plotter.align()
+    peaks_ms = [
+        fft_ir.ImpulseResponsePlotter._refine_peak(data[None, :].astype(float))[0] / rate * 1000
+        for data, rate in zip(plotter.adjusted_data, plotter.rates)
+    ]
+    np.testing.assert_allclose(peaks_ms, peaks_ms[0], atol=0.01)
+
+
+def test_peak_after_the_head_is_an_error(tmp_path):
+    folder = tmp_path / 'IR'
+    folder.mkdir()
+    write_ir(folder / 'a.wav', 48000, 1.0)
+    write_ir(folder / 'late.wav', 48000, 70.0)  # ピークが先頭 50 ms より後
+
+    with pytest.raises(ValueError, match=r'late\.wav: peak at 70\.\d ms is outside the first 50 ms'):
+        fft_ir.analyze_folder(str(folder))
+
+    # 先頭の長さを延ばせば解析できる（保持する波形もその長さになる）
+    plotter = fft_ir.ImpulseResponsePlotter()
+    plotter.head_ms = 100
+    for name in ('a.wav', 'late.wav'):
+        rate, data, _ = fft_ir.read_impulse_response(str(folder / name))
+        plotter.add(name, rate, data)
+    plotter.flush()
+    assert [len(data) for data in plotter.original_data] == [4800, 4800]
+
+
+def test_lag_outside_the_peak_range_is_an_error():
+    rate = 48000
+    burst = np.full(round(5e-3 * rate), 0.9, dtype=np.float32)  # 5 ms の長い成分（ピークより小さい）
+    a = np.zeros(rate // 10, dtype=np.float32)
+    a[48] = 1.0  # ピーク 1 ms
+    a[240:240 + len(burst)] = burst  # 5 ms から
+    b = np.zeros_like(a)
+    b[96] = 1.0  # ピーク 2 ms（ピークの差は 1 ms）
+    b[384:384 + len(burst)] = burst  # 8 ms から（相関は 3 ms のずれで最大になる）
+
+    plotter = fft_ir.ImpulseResponsePlotter()
+    plotter.add('a.wav', rate, a)
+    plotter.add('b.wav', rate, b)
+    with pytest.raises(ValueError, match=r'b\.wav: the best alignment lies outside ±2\.00 ms'):
+        plotter.align()